@@ -22,6 +22,7 @@ g++ -lrt -shared -pthread -fPIC -fwrapv -O2 -Wall -fno-strict-aliasing -I/opt/py
 	c++sources/gt_maxflow_sources/maxflow_solver.cpp \
 \
 	c++sources/gt_maxflow_sources/maxflow_GT.cpp \
+	c++sources/gt_maxflow_sources/maxflow_warm.cpp \
 	c++sources/gt_maxflow_sources/construct.cpp \
 	c++sources/gt_maxflow_sources/hi_pr.cpp \
 	c++sources/gt_maxflow_sources/parser.cpp \
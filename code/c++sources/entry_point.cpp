@@ -7,6 +7,45 @@ int entry_point(int argc, char *argv, int num_nodes)
     int arguments_count = argc + 1;
     const char *arguments_value[] = {"gt_maxflow\0", static_cast<const char*>(argv)};
     
-    //return (gt5_main(arguments_count, arguments_value, num_nodes));
-    gt5_main(arguments_count, arguments_value, num_nodes);
+    return (gt5_main(arguments_count, arguments_value, num_nodes));
+}
+
+int entry_point_cut(char *argv, int size, int *cut, double *flow, double *cost);
+
+int entry_point_cut(char *argv, int size, int *cut, double *flow, double *cost)
+{
+    return solve_cut(static_cast<const char*>(argv), size, cut, flow, cost);
+}
+
+int entry_point_cut_arrays(int num_nodes, int num_arcs, int source, int sink,
+			   const int *tails, const int *heads, const float *caps, const float *rev_caps,
+			   int size, int *cut, double *flow, double *cost);
+
+int entry_point_cut_arrays(int num_nodes, int num_arcs, int source, int sink,
+			   const int *tails, const int *heads, const float *caps, const float *rev_caps,
+			   int size, int *cut, double *flow, double *cost)
+{
+    return solve_cut_arrays(num_nodes, num_arcs, source, sink, tails, heads, caps, rev_caps,
+			    size, cut, flow, cost);
+}
+
+int entry_point_cut_tensor(int num_tasks, int num_nodes_each, int num_arcs,
+			   const int *tails, const int *heads, const double *caps, const double *rev_caps,
+			   const double *task_scales, const double *coupling, const double *terminal_caps,
+			   int size, int *cut, double *flow, double *cost);
+
+int entry_point_cut_tensor(int num_tasks, int num_nodes_each, int num_arcs,
+			   const int *tails, const int *heads, const double *caps, const double *rev_caps,
+			   const double *task_scales, const double *coupling, const double *terminal_caps,
+			   int size, int *cut, double *flow, double *cost)
+{
+    return solve_cut_tensor(num_tasks, num_nodes_each, num_arcs, tails, heads, caps, rev_caps,
+			    task_scales, coupling, terminal_caps, size, cut, flow, cost);
+}
+
+void entry_point_last_timings(double *build_time, double *maxflow_time);
+
+void entry_point_last_timings(double *build_time, double *maxflow_time)
+{
+    get_last_timings(build_time, maxflow_time);
 }
@@ -11,6 +11,16 @@ debug::PerformanceCounter c1;
 
 #include <sys/time.h>
 
+// Wall-clock times (in seconds) of building the graph and of running maxflow,
+// for the last problem solved by solve(), solve_cut(), solve_cut_arrays() or solve_cut_tensor()
+static double last_build_time = 0.;
+static double last_maxflow_time = 0.;
+
+void get_last_timings(double * build_time, double * maxflow_time){
+    *build_time = last_build_time;
+    *maxflow_time = last_maxflow_time;
+}
+
 
 void solve(const char * file, int num_nodes){
     try{
@@ -33,12 +43,14 @@ void solve(const char * file, int num_nodes){
 	dimacs_parser(file,*constructor,2);
 	gettimeofday(&tendread, NULL);
 	texecread = (double)(1000 * (tendread.tv_sec - tbeginread.tv_sec) + ((tendread.tv_usec - tbeginread.tv_usec)/1000));
+	last_build_time = (tendread.tv_sec - tbeginread.tv_sec) + (tendread.tv_usec - tbeginread.tv_usec) * 1e-6;
 	debug::stream << "exec time for building graph = " << texecread << " ms\n";
 
 	gettimeofday(&tbeginalgo, NULL);    
 	double F = solver->maxflow();
 	gettimeofday(&tendalgo, NULL);
 	texecalgo = (double)(1000 * (tendalgo.tv_sec - tbeginalgo.tv_sec) + ((tendalgo.tv_usec - tbeginalgo.tv_usec)/1000));
+	last_maxflow_time = (tendalgo.tv_sec - tbeginalgo.tv_sec) + (tendalgo.tv_usec - tbeginalgo.tv_usec) * 1e-6;
 	debug::stream << "exec time for maxflow = " << texecalgo << " ms\n";
 	solver->print_info(); 
 
@@ -54,10 +66,116 @@ void solve(const char * file, int num_nodes){
     };
 }
 
+int get_cut_from_solver(maxflow_GT * solver, int size, int * cut, double * flow, double * cost){
+    // Solve the problem held by solver and hand the minimum cut, the flow value
+    // and the cut cost back to the caller.
+    if (solver->g.n > size)
+	{
+	    debug::stream << "ERROR cut buffer too small\n";
+	    return 1;
+	}
+    double time_start = wall_timer();
+    *flow = solver->maxflow();
+    last_maxflow_time = wall_timer() - time_start;
+    *cost = solver->cut_cost();
+    solver->get_cut(cut);
+    return 0;
+}
+
+int solve_cut(const char * file, int size, int * cut, double * flow, double * cost){
+    // Same as solve(), but hands the minimum cut, the flow value and the cut cost
+    // back to the caller instead of printing the selected nodes.
+    std::streambuf* cout_sbuf = std::cout.rdbuf();
+    std::ofstream   fout("/dev/null");
+    std::cout.rdbuf(fout.rdbuf());
+
+    int status = 0;
+    maxflow_GT * solver = NULL;
+    try{
+	solver = new maxflow_GT;
+	solver->g.globUpdtFreq = 0.5;
+	double time_start = wall_timer();
+	dimacs_parser(file, *solver, 2);
+	last_build_time = wall_timer() - time_start;
+	status = get_cut_from_solver(solver, size, cut, flow, cost);
+    } catch(...){
+	debug::stream << "ERROR\n";
+	status = 1;
+    };
+    if (solver)
+	delete solver;
+
+    std::cout.rdbuf(cout_sbuf);
+    return status;
+}
+
+int solve_cut_arrays(int n, int m, int S, int T, const int * tails, const int * heads,
+		     const float * caps, const float * rev_caps,
+		     int size, int * cut, double * flow, double * cost){
+    // Same as solve_cut(), but the graph is built directly from arrays of arcs
+    // (see array_parser) instead of being parsed from its dimacs description.
+    std::streambuf* cout_sbuf = std::cout.rdbuf();
+    std::ofstream   fout("/dev/null");
+    std::cout.rdbuf(fout.rdbuf());
+
+    int status = 0;
+    maxflow_GT * solver = NULL;
+    try{
+	solver = new maxflow_GT;
+	solver->g.globUpdtFreq = 0.5;
+	double time_start = wall_timer();
+	status = array_parser(n, m, S, T, tails, heads, caps, rev_caps, *solver, 2);
+	last_build_time = wall_timer() - time_start;
+	if (status == 0)
+	    status = get_cut_from_solver(solver, size, cut, flow, cost);
+    } catch(...){
+	debug::stream << "ERROR\n";
+	status = 1;
+    };
+    if (solver)
+	delete solver;
+
+    std::cout.rdbuf(cout_sbuf);
+    return status;
+}
+
+int solve_cut_tensor(int num_tasks, int num_nodes_each, int m, const int * tails, const int * heads,
+		     const double * caps, const double * rev_caps, const double * task_scales,
+		     const double * coupling, const double * terminal_caps,
+		     int size, int * cut, double * flow, double * cost){
+    // Same as solve_cut_arrays(), but the super-network is expanded on the fly
+    // from the network shared by all tasks (see tensor_parser).
+    std::streambuf* cout_sbuf = std::cout.rdbuf();
+    std::ofstream   fout("/dev/null");
+    std::cout.rdbuf(fout.rdbuf());
+
+    int status = 0;
+    maxflow_GT * solver = NULL;
+    try{
+	solver = new maxflow_GT;
+	solver->g.globUpdtFreq = 0.5;
+	double time_start = wall_timer();
+	status = tensor_parser(num_tasks, num_nodes_each, m, tails, heads, caps, rev_caps,
+			       task_scales, coupling, terminal_caps, *solver, 2);
+	last_build_time = wall_timer() - time_start;
+	if (status == 0)
+	    status = get_cut_from_solver(solver, size, cut, flow, cost);
+    } catch(...){
+	debug::stream << "ERROR\n";
+	status = 1;
+    };
+    if (solver)
+	delete solver;
+
+    std::cout.rdbuf(cout_sbuf);
+    return status;
+}
+
 int gt5_main(int argc, char *argv[], int num_nodes){
     if (argc != 2)
 	{
 	    std::cout << "ERROR Wrong number of arguments in main" << std::endl;
+	    return 1;
 	}
     else
 	{
@@ -220,3 +220,105 @@ void dimacs_parser(const char * filename, dimacs_parser_callback & A, int loops)
 	}
     f.close();
 }
+
+static void read_pair(dimacs_parser_callback & A, int loop, int u, int v, float cap1, float cap2)
+{
+    if (cap1 == 0.)
+	{
+	    if (cap2 == 0.)
+		return ;//skip zero arcs
+	    A.read_arc(loop, v, u, cap2, 0);
+	}
+    else
+	A.read_arc(loop, u, v, cap1, cap2);
+}
+
+int array_parser(int n, int m, int S, int T, const int * tails, const int * heads,
+		 const float * caps, const float * rev_caps, dimacs_parser_callback & A, int loops)
+{
+    // check node indices once, the callbacks do not
+    if (S < 0 || S >= n || T < 0 || T >= n)
+	{
+	    std::cout << "source or sink out of range" << std::endl;
+	    return 1;
+	}
+    for (int e = 0; e < m; ++e)
+	{
+	    if (tails[e] < 0 || tails[e] >= n || heads[e] < 0 || heads[e] >= n)
+		{
+		    std::cout << "node out of range in arc " << e << std::endl;
+		    return 1;
+		}
+	}
+
+    A.allocate1(n, m, S, T);
+
+    // same double loop over edges as dimacs_parser - count and read
+    for (int loop = 0; loop < loops; ++loop)
+	{
+	    for (int e = 0; e < m; ++e)
+		read_pair(A, loop, tails[e], heads[e], caps[e], rev_caps[e]);
+	    A.allocate2(loop);
+	}
+    return 0;
+}
+
+int tensor_parser(int num_tasks, int num_nodes_each, int m, const int * tails, const int * heads,
+		  const double * caps, const double * rev_caps, const double * task_scales,
+		  const double * coupling, const double * terminal_caps,
+		  dimacs_parser_callback & A, int loops)
+{
+    int n = num_tasks * num_nodes_each + 2;
+    int S = n - 2;
+    int T = n - 1;
+    // check node indices once, the callbacks do not
+    if (num_tasks < 1 || num_nodes_each < 1)
+	{
+	    std::cout << "empty super-network" << std::endl;
+	    return 1;
+	}
+    for (int e = 0; e < m; ++e)
+	{
+	    if (tails[e] < 0 || tails[e] >= num_nodes_each || heads[e] < 0 || heads[e] >= num_nodes_each)
+		{
+		    std::cout << "node out of range in arc " << e << std::endl;
+		    return 1;
+		}
+	}
+
+    A.allocate1(n, m * num_tasks + num_nodes_each * num_tasks * num_tasks, S, T);
+
+    // capacities are computed in double, then rounded as array_parser's
+    for (int loop = 0; loop < loops; ++loop)
+	{
+	    for (int t = 0; t < num_tasks; ++t)
+		{
+		    int offset = t * num_nodes_each;
+		    double scale = task_scales[t];
+		    for (int e = 0; e < m; ++e)
+			read_pair(A, loop, tails[e] + offset, heads[e] + offset,
+				  (float)(caps[e] * scale), (float)(rev_caps[e] * scale));
+		}
+	    for (int t1 = 0; t1 < num_tasks; ++t1)
+		for (int t2 = t1 + 1; t2 < num_tasks; ++t2)
+		    {
+			float cap1 = (float)coupling[t1 * num_tasks + t2];
+			float cap2 = (float)coupling[t2 * num_tasks + t1];
+			if (cap1 == 0. && cap2 == 0.)
+			    continue ;
+			for (int i = 0; i < num_nodes_each; ++i)
+			    read_pair(A, loop, i + t1 * num_nodes_each, i + t2 * num_nodes_each,
+				      cap1, cap2);
+		    }
+	    for (int v = 0; v < S; ++v)
+		{
+		    float a = (float)terminal_caps[v];
+		    if (a >= 0)
+			read_pair(A, loop, S, v, a, 0);
+		    else
+			read_pair(A, loop, v, T, -a, 0);
+		}
+	    A.allocate2(loop);
+	}
+    return 0;
+}
@@ -14,4 +14,24 @@ public:
 
 void dimacs_parser(const char * filename, dimacs_parser_callback & A, int loops = 1);
 
+// Same as dimacs_parser, but the m pairs of arcs are read from arrays:
+// arc pair e goes from tails[e] to heads[e] (capacity caps[e])
+// and from heads[e] to tails[e] (capacity rev_caps[e]). Node indices start at 0.
+int array_parser(int n, int m, int S, int T, const int * tails, const int * heads,
+		 const float * caps, const float * rev_caps, dimacs_parser_callback & A, int loops = 1);
+
+// Same as array_parser, for the super-network of num_tasks tasks sharing one network
+// of num_nodes_each nodes and m pairs of arcs (tails, heads, caps, rev_caps as above),
+// expanded on the fly:
+// - pair e of task t has capacities task_scales[t] * caps[e] and task_scales[t] * rev_caps[e];
+// - node i of task t1 is linked to node i of task t2 (t1 < t2) with capacity
+//   coupling[t1 * num_tasks + t2], and back with capacity coupling[t2 * num_tasks + t1];
+// - node v is linked to the source with capacity terminal_caps[v] if it is non-negative,
+//   and to the sink with capacity -terminal_caps[v] otherwise.
+// Node i of task t has index t * num_nodes_each + i, followed by the source and the sink.
+int tensor_parser(int num_tasks, int num_nodes_each, int m, const int * tails, const int * heads,
+		  const double * caps, const double * rev_caps, const double * task_scales,
+		  const double * coupling, const double * terminal_caps,
+		  dimacs_parser_callback & A, int loops = 1);
+
 #endif
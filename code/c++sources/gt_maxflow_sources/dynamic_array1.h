@@ -247,8 +247,8 @@ namespace dynamic{
 		void pop_back(){
 			if(empty())
 				std::cout << "pop_back from empty dynamic_array1" << std::endl;
-			destroy(end());
 			--_end;
+			destroy(end());//the last element, not the slot after it
 		};
 
 		void erase(type * it){
@@ -0,0 +1,197 @@
+#include "maxflow_warm.h"
+#include "types.h"
+
+#include <fstream>
+#include <new>
+
+maxflow_warm::maxflow_warm(int n, int S, int T, int m, const int * tails, const int * heads) :
+    num_pair_arcs(0), solved(false), warm(false), offset(0.),
+    construction_time(0.), build_time(0.), maxflow_time(0.)
+{
+    double time_start = wall_timer();
+    g.globUpdtFreq = 0.5;
+    pair_arcs = (arc**)calloc(m + 2 * (n - 2), sizeof(arc*));
+    terminal_arcs = (arc**)calloc(2 * n, sizeof(arc*));
+    if (!pair_arcs || !terminal_arcs)
+	{
+	    free(pair_arcs);
+	    free(terminal_arcs);
+	    throw std::bad_alloc();
+	}
+
+    // same double loop over edges as dimacs_parser - count and read,
+    // but arcs are kept even with zero capacities, so that they can be updated
+    allocate1(n, m, S, T);
+    for (int loop = 0; loop < 2; ++loop)
+	{
+	    for (int e = 0; e < m; ++e)
+		read_arc(loop, tails[e], heads[e], 0, 0);
+	    for (int v = 0; v < n; ++v)
+		{
+		    if (v == S || v == T)
+			continue ;
+		    read_arc(loop, S, v, 0, 0);
+		    if (loop)
+			terminal_arcs[2 * v] = pair_arcs[num_pair_arcs - 1];
+		    read_arc(loop, v, T, 0, 0);
+		    if (loop)
+			terminal_arcs[2 * v + 1] = pair_arcs[num_pair_arcs - 1];
+		}
+	    allocate2(loop);
+	}
+    construction_time = wall_timer() - time_start;
+}
+
+maxflow_warm::~maxflow_warm()
+{
+    free(pair_arcs);
+    free(terminal_arcs);
+}
+
+void maxflow_warm::read_arc(int loop, int u, int v, float cap1, float cap2)
+{
+    maxflow_GT::read_arc(loop, u, v, cap1, cap2);
+    if (loop)
+	pair_arcs[num_pair_arcs++] = g.nodes[u].current - 1;
+}
+
+void maxflow_warm::set_cap(arc * a, float c1, float c2)
+{
+    // keep the flow of the pair within its new capacities
+    // (arcs out of the source are saturated, as in hi_pr::init)
+    node * u = a->rev->head;
+    node * v = a->head;
+    float f = g.cap[a - g.arcs] - a->resCap;
+    float new_f;
+    if (u == g.source)
+	new_f = c1;
+    else
+	new_f = (f > c1) ? c1 : ((f < -c2) ? -c2 : f);
+
+    g.cap[a - g.arcs] = c1;
+    g.cap[a->rev - g.arcs] = c2;
+    a->resCap = c1 - new_f;
+    a->rev->resCap = c2 + new_f;
+    if (u != g.source)
+	u->excess -= (new_f - f);
+    v->excess += (new_f - f);
+}
+
+void maxflow_warm::add_to_terminals(node * v, double delta)
+{
+    // the extra capacity of S -> v is saturated right away
+    arc * sv = terminal_arcs[2 * (v - g.nodes)];
+    arc * vt = terminal_arcs[2 * (v - g.nodes) + 1];
+    g.cap[sv - g.arcs] += delta;
+    sv->rev->resCap += delta;
+    g.cap[vt - g.arcs] += delta;
+    vt->resCap += delta;
+    v->excess += delta;
+    offset += delta;
+}
+
+int maxflow_warm::solve(const float * caps, const float * rev_caps, const float * terminal_caps,
+			int size, int * cut, double * flow, double * cost)
+{
+    if (g.n > size)
+	{
+	    debug::stream << "ERROR cut buffer too small\n";
+	    return 1;
+	}
+
+    std::streambuf* cout_sbuf = std::cout.rdbuf();
+    std::ofstream   fout("/dev/null");
+    std::cout.rdbuf(fout.rdbuf());
+
+    double time_start = wall_timer();
+    int m = num_pair_arcs - 2 * (g.n - 2);
+    offset = 0.;
+    warm = solved;
+    for (int e = 0; e < m; ++e)
+	{
+	    if (warm)
+		set_cap(pair_arcs[e], caps[e], rev_caps[e]);
+	    else
+		{
+		    g.cap[pair_arcs[e] - g.arcs] = caps[e];
+		    g.cap[pair_arcs[e]->rev - g.arcs] = rev_caps[e];
+		}
+	}
+    for (int v = 0, e = m; v < g.n; ++v)
+	{
+	    node * i = g.nodes + v;
+	    if (i == g.source || i == g.sink)
+		continue ;
+	    float a = terminal_caps[v];
+	    float to_source = (a >= 0) ? a : 0;
+	    float to_sink = (a >= 0) ? 0 : -a;
+	    if (warm)
+		{
+		    set_cap(pair_arcs[e], to_source, 0);
+		    set_cap(pair_arcs[e + 1], to_sink, 0);
+		}
+	    else
+		{
+		    g.cap[pair_arcs[e] - g.arcs] = to_source;
+		    g.cap[pair_arcs[e + 1] - g.arcs] = to_sink;
+		}
+	    e += 2;
+	}
+
+    if (warm)
+	{
+	    // clamping flows may leave nodes in deficit
+	    for (node * i = g.nodes; i != g.nodes + g.n; ++i)
+		{
+		    if (i == g.source || i == g.sink)
+			continue ;
+		    if (i->excess < 0)
+			{
+			    add_to_terminals(i, -i->excess);
+			    i->excess = 0;
+			}
+		}
+	}
+    else
+	g.init();
+    build_time = construction_time + wall_timer() - time_start;
+    construction_time = 0.;
+
+    time_start = wall_timer();
+    *flow = maxflow() - offset;
+    maxflow_time = wall_timer() - time_start;
+    *cost = cut_cost() - offset;
+    get_cut(cut);
+    solved = true;
+
+    std::cout.rdbuf(cout_sbuf);
+    return 0;
+}
+
+maxflow_warm * new_maxflow_warm(int n, int S, int T, int m, const int * tails, const int * heads)
+{
+    std::streambuf* cout_sbuf = std::cout.rdbuf();
+    std::ofstream   fout("/dev/null");
+    std::cout.rdbuf(fout.rdbuf());
+
+    maxflow_warm * solver = (maxflow_warm*)malloc(sizeof(maxflow_warm));
+    if (solver)
+	{
+	    try{
+		new (solver) maxflow_warm(n, S, T, m, tails, heads);
+	    } catch(...){
+		debug::stream << "ERROR\n";
+		free(solver);
+		solver = NULL;
+	    };
+	}
+
+    std::cout.rdbuf(cout_sbuf);
+    return solver;
+}
+
+void delete_maxflow_warm(maxflow_warm * solver)
+{
+    solver->~maxflow_warm();
+    free(solver);
+}
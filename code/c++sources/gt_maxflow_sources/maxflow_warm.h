@@ -0,0 +1,55 @@
+#ifndef maxflow_warm_h
+#define maxflow_warm_h
+
+#include "maxflow_GT.h"
+
+// maxflow_GT on a graph whose topology is fixed once and for all,
+// and whose capacities can be updated between solves.
+//
+// The graph has m pairs of arcs (tails[e] -> heads[e], and back),
+// plus, for each node v other than S and T, an arc S -> v and an arc v -> T.
+// After the first solve, each solve starts from the previous preflow:
+// the flow of each arc is clamped to its new capacities, arcs out of S
+// are saturated again, and the deficits this creates are compensated by
+// adding the same capacity to both terminal arcs of the node in deficit
+// (this shifts the cost of all cuts by the same amount, accounted for
+// in the reported flow and cut cost).
+class maxflow_warm : public maxflow_GT{
+public:
+	maxflow_warm(int n, int S, int T, int m, const int * tails, const int * heads);
+	~maxflow_warm();
+	// caps, rev_caps: capacities of the m pairs of arcs
+	// terminal_caps: n values, non-negative ones are the capacity of S -> v,
+	//                negative ones minus the capacity of v -> T (ignored for S and T)
+	int solve(const float * caps, const float * rev_caps, const float * terminal_caps,
+		  int size, int * cut, double * flow, double * cost);
+	bool warm_started() const {return warm;};
+	// wall-clock times (in seconds) of the last solve: setting the capacities
+	// (and building the graph, for the first solve), and running maxflow
+	double last_build_time() const {return build_time;};
+	double last_maxflow_time() const {return maxflow_time;};
+public:
+	virtual void read_arc(int loop, int u, int v, float cap1, float cap2) override;
+private:
+	void set_cap(arc * a, float c1, float c2);
+	void add_to_terminals(node * v, double delta);
+private:
+	// arrays are allocated with calloc: memory from operator new (block_allocator.h)
+	// must be released before exit, which Python does not guarantee
+	arc ** pair_arcs;                // arc tail -> head of each pair, then S -> v and v -> T for each v
+	int num_pair_arcs;
+	arc ** terminal_arcs;            // for each node, S -> v and v -> T (NULL for S and T)
+	bool solved;                     // whether there is a previous preflow to start from
+	bool warm;                       // whether the last solve started from the previous preflow
+	double offset;                   // capacity added to both terminal arcs of nodes in deficit
+	double construction_time;        // time spent building the graph, not yet reported by a solve
+	double build_time;
+	double maxflow_time;
+};
+
+// new maxflow_warm, built without printing anything
+// (allocated with malloc, for the same reason as above: release it with delete_maxflow_warm)
+maxflow_warm * new_maxflow_warm(int n, int S, int T, int m, const int * tails, const int * heads);
+void delete_maxflow_warm(maxflow_warm * solver);
+
+#endif /* maxflow_warm_h */
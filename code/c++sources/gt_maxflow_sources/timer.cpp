@@ -2,6 +2,7 @@
 
 #ifndef WIN32
 #include <time.h>
+#include <sys/time.h>
 
 float timer ()
 {
@@ -9,10 +10,22 @@ float timer ()
   return (float)(double(tt)/CLOCKS_PER_SEC);
 }
 
+// wall-clock time, in seconds
+double wall_timer ()
+{
+  struct timeval tt;
+  gettimeofday(&tt, NULL);
+  return tt.tv_sec + tt.tv_usec * 1e-6;
+}
+
 #else
 
 float timer (){
   return 0;
 };
 
+double wall_timer (){
+  return 0;
+};
+
 #endif
@@ -1 +1,2 @@
-float timer();
\ No newline at end of file
+float timer();
+double wall_timer();
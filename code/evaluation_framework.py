@@ -1,10 +1,187 @@
-"""evaluation_framework.py -- All that is needed to evaluate feature selection algorithms."""
+"""evaluation_framework.py -- All that is needed to evaluate feature selection algorithms.
+
+Tests are run with python -m doctest evaluation_framework.py.
+
+Selections are stored packed, one bit per feature:
+>>> rng = np.random.RandomState(0)
+>>> num_features = 50
+>>> sel_list = [sorted(rng.choice(num_features, size, replace=False)) \\
+...             for size in rng.randint(1, num_features, 6)]
+>>> selections = pack_selections(sel_list, num_features)
+>>> selections.shape, selections.dtype
+((6, 7), dtype('uint8'))
+>>> [np.flatnonzero(mask[:num_features]).tolist() for mask in np.unpackbits(selections, axis=1)] \\
+... == [list(sel) for sel in sel_list]
+True
+
+and their consistency index is computed on the packed bits, for several lists of sets at once:
+>>> ci_packed = consistency_index_packed(np.array([selections, selections[::-1]]), num_features)
+>>> np.allclose(ci_packed, [consistency_index_k(sel_list, num_features),
+...                         consistency_index_k(sel_list[::-1], num_features)])
+True
+
+Grid search, on noisy versions of the node weights of simu_01 (one per subsample),
+gives the same selections, and thus the same optimal hyperparameters,
+as solving each problem with run_in_process:
+>>> network_fname = '../data/simu_01/simu_01.network.dimacs'
+>>> covariance_fname = '../data/simu_01/simu_01.task_similarities.txt'
+>>> weights = [np.loadtxt('../data/simu_01/simu_01.scores_%d.txt' % task_idx) \\
+...            for task_idx in range(2)]
+>>> num_features = len(weights[0])
+>>> weights_list = [[w + 0.05 * rng.randn(num_features) for w in weights] for ss_idx in range(4)]
+>>> params_list = ['-l %.2e -e %.2e -m 1.00e-02' % (lbd, eta) for lbd in (3e-4, 1e-3) \\
+...                for eta in (0.01, 0.02, 0.03)]
+>>> params_dict = {'sfan': [' '.join(params.split()[:4]) for params in params_list],
+...                'msfan_np': params_list, 'msfan': params_list}
+>>> exhaustive_dict = {}
+>>> for algo in GRID_SEARCH_ALGOS:
+...     exhaustive_dict[algo] = {}
+...     for params in params_dict[algo]:
+...         sel_lists = [run_in_process(2, network_fname, weights_fnames,
+...                                     params + (' -m 0' if algo == 'sfan' else ''),
+...                                     covariance_fname=(covariance_fname \\
+...                                                       if algo == 'msfan' else None))[0] \\
+...                      for weights_fnames in weights_list]
+...         exhaustive_dict[algo][params] = dict(
+...             (task_idx, [sel_list[task_idx] for sel_list in sel_lists]) for task_idx in range(2))
+>>> opt_params_dict = dict((algo, get_optimal_parameters_from_dict(exhaustive_dict[algo],
+...                                                                num_features)) \\
+...                        for algo in GRID_SEARCH_ALGOS)
+>>> opt_params_dict['msfan']
+'-l 1.00e-03 -e 3.00e-02 -m 1.00e-02'
+>>> for path_mode in [True, False]:
+...     selected_dict, runtimes_dict = run_grid_search(2, network_fname, weights_list,
+...                                                    params_dict, covariance_fname,
+...                                                    num_features, path_mode=path_mode)
+...     print all(np.array_equal(selected_dict[algo][params][task_idx],
+...                              pack_selections(exhaustive_dict[algo][params][task_idx],
+...                                              num_features)) \\
+...               for algo in GRID_SEARCH_ALGOS for params in params_dict[algo] \\
+...               for task_idx in range(2)), \\
+...           all(get_optimal_parameters_from_dict(selected_dict[algo], num_features) == \\
+...               opt_params_dict[algo] for algo in GRID_SEARCH_ALGOS)
+True True
+True True
+
+Successive halving only keeps half of the hyperparameters after the first 2 subsamples,
+with the same selections as run_in_process:
+>>> selected_dict, runtimes_dict = run_successive_halving(2, network_fname, weights_list,
+...                                                       params_dict, covariance_fname,
+...                                                       num_features)
+>>> [len(selected_dict[algo]) for algo in GRID_SEARCH_ALGOS]
+[3, 3, 3]
+>>> all(np.array_equal(selected_dict[algo][params][task_idx],
+...                    pack_selections(exhaustive_dict[algo][params][task_idx], num_features)) \\
+...     for algo in GRID_SEARCH_ALGOS for params in selected_dict[algo] for task_idx in range(2))
+True
+
+and finds the same optimal hyperparameters as the grid search when keeping all of them:
+>>> selected_dict, runtimes_dict = run_successive_halving(2, network_fname, weights_list,
+...                                                       params_dict, covariance_fname,
+...                                                       num_features, keep_fraction=1.)
+>>> all(get_optimal_parameters_from_dict(selected_dict[algo], num_features) == \\
+...     opt_params_dict[algo] for algo in GRID_SEARCH_ALGOS)
+True
+
+The adaptive search evaluates hyperparameters within the range of the grid,
+within its budget, with the same selections as run_in_process:
+>>> selected_dict, runtimes_dict = run_adaptive_search(2, network_fname, weights_list,
+...                                                    params_dict, covariance_fname,
+...                                                    num_features, budget=24)
+>>> [len(selected_dict[algo]) for algo in GRID_SEARCH_ALGOS]
+[6, 6, 6]
+>>> all(np.array_equal(selected_dict['msfan'][params][task_idx],
+...                    pack_selections([run_in_process(2, network_fname, weights_fnames, params,
+...                                                    covariance_fname)[0][task_idx] \\
+...                                     for weights_fnames in weights_list], num_features)) \\
+...     for params in selected_dict['msfan'] for task_idx in range(2))
+True
+
+With many values of eta, run_path_in_process computes the eta regularization path
+instead of solving each of them, with the same selections as run_in_process:
+>>> params_list = ['-l 1.00e-03 -e %.4e -m 1.00e-02' % eta \\
+...                for eta in np.linspace(0.02, 0.05, 40)]
+>>> results = run_path_in_process(2, network_fname, weights, params_list, covariance_fname)
+>>> len([record for record in results[0][1] if record['stage'] == 'maxflow']) < 40
+True
+>>> [sel_list for (sel_list, records) in results] == \\
+... [run_in_process(2, network_fname, weights, params, covariance_fname)[0] \\
+...  for params in params_list]
+True
+
+The result cache identifies a problem by the contents of its inputs, whether they
+are given as files or in memory, and by its hyperparameters:
+>>> import shutil
+>>> cache_dir = tempfile.mkdtemp()
+>>> cache = ResultCache(cache_dir)
+>>> params = '-l 1.00e-03 -e 2.00e-02 -m 1.00e-02'
+>>> network = super_network.load_network(network_fname)
+>>> key = cache.get_key(2, network, weights_list[0], params, covariance_fname)
+>>> key == cache.get_key(2, network.adjacency, weights_list[0], params, covariance_fname)
+True
+>>> key == cache.get_key(2, network_fname, weights_list[0], params, covariance_fname)
+False
+>>> other_network = super_network.Network(2 * network.adjacency)
+>>> other_weights = [weights_list[0][0], weights_list[1][1]]
+>>> similarities = np.loadtxt(covariance_fname)
+>>> other_similarities = similarities + 0.1 * (1 - np.eye(2))
+>>> keys = [cache.get_key(2, other_network, weights_list[0], params, covariance_fname),
+...         cache.get_key(2, network, other_weights, params, covariance_fname),
+...         cache.get_key(2, network, weights_list[0], params, other_similarities),
+...         cache.get_key(2, network, weights_list[0], params, None),
+...         cache.get_key(2, network, weights_list[0], params.replace('-m 1', '-m 2'),
+...                       covariance_fname)]
+>>> len(set([key] + keys))
+6
+
+A result is only found after it has been stored:
+>>> result = run_in_process(2, network, weights_list[0], params, covariance_fname)
+>>> cache.get(key) is None
+True
+>>> cache.put(key, result)
+>>> sel_list, records = cache.get(key)
+>>> sel_list == result[0], all(record['cached'] for record in records)
+(True, True)
+>>> [dict(record, cached=False) for record in records] == \\
+... [dict(record, cached=False) for record in result[1]]
+True
+>>> cache.num_hits, cache.num_misses
+(1, 1)
+
+When the cache exceeds its maximum size, the least recently used results are evicted:
+>>> for idx, key_ in enumerate(keys):
+...     cache.put(key_, result)
+...     os.utime(cache._get_fname(key_), (idx, idx))
+>>> result_size = os.path.getsize(cache._get_fname(key))
+>>> cache = ResultCache(cache_dir, max_size=6.5 * result_size)
+>>> cache.put('0' * 40, result)
+>>> [cache.get(key_) is not None for key_ in [key] + keys + ['0' * 40]]
+[True, False, False, True, True, True, True]
+>>> shutil.rmtree(cache_dir)
+"""
+
+# Importing local libraries first,
+# because otherwise Error in `python': free(): invalid pointer
+import multitask_sfan
+import super_network
 
 import numpy as np
+import scipy.sparse as sp
 import tables as tb
 import subprocess
 import shlex
 import math
+import multiprocessing
+import bisect
+import contextlib
+import errno
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import pipes
+import tempfile
 
 from sklearn import linear_model, metrics, model_selection 
 
@@ -75,6 +252,74 @@ def consistency_index_k(sel_list, num_features):
     return cidx
 
 
+# Number of bits set in each possible byte
+_POPCOUNT = np.array([bin(x).count('1') for x in range(256)], dtype=np.uint8)
+
+
+def pack_selections(sel_list, num_features):
+    """ Store sets of features as a packed boolean matrix.
+
+    Parameters
+    ----------
+    sel_list: list of lists
+        List of k lists of indices of selected features
+    num_features: int
+        Total number of features
+
+    Returns
+    -------
+    selections: (k, ceil(num_features / 8)) np.array of np.uint8
+        Row i holds the bits (see np.packbits) of the boolean mask of sel_list[i].
+    """
+    masks = np.zeros((len(sel_list), num_features), dtype=bool)
+    for sel_idx, sel in enumerate(sel_list):
+        masks[sel_idx, sel] = True
+    return np.packbits(masks, axis=1)
+
+
+def consistency_index_packed(selections, num_features):
+    """ Compute the consistency index between k sets of features (see consistency_index_k),
+    for any number of lists of k sets at once.
+
+    The sizes of the sets and of their pairwise intersections are computed
+    by popcount on the packed bits (of the bitwise and of each pair of sets),
+    so that selections are never unpacked.
+
+    Parameters
+    ----------
+    selections: (..., k, ceil(num_features / 8)) np.array of np.uint8
+        Lists of k sets of features, packed (see pack_selections).
+    num_features: int
+        Total number of features
+
+    Returns
+    -------
+    cidx: (...) np.array
+        Consistency index between the k sets, for each list.
+    """
+    selections = np.asarray(selections, dtype=np.uint8)
+    num_sets = selections.shape[-2]
+    if num_sets < 2:
+        raise ValueError("the consistency index needs at least 2 sets of features")
+    sizes = np.sum(_POPCOUNT[selections], axis=-1, dtype=np.int64)
+    # Pairs in the same order as in consistency_index_k
+    pairs = np.triu_indices(num_sets, 1)
+    observed = np.empty(selections.shape[:-2] + (len(pairs[0]), ))
+    for pair_idx, (set_idx1, set_idx2) in enumerate(zip(*pairs)):
+        observed[..., pair_idx] = np.sum(
+            _POPCOUNT[np.bitwise_and(selections[..., set_idx1, :],
+                                     selections[..., set_idx2, :])], axis=-1, dtype=np.int64)
+    expected = sizes[..., pairs[0]] * sizes[..., pairs[1]] / float(num_features)
+    maxposbl = np.minimum(sizes[..., pairs[0]], sizes[..., pairs[1]]).astype(float)
+    # Same as consistency_index, for each pair of sets
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cidx = np.where(expected != maxposbl,
+                        (observed - expected) / (maxposbl - expected), -1.)
+    # Sum over pairs in the same order as consistency_index_k
+    cidx = np.cumsum(cidx, axis=-1)[..., -1]
+    return 2. * cidx / (num_sets * (num_sets - 1))
+
+
 def consistency_index_task(selection_fname, num_folds, num_tasks, num_features):
     """ Compute consistency indices between the features selected for each fold at each task
 
@@ -129,72 +374,184 @@ def consistency_index_task(selection_fname, num_folds, num_tasks, num_features):
     return ci_list
 
 
-def run_sfan(num_tasks, network_fname, weights_fnames, params):
-    """ Run single task sfan (on each task).
+def run_in_process(num_tasks, network_fname, weights_fnames, params,
+                   covariance_fname=None, warm_solver=None):
+    """ Run multitask sfan within the current process.
 
     Arguments
     ---------
     num_tasks: int
         Number of tasks. 
-    network_fname: filename
-        Path to the network file.
-    weights_fnames: list of filenames
-        List of paths to the network nodes files (one per task).
+    network_fname: {filename, Network, adjacency matrix}
+        Path to the network file, or network (see super_network.as_network).
+    weights_fnames: list of {filenames, arrays}
+        List of paths to the network nodes files, or of node weights (one per task).
     params: string
         Hyperparameters, in the '-l <lambda> -e <eta> -m <mu>' format.
+    covariance_fname: {filename, None}, optional
+        Path to the matrix of covariance (similarity) of tasks.
+    warm_solver: {multitask_sfan.WarmStartSolver, None}, optional
+        Solver to reuse, e.g. across hyperparameters on the same data.
 
     Returns
     -------
     sel_list: list of lists
         For each task, a list of selected features, as indices,
         STARTING AT 0.
+    records: list of dictionaries
+        Resources used by each stage (see multitask_sfan.Instrumentation).
     """
-    # Ideally, I'd do the following:
-    # sfan_solver = Sfan(num_tasks, network_fname, weights_fname,
-    #                    lbd, eta, 0, covariance_fname)
-    # tt = sfan_solver.create_dimacs()
-    # sfan_solver.run_maxflow()
-
-    # But because cython output to screen is NOT caught by sys.stdout, 
-    # we need to run this externally
-    argum = ['/usr/bin/time', '--format=%M', 
-             'python', 'multitask_sfan.py',
-             '--num_tasks', str(num_tasks),
-             '--networks', network_fname,
-             '--node_weights']
-    argum.extend(weights_fnames)
-    argum.extend(params.split())
-    argum.extend(['-m', '0'])
+    params_list = params.split()
+    params_dict = dict(zip(params_list[::2], [float(x) for x in params_list[1::2]]))
+
+    sfan_solver = multitask_sfan.Sfan(num_tasks, [network_fname], weights_fnames,
+                                      params_dict['-l'], params_dict['-e'],
+                                      mu=params_dict.get('-m'),
+                                      covariance_matrix_f=covariance_fname)
+    sfan_solver.create_super_network()
+    sel_list, flow, cut_cost = sfan_solver.solve(warm_solver)
+
+    return [sel.tolist() for sel in sel_list], sfan_solver.instrumentation.records
+
+
+# Keys of the records of a path (see multitask_sfan.Instrumentation)
+# split between the points of the grid it covers
+SPLIT_RECORD_KEYS = ['wall_time', 'cpu_time', 'gt_build_time', 'gt_maxflow_time']
+
+
+def run_path_in_process(num_tasks, network_fname, weights_fnames, params_list,
+                        covariance_fname=None, warm_solver=None):
+    """ Run multitask sfan within the current process, for a grid of hyperparameters,
+    by solving the values of eta of the grid for each value of lambda and mu
+    on one super-network (see multitask_sfan.Sfan.solve_values), or by computing
+    the eta regularization path (see multitask_sfan.Sfan.compute_path)
+    if it takes fewer problems.
+
+    The path takes about two problems per breakpoint. As the features selected
+    for the largest eta are also selected for the smallest one, its number of
+    breakpoints is at most the difference of the numbers of features selected
+    at both ends, which are solved first.
+
+    Arguments
+    ---------
+    num_tasks: int
+        Number of tasks.
+    network_fname: {filename, Network, adjacency matrix}
+        Path to the network file, or network (see super_network.as_network).
+    weights_fnames: list of {filenames, arrays}
+        List of paths to the network nodes files, or of node weights (one per task).
+    params_list: list of strings
+        Hyperparameters, in the '-l <lambda> -e <eta> -m <mu>' format.
+    covariance_fname: {filename, None}, optional
+        Path to the matrix of covariance (similarity) of tasks.
+    warm_solver: {multitask_sfan.WarmStartSolver, None}, optional
+        Solver to reuse, e.g. across hyperparameters on the same data.
+
+    Returns
+    -------
+    results: list of tuples
+        (sel_list, records) for each element of params_list (see run_in_process).
+        The times spent for each value of lambda and mu are split evenly between
+        the hyperparameters they cover.
+    """
+    if warm_solver is None:
+        warm_solver = multitask_sfan.WarmStartSolver()
+
+    # Group hyperparameters by (lambda, mu)
+    groups = {}
+    for params_idx, params in enumerate(params_list):
+        params_split = params.split()
+        params_dict = dict(zip(params_split[::2], [float(x) for x in params_split[1::2]]))
+        key = (params_dict['-l'], params_dict.get('-m'))
+        groups.setdefault(key, []).append((params_dict['-e'], params_idx))
+
+    results = [None] * len(params_list)
+    for (lbd, mu), etas in groups.iteritems():
+        eta_values = sorted(set(eta for eta, params_idx in etas))
+
+        sfan_solver = multitask_sfan.Sfan(num_tasks, [network_fname], weights_fnames,
+                                          lbd, eta_values[0], mu=mu,
+                                          covariance_matrix_f=covariance_fname)
+        end_sel_lists = sfan_solver.solve_values('eta', sorted(set([eta_values[0],
+                                                                    eta_values[-1]])),
+                                                 warm_solver=warm_solver)
+        max_breakpoints = sum(len(sel) for sel in end_sel_lists[0]) - \
+                          sum(len(sel) for sel in end_sel_lists[-1])
+        if 2 * max_breakpoints < len(eta_values) - 2:
+            breakpoints, path_sel_lists = sfan_solver.compute_path(
+                'eta', eta_values[0], eta_values[-1], warm_solver=warm_solver)
+            # At a breakpoint, the selection is the one of the interval below
+            sel_lists = [path_sel_lists[bisect.bisect_left(breakpoints, eta)] \
+                         for eta in eta_values]
+        else:
+            sel_lists = end_sel_lists[:1] + \
+                        sfan_solver.solve_values('eta', eta_values[1:-1],
+                                                 warm_solver=warm_solver) + \
+                        end_sel_lists[1:]
+
+        # Share of each point of the grid
+        records = [dict((key, (value / len(etas)) if key in SPLIT_RECORD_KEYS else value) \
+                        for (key, value) in record.iteritems()) \
+                   for record in sfan_solver.instrumentation.records]
+
+        for eta, params_idx in etas:
+            sel_list = sel_lists[eta_values.index(eta)]
+            results[params_idx] = ([sel.tolist() for sel in sel_list], records)
+    return results
+
+
+def run_externally(num_tasks, argum, algo, params):
+    """ Run multitask_sfan.py externally, so that the resources it reports
+    only account for this run.
+
+    Arguments
+    ---------
+    num_tasks: int
+        Number of tasks.
+    argum: list of strings
+        Command line arguments of multitask_sfan.py.
+    algo: string
+        Name of the algorithm, for the warnings.
+    params: string
+        Hyperparameters, in the '-l <lambda> -e <eta> -m <mu>' format, for the warnings.
+
+    Returns
+    -------
+    sel_list: list of lists
+        For each task, a list of selected features, as indices,
+        STARTING AT 0.
+    records: list of dictionaries
+        Resources used by each stage (see multitask_sfan.Instrumentation).
+        Empty if the process failed.
+    """
+    records_fd, records_fname = tempfile.mkstemp(suffix='.records')
+    os.close(records_fd)
+    argum = ['python', 'multitask_sfan.py'] + argum + ['--records', records_fname]
     print '+++'
     print argum
-    p = subprocess.Popen(argum, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    # stdout=subprocess.PIPE -> something should read the output while the process is still running
-    # stderr=subprocess.STDOUT : To also capture standard error in the result
-
-    p_com = p.communicate()
-    p_out = p_com[0].split("\n")
-    p_err = p_com[1].split("\n")
-    print p_com
+    try:
+        p = subprocess.Popen(argum, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        p_com = p.communicate()
+        print p_com
+        records = multitask_sfan.read_records(records_fname)
+    finally:
+        os.remove(records_fname)
+
     # Process the output to get lists of selected features
-    sel_list = [[(int(x)-1) for x in line.split()] for line in p_out[2:2+num_tasks]]
+    out_lines = [line for line in p_com[0].split("\n") if not line.startswith('#')]
+    sel_list = [[(int(x)-1) for x in line.split()] for line in out_lines[:num_tasks]]
 
-    if not sel_list :
+    if not records:
         #TODO : fix no sel_list issue#1
-        #import pdb ; pdb.set_trace()
-        print "WARNING : returned sel_list empty !! algo = st ; param = ", params
+        print "WARNING : returned sel_list empty !! algo = %s ; param = " % algo, params
         sel_list = [[] for i in xrange(num_tasks)]
 
-    # Process the standart output to get timing info 
-    timing = '\n'.join(p_out[2+num_tasks:])
-
-    # Process the standart error to get maxRSS info : 
-    maxRSS = p_err[-2]
+    return sel_list, records
 
-    return sel_list, timing, maxRSS
-                 
 
-def run_msfan_nocorr(num_tasks, network_fname, weights_fnames, params):
-    """ Run multitask sfan (no precision/covariance matrix).
+def run_sfan(num_tasks, network_fname, weights_fnames, params, in_process=False,
+             warm_solver=None):
+    """ Run single task sfan (on each task).
 
     Arguments
     ---------
@@ -206,48 +563,75 @@ def run_msfan_nocorr(num_tasks, network_fname, weights_fnames, params):
         List of paths to the network nodes files (one per task).
     params: string
         Hyperparameters, in the '-l <lambda> -e <eta> -m <mu>' format.
+    in_process: {boolean, False}, optional
+        If true, solve within the current process (see run_in_process)
+        instead of running multitask_sfan.py externally.
+    warm_solver: {multitask_sfan.WarmStartSolver, None}, optional
+        Solver reused across calls, when solving within the current process.
 
     Returns
     -------
     sel_list: list of lists
         For each task, a list of selected features, as indices,
         STARTING AT 0.
+    records: list of dictionaries
+        Resources used by each stage (see multitask_sfan.Instrumentation).
     """
-    argum = ['/usr/bin/time', '-f', '%M',
-             'python', 'multitask_sfan.py',
-             '--num_tasks', str(num_tasks),
+    if in_process:
+        return run_in_process(num_tasks, network_fname, weights_fnames,
+                              "%s -m 0" % params, warm_solver=warm_solver)
+
+    argum = ['--num_tasks', str(num_tasks),
              '--networks', network_fname,
              '--node_weights']
     argum.extend(weights_fnames)
     argum.extend(params.split())
-    print '+++'
-    print argum
-    p = subprocess.Popen(argum, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    p_com = p.communicate()
-    p_out = p_com[0].split("\n")
-    p_err = p_com[1].split("\n")
-    print p_com
-    # Process the output to get lists of selected features
-    
-    sel_list = [[(int(x)-1) for x in line.split()] for line in p_out[3:3+num_tasks]]
+    argum.extend(['-m', '0'])
+    return run_externally(num_tasks, argum, 'st', params)
+                 
 
-    if not sel_list :
-        #TODO : fix no sel_list issue#1
-        #import pdb ; pdb.set_trace()
-        print "WARNING : returned sel_list empty !! algo = np ; param = ", params
-        sel_list = [[] for i in xrange(num_tasks)]
+def run_msfan_nocorr(num_tasks, network_fname, weights_fnames, params,
+                     in_process=False, warm_solver=None):
+    """ Run multitask sfan (no precision/covariance matrix).
 
-    # Process the output to get timing info 
-    timing = '\n'.join(p_out[3+num_tasks:])
+    Arguments
+    ---------
+    num_tasks: int
+        Number of tasks. 
+    network_fname: filename
+        Path to the network file.
+    weights_fnames: list of filenames
+        List of paths to the network nodes files (one per task).
+    params: string
+        Hyperparameters, in the '-l <lambda> -e <eta> -m <mu>' format.
+    in_process: {boolean, False}, optional
+        If true, solve within the current process (see run_in_process)
+        instead of running multitask_sfan.py externally.
+    warm_solver: {multitask_sfan.WarmStartSolver, None}, optional
+        Solver reused across calls, when solving within the current process.
 
-    # Process the outut to get maxRSS info : 
-    maxRSS = p_err[-2]
+    Returns
+    -------
+    sel_list: list of lists
+        For each task, a list of selected features, as indices,
+        STARTING AT 0.
+    records: list of dictionaries
+        Resources used by each stage (see multitask_sfan.Instrumentation).
+    """
+    if in_process:
+        return run_in_process(num_tasks, network_fname, weights_fnames, params,
+                              warm_solver=warm_solver)
 
-    return sel_list, timing, maxRSS
+    argum = ['--num_tasks', str(num_tasks),
+             '--networks', network_fname,
+             '--node_weights']
+    argum.extend(weights_fnames)
+    argum.extend(params.split())
+    return run_externally(num_tasks, argum, 'np', params)
                  
 
-def run_msfan(num_tasks, network_fname, weights_fnames, covariance_fname, params):
+def run_msfan(num_tasks, network_fname, weights_fnames, covariance_fname, params,
+              in_process=False, warm_solver=None):
     """ Run multitask sfan.
 
     Arguments
@@ -262,46 +646,107 @@ def run_msfan(num_tasks, network_fname, weights_fnames, covariance_fname, params
         Path to the matrix of covariance (similarity) of tasks.
     params: string
         Hyperparameters, in the '-l <lambda> -e <eta> -m <mu>' format.
+    in_process: {boolean, False}, optional
+        If true, solve within the current process (see run_in_process)
+        instead of running multitask_sfan.py externally.
+    warm_solver: {multitask_sfan.WarmStartSolver, None}, optional
+        Solver reused across calls, when solving within the current process.
 
     Returns
     -------
     sel_list: list of lists
         For each task, a list of selected features, as indices,
         STARTING AT 0.
+    records: list of dictionaries
+        Resources used by each stage (see multitask_sfan.Instrumentation).
     """
-    argum = ['/usr/bin/time', '-f', '%M',
-             'python', 'multitask_sfan.py',
-             '--num_tasks', str(num_tasks),
+    if in_process:
+        return run_in_process(num_tasks, network_fname, weights_fnames, params,
+                              covariance_fname=covariance_fname,
+                              warm_solver=warm_solver)
+
+    argum = ['--num_tasks', str(num_tasks),
              '--networks', network_fname,
              '--node_weights']
     argum.extend(weights_fnames)
     argum.extend(['--covariance_matrix', covariance_fname])
     argum.extend(params.split())
-    print '+++'
-    print argum
-    p = subprocess.Popen(argum, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    p_com = p.communicate()
-    p_out = p_com[0].split("\n")
-    p_err = p_com[1].split("\n")
-    print p_com
-    # Process the output to get lists of selected features
-    sel_list = [[(int(x)-1) for x in line.split()] for line in p_out[3:3+num_tasks]]
+    return run_externally(num_tasks, argum, 'msfan', params)
+                 
 
-    if not sel_list : 
-        #TODO : fix no sel_list issue#1
-        #import pdb ; pdb.set_trace() 
-        print "WARNING : returned sel_list empty !! algo = msfan ; param = ", params
-        sel_list = [[] for i in xrange(num_tasks)]
+def run_batch(num_tasks, problems):
+    """ Run multitask sfan on several problems, in a single external process
+    (see multitask_sfan.run_batch), so as to only start the interpreter and load
+    the modules once.
 
-    # Process the output to get timing info 
-    timing = '\n'.join(p_out[3+num_tasks:])
+    Arguments
+    ---------
+    num_tasks: int
+        Number of tasks.
+    problems: list of tuples
+        (network_fname, weights_fnames, covariance_fname, params) for each problem:
+        path to the network file, list of paths to the network nodes files (one per task),
+        path to the matrix of covariance (similarity) of tasks (None for sfan and msfan_np),
+        and hyperparameters, in the '-l <lambda> -e <eta> -m <mu>' format
+        ('-m 0' for sfan).
 
-    # Process the outut to get maxRSS info : 
-    maxRSS = p_err[-2]
+    Returns
+    -------
+    results: list of tuples
+        (sel_list, records) for each problem (see run_in_process).
+        The maximum resident set size of the records of a problem is the one of the process
+        up to the end of this problem.
+    """
+    batch_fd, batch_fname = tempfile.mkstemp(suffix='.batch')
+    with os.fdopen(batch_fd, 'w') as f:
+        for (network_fname, weights_fnames, covariance_fname, params) in problems:
+            argum = ['--num_tasks', str(num_tasks),
+                     '--networks', network_fname,
+                     '--node_weights']
+            argum.extend(weights_fnames)
+            if covariance_fname is not None:
+                argum.extend(['--covariance_matrix', covariance_fname])
+            argum.extend(params.split())
+            f.write("%s\n" % ' '.join(pipes.quote(x) for x in argum))
+    records_fd, records_fname = tempfile.mkstemp(suffix='.records')
+    os.close(records_fd)
+    try:
+        p = subprocess.Popen(['python', 'multitask_sfan.py', '--batch', batch_fname,
+                              '--records', records_fname],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        p_out, p_err = p.communicate()
+        records = multitask_sfan.read_records(records_fname)
+    finally:
+        os.remove(batch_fname)
+        os.remove(records_fname)
+
+    # Records of each problem (the last one of a problem is the one of its output)
+    jobs_records = [[] for problem in problems]
+    for record in records:
+        jobs_records[record['job']].append(record)
+
+    # Lines of the output of each problem
+    jobs_lines = []
+    for line in p_out.split("\n"):
+        if line.startswith('# job '):
+            jobs_lines.append([])
+        elif jobs_lines:
+            jobs_lines[-1].append(line)
+    # The output of the last problem is incomplete if the process failed while solving it
+    if jobs_lines and not any(record['stage'] == 'output' \
+                              for record in jobs_records[len(jobs_lines) - 1]):
+        jobs_lines.pop()
+    if len(jobs_lines) != len(problems):
+        raise RuntimeError("multitask_sfan.py --batch solved %d out of %d problems:\n%s" % \
+                           (len(jobs_lines), len(problems), p_err))
+
+    results = []
+    for (job_lines, job_records) in zip(jobs_lines, jobs_records):
+        out_lines = [line for line in job_lines if not line.startswith('#')]
+        sel_list = [[(int(x)-1) for x in line.split()] for line in out_lines[:num_tasks]]
+        results.append((sel_list, job_records))
+    return results
 
-    return sel_list, timing, maxRSS
-                 
 
 def get_optimal_parameters_from_dict(selected_dict, num_features): 
     """ Find optimal parameters from dictionary of selected features
@@ -312,7 +757,9 @@ def get_optimal_parameters_from_dict(selected_dict, num_features):
         keys = parameters
         values = dictionary
             keys = task index
-            values = list of list of selected features (for each subsample)
+            values = selected features for each subsample, either as a list of lists,
+            or packed (see pack_selections). There must be as many subsamples
+            for all parameters and tasks.
     num_features: int
         Total number of features
 
@@ -325,18 +772,925 @@ def get_optimal_parameters_from_dict(selected_dict, num_features):
     """
     opt_params = ''
     opt_ci_mean = -1 # set to -1 because it is the worst case ci value 
-    for (params, selected_dict_p) in selected_dict.iteritems():
-        ci_list = [] #list of ci, one per task, computed with current params
-        for (task_idx, sel_list) in selected_dict_p.iteritems():
-            ci_of_current_task = consistency_index_k(sel_list, num_features)
-            ci_list.append(ci_of_current_task) 
-        ci_mean = np.mean(ci_list)
+    params_list = selected_dict.keys()
+    if not params_list:
+        return opt_params
+    # Consistency index for all parameters and tasks at once
+    ci_means = np.mean(consistency_index_packed(_stack_selections(selected_dict, params_list,
+                                                                  num_features),
+                                                num_features), axis=1)
+    for (params, ci_mean) in zip(params_list, ci_means):
         if ci_mean >= opt_ci_mean:
             opt_ci_mean = ci_mean
             opt_params = params
     return opt_params
 
 
+def _stack_selections(selected_dict, params_list, num_features):
+    """ Get the selected features of a dictionary (see get_optimal_parameters_from_dict)
+    as a (len(params_list), num_tasks, num_subsamples, ceil(num_features / 8)) array
+    (see pack_selections).
+    """
+    return np.array([[selections if isinstance(selections, np.ndarray) \
+                      else pack_selections(selections, num_features) \
+                      for (task_idx, selections) in sorted(selected_dict[params].items())] \
+                     for params in params_list], dtype=np.uint8)
+
+
+class ResultCache(object):
+    """ Persistent on-disk cache of the features selected by multitask sfan.
+
+    Results are indexed by a hash of the contents of the network, node weights and
+    covariance matrix files and of the values of the hyperparameters, so that they
+    can be shared across runs and experiments (e.g. with other result directories).
+    Each result is stored in its own file, <cache_dir>/<key[:2]>/<key>.npz.
+
+    When the total size of the cache exceeds max_size, the least recently used
+    results are deleted until it is back to EVICTION_FRACTION * max_size.
+
+    Attributes
+    ----------
+    cache_dir: dirname
+        Path to the cache directory.
+    max_size: {int, None}
+        Maximum size of the cache, in bytes (None for no limit).
+    num_hits: int
+        Number of results found in the cache (by this process).
+    num_misses: int
+        Number of results not found in the cache (by this process).
+    """
+    EVICTION_FRACTION = 0.8
+
+    def __init__(self, cache_dir, max_size=None):
+        """
+        Parameters
+        ----------
+        cache_dir: dirname
+            Path to the cache directory, created if it does not exist.
+        max_size: {int, None}, optional
+            Maximum size of the cache, in bytes (None for no limit).
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.num_hits = 0
+        self.num_misses = 0
+        self._size = None
+        self._file_digests = {}
+        try:
+            os.makedirs(cache_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+
+    def get_key(self, num_tasks, network_fname, weights_fnames, params,
+                covariance_fname=None):
+        """ Compute the key of a problem.
+
+        Arguments
+        ---------
+        num_tasks: int
+            Number of tasks.
+        network_fname: {filename, Network, adjacency matrix}
+            Path to the network file, or network (see super_network.as_network).
+        weights_fnames: list of {filenames, arrays}
+            List of paths to the network nodes files, or of node weights (one per task).
+        params: string
+            Hyperparameters, in the '-l <lambda> -e <eta> -m <mu>' format.
+        covariance_fname: {filename, None}, optional
+            Path to the matrix of covariance (similarity) of tasks.
+
+        Returns
+        -------
+        key: string
+            Hexadecimal digest identifying the problem.
+        """
+        params_split = params.split()
+        params_dict = dict(zip(params_split[::2], [float(x) for x in params_split[1::2]]))
+        sha = hashlib.sha1()
+        sha.update('%d\n' % num_tasks)
+        if not (network_fname is None or isinstance(network_fname, basestring)):
+            network_fname = super_network.as_network(network_fname).adjacency
+        for fname in [network_fname] + list(weights_fnames) + [covariance_fname]:
+            if fname is None:
+                sha.update('\n')
+            elif isinstance(fname, basestring):
+                sha.update('%s\n' % self._get_file_digest(fname))
+            else:
+                sha.update('%s\n' % self._get_array_digest(fname))
+        for param in ['-l', '-e', '-m']:
+            sha.update('%r\n' % (params_dict.get(param) or 0.))
+        return sha.hexdigest()
+
+
+    def get(self, key):
+        """ Get a result from the cache.
+
+        Returns
+        -------
+        result: tuple or None
+            (sel_list, records) as returned by run_in_process,
+            or None if the result is not in the cache.
+            The records hold the resources used by the run that stored the result:
+            they are marked with cached=True, so that they can be told apart.
+        """
+        fname = self._get_fname(key)
+        try:
+            with open(fname, 'rb') as f:
+                data = np.load(f)
+                sel_list = [sel.tolist() for sel in \
+                            np.split(data['indices'], data['offsets'][1:-1])]
+                records = [dict(record, cached=True) \
+                           for record in json.loads(str(data['records']))]
+                result = (sel_list, records)
+            # Mark as recently used
+            os.utime(fname, None)
+        except (IOError, OSError, KeyError, ValueError):
+            # Not in the cache, evicted / being written by another process,
+            # or stored by a previous version without records
+            self.num_misses += 1
+            return None
+        self.num_hits += 1
+        return result
+
+
+    def put(self, key, result):
+        """ Store a result in the cache.
+
+        Arguments
+        ---------
+        key: string
+            Key of the problem (see get_key).
+        result: tuple
+            (sel_list, records) as returned by run_in_process.
+        """
+        sel_list, records = result
+        fname = self._get_fname(key)
+        try:
+            os.makedirs(os.path.dirname(fname))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        # Write to a temporary file first, so that readers never see partial results
+        fd, tmp_fname = tempfile.mkstemp(dir=os.path.dirname(fname), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f,
+                                indices=np.array([x for sel in sel_list for x in sel],
+                                                 dtype=np.int32),
+                                offsets=np.cumsum([0] + [len(sel) for sel in sel_list]),
+                                records=np.array(json.dumps(records)))
+        os.rename(tmp_fname, fname)
+
+        if self.max_size is not None:
+            if self._size is None:
+                self._size = sum(size for (mtime, size, fname_) in self._list_files())
+            else:
+                self._size += os.path.getsize(fname)
+            if self._size > self.max_size:
+                self._evict()
+
+
+    def _evict(self):
+        """ Delete the least recently used results until the size of the cache
+        is EVICTION_FRACTION * max_size.
+        """
+        files = sorted(self._list_files())
+        self._size = sum(size for (mtime, size, fname) in files)
+        for (mtime, size, fname) in files:
+            if self._size <= self.EVICTION_FRACTION * self.max_size:
+                break
+            try:
+                os.remove(fname)
+            except OSError:
+                # Already evicted by another process
+                pass
+            self._size -= size
+
+
+    def _list_files(self):
+        """ List the results in the cache, as (mtime, size, fname). """
+        files = []
+        for dirpath, dirnames, fnames in os.walk(self.cache_dir):
+            for fname in fnames:
+                if fname.endswith('.npz'):
+                    fname = os.path.join(dirpath, fname)
+                    try:
+                        stat = os.stat(fname)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, fname))
+        return files
+
+
+    def _get_fname(self, key):
+        """ Path to the file of a result. """
+        return os.path.join(self.cache_dir, key[:2], '%s.npz' % key)
+
+
+    def _get_file_digest(self, fname):
+        """ Hash of the contents of a file, computed once per version of the file. """
+        stat = os.stat(fname)
+        file_id = (fname, stat.st_size, stat.st_mtime)
+        if file_id not in self._file_digests:
+            sha = hashlib.sha1()
+            with open(fname, 'rb') as f:
+                for block in iter(lambda: f.read(2**20), ''):
+                    sha.update(block)
+            self._file_digests[file_id] = sha.hexdigest()
+        return self._file_digests[file_id]
+
+
+    def _get_array_digest(self, data):
+        """ Hash of the contents of an in-memory array or sparse matrix. """
+        sha = hashlib.sha1()
+        if sp.issparse(data):
+            data = data.tocoo()
+            sha.update('%r\n' % (data.shape,))
+            for values in [data.row, data.col, data.data]:
+                sha.update(np.ascontiguousarray(values, dtype=float).tostring())
+        else:
+            data = np.ascontiguousarray(data, dtype=float)
+            sha.update('%r\n' % (data.shape,))
+            sha.update(data.tostring())
+        return sha.hexdigest()
+
+
+class ResultsStore(object):
+    """ Results of experiments, in a single HDF5 file (PyTables),
+    with one table per kind of result.
+
+    All tables have the columns
+        repeat: index of the repeat,
+        fold: index of the fold (-1 for results over all the folds of a repeat),
+        algo: algorithm ('sfan', 'msfan_np' or 'msfan'),
+    and, in addition:
+        selections: features selected for each task,
+            subsample: index of the subsample (-1 for the whole training set of the fold),
+            params: hyperparameters, in the '-l <lambda> -e <eta> -m <mu>' format,
+            task: index of the task,
+            features: selected features, packed (see pack_selections);
+        runtimes: resources used by each stage of each problem solved
+        (see multitask_sfan.Instrumentation),
+            subsample, params: as in selections,
+            stage: name of the stage ('setup', 'build', 'maxflow', ...),
+            wall_time, cpu_time: wall-clock and processor times, in seconds,
+            max_rss: maximum resident set size at the end of the stage, in kB,
+            gt_build_time, gt_maxflow_time: times spent by gt_maxflow building the graph
+            and computing the maximum flow, in seconds (0 for the other stages),
+            num_nodes, num_intra_edges, num_cross_edges, num_terminal_edges: size of the
+            super-network (0 except for the 'build' stage),
+            cached: whether the result of the problem was read from a ResultCache,
+            in which case the resources are those used by the run that stored it
+            (to exclude from timings, e.g. with the condition '~cached');
+        parameters: optimal hyperparameters,
+            params: as in selections;
+        measures: evaluation measures,
+            task: index of the task,
+            measure: name of the measure ('acc', 'mcc', 'ppv', 'tpr', 'rmse', 'ci'),
+            value: value of the measure.
+
+    Several processes can access the store at the same time: the file is only
+    open during each access, with a lock (fcntl.flock on <fname>.lock).
+
+    Attributes
+    ----------
+    self.fname: filename
+        Path to the HDF5 file.
+    self.num_features: int
+        Number of features.
+    """
+    TABLE_NAMES = ['selections', 'runtimes', 'parameters', 'measures']
+    # Maximum length of the string columns
+    STRING_SIZES = {'algo': 16, 'params': 64, 'measure': 16, 'stage': 16}
+    # Columns of the runtimes table holding the values of the records
+    RECORD_COLUMNS = ['wall_time', 'cpu_time', 'max_rss', 'gt_build_time', 'gt_maxflow_time',
+                      'num_nodes', 'num_intra_edges', 'num_cross_edges', 'num_terminal_edges',
+                      'cached']
+
+    def __init__(self, fname, num_features):
+        """
+        Parameters
+        ----------
+        fname: filename
+            Path to the HDF5 file (created if it does not exist).
+        num_features: int
+            Number of features.
+        """
+        self.fname = fname
+        self.num_features = num_features
+        with self._open('a') as h5f:
+            if 'num_features' not in h5f.root._v_attrs:
+                h5f.root._v_attrs.num_features = num_features
+            elif h5f.root._v_attrs.num_features != num_features:
+                raise ValueError("%s holds results for %d features, not %d" % \
+                                 (fname, h5f.root._v_attrs.num_features, num_features))
+            for table_name in self.TABLE_NAMES:
+                if table_name not in h5f.root:
+                    h5f.create_table(h5f.root, table_name,
+                                     self._get_description(table_name),
+                                     filters=tb.Filters(complevel=5, complib='blosc'))
+
+
+    def append(self, table_name, **columns):
+        """ Append rows to a table.
+
+        Arguments
+        ---------
+        table_name: string
+            Name of the table, in TABLE_NAMES.
+        columns: keyword arguments
+            Values of each column of the table, either one per row
+            or one for all the rows.
+
+        Example
+        -------
+        store.append('parameters', repeat=0, fold=[0, 1], algo='sfan',
+                     params=['-l 1e-3 -e 1e-2', '-l 1e-3 -e 1e-1'])
+        """
+        description = self._get_description(table_name)
+        if set(columns) != set(description):
+            raise ValueError("the columns of %s are %s" % \
+                             (table_name, ', '.join(sorted(description))))
+        num_rows = 1
+        for name, values in columns.iteritems():
+            if name in self.STRING_SIZES:
+                if max(len(x) for x in np.atleast_1d(values)) > self.STRING_SIZES[name]:
+                    raise ValueError("%s values must not be longer than %d characters" % \
+                                     (name, self.STRING_SIZES[name]))
+            if np.ndim(values) > len(description[name].shape):
+                num_rows = len(values)
+        with self._open('a') as h5f:
+            table = h5f.get_node(h5f.root, table_name)
+            rows = np.zeros(num_rows, dtype=table.dtype)
+            for name, values in columns.iteritems():
+                rows[name] = values
+            table.append(rows)
+
+
+    def append_runtimes(self, repeat, fold, algo, runs):
+        """ Append the records of problems to the runtimes table, one row per stage.
+
+        Arguments
+        ---------
+        repeat, fold, algo:
+            Values of the columns for all the rows.
+        runs: list of tuples
+            (subsample, params, records) for each problem, where records are
+            the records of its stages (see multitask_sfan.Instrumentation).
+        """
+        rows = [(subsample, params, record) for (subsample, params, records) in runs \
+                for record in records]
+        if not rows:
+            return
+        columns = dict((name, [record.get(name, 0) for (subsample, params, record) in rows]) \
+                       for name in self.RECORD_COLUMNS)
+        self.append('runtimes', repeat=repeat, fold=fold, algo=algo,
+                    subsample=[subsample for (subsample, params, record) in rows],
+                    params=[params for (subsample, params, record) in rows],
+                    stage=[str(record['stage']) for (subsample, params, record) in rows],
+                    **columns)
+
+
+    def read(self, table_name, condition=None):
+        """ Read the rows of a table.
+
+        Arguments
+        ---------
+        table_name: string
+            Name of the table, in TABLE_NAMES.
+        condition: {string, None}, optional
+            If given, only read the rows for which it is true, e.g.
+            '(repeat == 0) & (algo == "sfan")' (see tables.Table.read_where).
+
+        Returns
+        -------
+        rows: numpy structured array
+            One entry per row, one field per column.
+        """
+        with self._open('r') as h5f:
+            table = h5f.get_node(h5f.root, table_name)
+            if condition is None:
+                return table.read()
+            return table.read_where(condition)
+
+
+    def remove(self, table_name, condition=None):
+        """ Remove the rows of a table (for which condition is true, if given).
+
+        Only the matching rows are touched: nothing is written if there are none.
+        """
+        with self._open('a') as h5f:
+            table = h5f.get_node(h5f.root, table_name)
+            if condition is None:
+                table.truncate(0)
+                return
+            coords = table.get_where_list(condition)
+            if not len(coords):
+                return
+            # Remove contiguous ranges of rows, last ones first so that
+            # the indices of the others do not change
+            breaks = np.flatnonzero(np.diff(coords) != 1) + 1
+            for run in reversed(np.split(coords, breaks)):
+                table.remove_rows(run[0], run[-1] + 1)
+
+
+    def get_means(self, table_name, column, by, condition=None):
+        """ Average the values of a column of a table over groups of rows.
+
+        Arguments
+        ---------
+        table_name: string
+            Name of the table, in TABLE_NAMES.
+        column: string
+            Name of the numerical column to average.
+        by: list of strings
+            Names of the columns defining the groups.
+        condition: {string, None}, optional
+            If given, only use the rows for which it is true (see read).
+
+        Returns
+        -------
+        means: dictionary
+            keys = tuple of the values of the columns by
+            values = mean of column over the rows with these values
+        """
+        rows = self.read(table_name, condition)
+        if not len(rows):
+            return {}
+        keys, inverse = np.unique(rows[by], return_inverse=True)
+        means = np.bincount(inverse, weights=rows[column]) / np.bincount(inverse)
+        return dict((tuple(key), mean) for (key, mean) in zip(keys.tolist(), means))
+
+
+    @contextlib.contextmanager
+    def _open(self, mode):
+        """ Open the HDF5 file, holding a shared (mode 'r') or exclusive lock. """
+        with open(self.fname + '.lock', 'a') as lock_f:
+            fcntl.flock(lock_f, fcntl.LOCK_SH if mode == 'r' else fcntl.LOCK_EX)
+            try:
+                with tb.open_file(self.fname, mode) as h5f:
+                    yield h5f
+            finally:
+                fcntl.flock(lock_f, fcntl.LOCK_UN)
+
+
+    def _get_description(self, table_name):
+        """ Columns of a table. """
+        description = {'repeat': tb.Int32Col(pos=0),
+                       'fold': tb.Int32Col(pos=1),
+                       'algo': tb.StringCol(self.STRING_SIZES['algo'], pos=2)}
+        if table_name in ['selections', 'runtimes']:
+            description['subsample'] = tb.Int32Col(pos=3)
+        if table_name in ['selections', 'runtimes', 'parameters']:
+            description['params'] = tb.StringCol(self.STRING_SIZES['params'], pos=4)
+        if table_name in ['selections', 'measures']:
+            description['task'] = tb.Int32Col(pos=5)
+        if table_name == 'selections':
+            description['features'] = tb.UInt8Col(shape=((self.num_features + 7) / 8, ),
+                                                  pos=6)
+        elif table_name == 'runtimes':
+            description['stage'] = tb.StringCol(self.STRING_SIZES['stage'], pos=6)
+            for (pos, name) in enumerate(self.RECORD_COLUMNS, 7):
+                if name.startswith('num_') or name == 'max_rss':
+                    description[name] = tb.Int64Col(pos=pos)
+                elif name == 'cached':
+                    description[name] = tb.BoolCol(pos=pos)
+                else:
+                    description[name] = tb.Float64Col(pos=pos)
+        elif table_name == 'measures':
+            description['measure'] = tb.StringCol(self.STRING_SIZES['measure'], pos=6)
+            description['value'] = tb.Float64Col(pos=7)
+        elif table_name != 'parameters':
+            raise ValueError("unknown table %s" % table_name)
+        return description
+
+
+GRID_SEARCH_ALGOS = ['sfan', 'msfan_np', 'msfan']
+
+# Solver reused by the grid search jobs run in the same process
+_grid_search_warm_solver = None
+
+
+def run_grid_search(num_tasks, network_fname, weights_fnames_list, params_dict,
+                    covariance_fname, num_features, num_workers=1, in_process=True,
+                    path_mode=True, batch_mode=True, cache=None):
+    """ Select features with each algorithm, for each value of its hyperparameters,
+    on each subsample.
+
+    The problems are independent: they are split in jobs, run by a pool of
+    num_workers processes. A job solves the problems of one algorithm on one subsample,
+    either for one value of the hyperparameters, or, in path mode, for all the values
+    that only differ by eta (see run_path_in_process), or, in batch mode, for all
+    the values (see run_batch).
+
+    Arguments
+    ---------
+    num_tasks: int
+        Number of tasks.
+    network_fname: {filename, Network, adjacency matrix}
+        Path to the network file, or network (see super_network.as_network).
+    weights_fnames_list: list of list of {filenames, arrays}
+        For each subsample, paths to the network nodes files, or node weights
+        (one per task).
+    params_dict: dictionary
+        keys = algorithm, in GRID_SEARCH_ALGOS
+        values = list of hyperparameters, in the '-l <lambda> -e <eta> -m <mu>' format
+        ('-l <lambda> -e <eta>' for sfan).
+    covariance_fname: filename
+        Path to the matrix of covariance (similarity) of tasks, for msfan.
+    num_features: int
+        Total number of features.
+    num_workers: {int, 1}, optional
+        Number of processes solving the problems. If 1, they are solved
+        within the current process.
+    in_process: {boolean, True}, optional
+        If true, solve within the worker processes (see run_in_process)
+        instead of running multitask_sfan.py externally.
+    path_mode: {boolean, True}, optional
+        If true (and in_process), solve the values of eta of each value of lambda
+        and mu together (see run_path_in_process) instead of each problem independently.
+    batch_mode: {boolean, True}, optional
+        If true (and not in_process), run a single multitask_sfan.py process
+        per algorithm and subsample, instead of one per problem.
+    cache: {ResultCache, None}, optional
+        Cache of results: problems whose result is in the cache are not solved,
+        and the results of the others are added to it.
+
+    Returns
+    -------
+    selected_dict: dictionary
+        keys = algorithm
+        values = dictionary of selected features, in the format of
+        get_optimal_parameters_from_dict, packed (see pack_selections).
+    runtimes_dict: dictionary
+        keys = algorithm
+        values = dictionary
+            keys = hyperparameters
+            values = list of records (see run_in_process), one per subsample.
+    """
+    jobs = []
+    for algo in GRID_SEARCH_ALGOS:
+        if in_process and path_mode:
+            # Hyperparameters on the same eta path
+            groups = {}
+            for params in params_dict[algo]:
+                params_split = params.split()
+                key = tuple(x for x in zip(params_split[::2], params_split[1::2]) \
+                            if x[0] != '-e')
+                groups.setdefault(key, []).append(params)
+            params_lists = groups.values()
+        elif not in_process and batch_mode:
+            params_lists = [list(params_dict[algo])] if params_dict[algo] else []
+        else:
+            params_lists = [[params] for params in params_dict[algo]]
+        for ss_idx, weights_fnames in enumerate(weights_fnames_list):
+            for params_list in params_lists:
+                jobs.append((algo, ss_idx, params_list, num_tasks, network_fname,
+                             weights_fnames, covariance_fname, in_process, path_mode,
+                             batch_mode, cache))
+
+    if num_workers > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(num_workers, len(jobs)))
+        jobs_results = pool.map(_run_grid_search_job, jobs, chunksize=1)
+        pool.close()
+        pool.join()
+    else:
+        jobs_results = [_run_grid_search_job(job) for job in jobs]
+    # (algo, ss_idx) -> {params: (sel_list, records)}
+    results = {}
+    for job, job_results in zip(jobs, jobs_results):
+        results.setdefault(job[:2], {}).update(job_results)
+
+    # Same order as when solving the problems one after the other
+    selected_dict = {}
+    runtimes_dict = {}
+    for algo in GRID_SEARCH_ALGOS:
+        selected_dict[algo] = {}
+        for params in params_dict[algo]:
+            sel_lists = [results[(algo, ss_idx)][params][0] \
+                         for ss_idx in range(len(weights_fnames_list))]
+            selected_dict[algo][params] = dict(
+                (task_idx, pack_selections([sel_list[task_idx] for sel_list in sel_lists],
+                                           num_features)) \
+                for task_idx in range(num_tasks))
+        runtimes_dict[algo] = dict(
+            (params, [results[(algo, ss_idx)][params][1] \
+                      for ss_idx in range(len(weights_fnames_list))]) \
+            for params in params_dict[algo])
+    return selected_dict, runtimes_dict
+
+
+def run_successive_halving(num_tasks, network_fname, weights_fnames_list, params_dict,
+                           covariance_fname, num_features, num_workers=1, in_process=True,
+                           path_mode=True, batch_mode=True, min_subsamples=2,
+                           keep_fraction=0.5, cache=None):
+    """ Same as run_grid_search, but hyperparameters that are clearly not optimal
+    are dropped early, by successive halving.
+
+    All hyperparameters are first evaluated on min_subsamples subsamples.
+    After each round, the hyperparameters leading to trivial selections (empty or
+    all features, on all subsamples and tasks) are dropped, and only the best
+    keep_fraction of the others, according to the mean consistency index
+    (see get_optimal_parameters_from_dict), are kept. The remaining ones are evaluated
+    on twice as many subsamples at the next round, until all subsamples are used.
+
+    Arguments
+    ---------
+    num_features: int
+        Total number of features.
+    min_subsamples: {int, 2}, optional
+        Number of subsamples of the first round (at least 2).
+    keep_fraction: {float, 0.5}, optional
+        Fraction of the hyperparameters kept after each round.
+
+    See run_grid_search for the other arguments.
+
+    Returns
+    -------
+    selected_dict: dictionary
+        keys = algorithm
+        values = dictionary of selected features, in the format of
+        get_optimal_parameters_from_dict, for the hyperparameters that
+        were kept until the last round only.
+    runtimes_dict: dictionary
+        keys = algorithm
+        values = dictionary
+            keys = hyperparameters
+            values = list of records (see run_in_process),
+            for each subsample on which the hyperparameters were evaluated.
+    """
+    num_subsamples = len(weights_fnames_list)
+    candidates = dict((algo, list(params_list)) for (algo, params_list) in params_dict.iteritems())
+    selected_dict = dict((algo, {}) for algo in params_dict)
+    runtimes_dict = dict((algo, {}) for algo in params_dict)
+
+    num_done = 0
+    num_next = min(max(2, min_subsamples), num_subsamples)
+    while True:
+        round_selected_dict, round_runtimes_dict = run_grid_search(
+            num_tasks, network_fname, weights_fnames_list[num_done:num_next], candidates,
+            covariance_fname, num_features, num_workers=num_workers,
+            in_process=in_process, path_mode=path_mode, batch_mode=batch_mode,
+            cache=cache)
+        for algo, params_list in candidates.iteritems():
+            for params in params_list:
+                selected_dict_p = selected_dict[algo].setdefault(params, {})
+                for task_idx, selections in round_selected_dict[algo][params].iteritems():
+                    if task_idx in selected_dict_p:
+                        selections = np.vstack([selected_dict_p[task_idx], selections])
+                    selected_dict_p[task_idx] = selections
+                runtimes_dict[algo].setdefault(params, []).extend(
+                    round_runtimes_dict[algo][params])
+        num_done = num_next
+        if num_done == num_subsamples:
+            break
+
+        for algo, params_list in candidates.iteritems():
+            candidates[algo] = _get_best_parameters(params_list, selected_dict[algo],
+                                                    num_features, keep_fraction)
+            logging.info("successive halving: %d subsamples, %d / %d %s hyperparameters kept" % \
+                         (num_done, len(candidates[algo]), len(params_list), algo))
+        num_next = min(2 * num_done, num_subsamples)
+
+    selected_dict = dict((algo, dict((params, selected_dict[algo][params]) \
+                                     for params in params_list)) \
+                         for (algo, params_list) in candidates.iteritems())
+    return selected_dict, runtimes_dict
+
+
+def _get_best_parameters(params_list, selected_dict, num_features, keep_fraction):
+    """ Get the hyperparameters of params_list kept by a round of successive halving
+    (see run_successive_halving), in the same order.
+    """
+    if not params_list:
+        return params_list
+    selections = _stack_selections(selected_dict, params_list, num_features)
+    sizes = np.sum(_POPCOUNT[selections], axis=-1, dtype=np.int64)
+    ci_means = np.mean(consistency_index_packed(selections, num_features), axis=1)
+    # Drop trivial selections on all subsamples and tasks
+    ci_means = dict((params, ci_mean) for (params, ci_mean, params_sizes) in \
+                    zip(params_list, ci_means, sizes) \
+                    if not np.all((params_sizes == 0) | (params_sizes == num_features)))
+    if not ci_means:
+        return params_list
+    num_kept = int(math.ceil(keep_fraction * len(ci_means)))
+    # Hyperparameters tied with the last kept one are kept too
+    ci_min = sorted(ci_means.values(), reverse=True)[num_kept - 1]
+    return [params for params in params_list if params in ci_means and \
+            ci_means[params] >= ci_min]
+
+
+def run_adaptive_search(num_tasks, network_fname, weights_fnames_list, params_dict,
+                        covariance_fname, num_features, budget, num_workers=1,
+                        in_process=True, path_mode=True, batch_mode=True, cache=None):
+    """ Same as run_grid_search, but instead of evaluating all the hyperparameters
+    of params_dict, a given number of problems is solved for hyperparameters
+    chosen adaptively, within the range of those of params_dict.
+
+    For each algorithm, the search starts from the center of the box bounding
+    the hyperparameters of params_dict, in log scale, and its neighbours along
+    each coordinate (at half the width of the box). At each round, the neighbours
+    of the hyperparameters with the best mean consistency index so far (see
+    get_optimal_parameters_from_dict) are evaluated, and the distance to the
+    neighbours is halved when the best hyperparameters did not change.
+
+    Arguments
+    ---------
+    num_features: int
+        Total number of features.
+    budget: int
+        Maximum number of problems solved for each algorithm (each hyperparameter
+        is evaluated on all subsamples, that is to say on len(weights_fnames_list)
+        problems).
+
+    See run_grid_search for the other arguments.
+
+    Returns
+    -------
+    selected_dict: dictionary
+        keys = algorithm
+        values = dictionary of selected features, in the format of
+        get_optimal_parameters_from_dict, packed (see pack_selections),
+        for all the evaluated hyperparameters.
+    runtimes_dict: dictionary
+        keys = algorithm
+        values = dictionary of records for each subsample, in the format
+        of run_grid_search, for all the evaluated hyperparameters.
+    """
+    max_points = max(1, budget / len(weights_fnames_list))
+    searches = dict((algo, _CoordinateSearch(params_list, max_points)) \
+                    for (algo, params_list) in params_dict.iteritems() if params_list)
+    selected_dict = dict((algo, {}) for algo in params_dict)
+    runtimes_dict = dict((algo, {}) for algo in params_dict)
+
+    while True:
+        candidates = dict((algo, []) for algo in params_dict)
+        for algo, search in searches.iteritems():
+            candidates[algo] = search.propose()
+        if not any(candidates.values()):
+            break
+        round_selected_dict, round_runtimes_dict = run_grid_search(
+            num_tasks, network_fname, weights_fnames_list, candidates,
+            covariance_fname, num_features, num_workers=num_workers,
+            in_process=in_process, path_mode=path_mode, batch_mode=batch_mode,
+            cache=cache)
+        for algo, params_list in candidates.iteritems():
+            if not params_list:
+                continue
+            selected_dict[algo].update(round_selected_dict[algo])
+            runtimes_dict[algo].update(round_runtimes_dict[algo])
+            ci_means = np.mean(consistency_index_packed(
+                _stack_selections(round_selected_dict[algo], params_list, num_features),
+                num_features), axis=1)
+            searches[algo].update(params_list, ci_means)
+            logging.info("adaptive search: %d %s hyperparameters evaluated, best %s (%.3f)" % \
+                         (len(selected_dict[algo]), algo, searches[algo].best_params,
+                          searches[algo].best_ci_mean))
+    return selected_dict, runtimes_dict
+
+
+class _CoordinateSearch(object):
+    """ Coordinate search of the hyperparameters with the best consistency index,
+    in log scale (see run_adaptive_search).
+    """
+    # Smallest distance between hyperparameters, in log10 scale
+    MIN_STEP = 1e-2
+
+    def __init__(self, params_list, max_points):
+        """
+        Parameters
+        ----------
+        params_list: list of strings
+            Hyperparameters, in the '-l <lambda> -e <eta> -m <mu>' format,
+            defining the range of the search.
+        max_points: int
+            Maximum number of hyperparameters evaluated.
+        """
+        self.names = params_list[0].split()[::2]
+        log_values = np.log10([[float(x) for x in params.split()[1::2]] \
+                               for params in params_list])
+        self.lower = np.min(log_values, axis=0)
+        self.upper = np.max(log_values, axis=0)
+        self.step = (self.upper - self.lower) / 2
+        self.max_points = max_points
+        self.ci_means = {}
+        self.best_params = None
+        self.best_ci_mean = -np.inf
+
+
+    def propose(self):
+        """ Get the next hyperparameters to evaluate
+        (an empty list when the search is over).
+        """
+        num_points = self.max_points - len(self.ci_means)
+        if self.best_params is None:
+            center = (self.lower + self.upper) / 2
+            candidates = [self._format(center)] + self._get_neighbours(center)
+        else:
+            while True:
+                candidates = self._get_neighbours(self._parse(self.best_params))
+                if candidates or np.all(self.step < self.MIN_STEP):
+                    break
+                self.step /= 2
+        return candidates[:max(0, num_points)]
+
+
+    def update(self, params_list, ci_means):
+        """ Record the mean consistency index of evaluated hyperparameters. """
+        improved = False
+        for params, ci_mean in zip(params_list, ci_means):
+            self.ci_means[params] = ci_mean
+            if ci_mean > self.best_ci_mean:
+                self.best_params = params
+                self.best_ci_mean = ci_mean
+                improved = True
+        if not improved:
+            self.step /= 2
+
+
+    def _get_neighbours(self, log_values):
+        """ Hyperparameters at distance self.step of log_values along each coordinate,
+        within the range of the search, and not evaluated yet.
+        """
+        neighbours = []
+        for idx in range(len(self.names)):
+            for sign in (-1, 1):
+                log_neighbour = log_values.copy()
+                log_neighbour[idx] = np.clip(log_neighbour[idx] + sign * self.step[idx],
+                                             self.lower[idx], self.upper[idx])
+                params = self._format(log_neighbour)
+                if params not in self.ci_means and params not in neighbours:
+                    neighbours.append(params)
+        return neighbours
+
+
+    def _format(self, log_values):
+        return ' '.join('%s %.2e' % (name, 10**value) \
+                        for (name, value) in zip(self.names, log_values))
+
+
+    def _parse(self, params):
+        return np.log10([float(x) for x in params.split()[1::2]])
+
+
+def _run_grid_search_job(job):
+    """ Run a job of run_grid_search.
+
+    Returns a dictionary of (sel_list, records) indexed by hyperparameters.
+    """
+    global _grid_search_warm_solver
+    (algo, ss_idx, params_list, num_tasks, network_fname, weights_fnames,
+     covariance_fname, in_process, path_mode, batch_mode, cache) = job
+    if algo != 'msfan':
+        covariance_fname = None
+
+    cached_results = {}
+    if cache is not None:
+        keys = dict((params, cache.get_key(num_tasks, network_fname, weights_fnames,
+                                           params, covariance_fname=covariance_fname)) \
+                    for params in params_list)
+        for params in params_list:
+            result = cache.get(keys[params])
+            if result is not None:
+                cached_results[params] = result
+        params_list = [params for params in params_list if params not in cached_results]
+        if not params_list:
+            return cached_results
+
+    if in_process and _grid_search_warm_solver is None:
+        _grid_search_warm_solver = multitask_sfan.WarmStartSolver()
+    warm_solver = _grid_search_warm_solver
+
+    if in_process and path_mode:
+        results = run_path_in_process(num_tasks, network_fname, weights_fnames,
+                                      [("%s -m 0" % params) if algo == 'sfan' else params \
+                                       for params in params_list],
+                                      covariance_fname=covariance_fname,
+                                      warm_solver=warm_solver)
+    elif not in_process and batch_mode:
+        results = run_batch(num_tasks, [(network_fname, weights_fnames, covariance_fname,
+                                         ("%s -m 0" % params) if algo == 'sfan' else params) \
+                                        for params in params_list])
+    elif algo == 'sfan':
+        results = [run_sfan(num_tasks, network_fname, weights_fnames, params,
+                            in_process=in_process, warm_solver=warm_solver) \
+                   for params in params_list]
+    elif algo == 'msfan_np':
+        results = [run_msfan_nocorr(num_tasks, network_fname, weights_fnames, params,
+                                    in_process=in_process, warm_solver=warm_solver) \
+                   for params in params_list]
+    else:
+        results = [run_msfan(num_tasks, network_fname, weights_fnames, covariance_fname,
+                             params, in_process=in_process, warm_solver=warm_solver) \
+                   for params in params_list]
+
+    if cache is not None:
+        for params, result in zip(params_list, results):
+            cache.put(keys[params], result)
+    cached_results.update(zip(params_list, results))
+    return cached_results
+
+
 def run_ridge_selected(selected_features, genotype_fname, phenotype_fname,
                        tr_indices, te_indices, output_fname):
     """ Run a ridge-regression using only the selected features.
@@ -561,7 +1915,6 @@ def evaluate_classification(causal_features, selected_features, num_features):
     return acc_list, mcc_list, pre_list, spe_list
 
 
-<<<<<<< HEAD
 def compute_ppv_sensitivity(causal_fname, selected_list, num_features):
     """ Compute PPV (Positive Predicted Values) = Accuracy = Precision
     and sensitivity (true positive rate) for all tasks.
@@ -791,3 +2144,34 @@ class Framework(object):
                 with open(ssIndices_fname  %(fold_idx,ss_idx), 'w') as ssIndices_f:
                     ssIndices_f.write(  " ".join(str(i) for i in self.xp_indices[fold_idx]["ssIndices"][ss_idx] ) )
                 #np.savetxt(ssIndices_fname  %(fold_idx,ss_idx), self.xp_indices[fold_idx]["ssIndices"][ss_idx], delimiter=' ', fmt='%d')
+
+
+    def load_indices(self, out_dir, simu_id):
+        """ Load the cross-validation folds and subsample indices
+        saved to files by save_indices.
+
+        Parameters
+        ----------
+        out_dir : dir path
+            fold where indices were saved
+        simu_id :  string
+            Name of the simulation, to be used to name files.
+
+        Modified attributes
+        -------------------
+        xp_indices: list of dictionaries
+            (see compute_indices)
+        """
+        trIndices_fname = out_dir+'/'+simu_id+'.fold%d.trIndices'
+        teIndices_fname = out_dir+'/'+simu_id+'.fold%d.teIndices'
+        ssIndices_fname = out_dir+'/'+simu_id+'.fold%d.ss%d.ssIndices'
+        for fold_idx in xrange(self.num_folds) : 
+            with open(trIndices_fname %(fold_idx), 'r') as trIndices_f : 
+                self.xp_indices[fold_idx]["trIndices"] = [int(i) for i in trIndices_f.read().split()]
+            with open(teIndices_fname %(fold_idx), 'r') as teIndices_f : 
+                self.xp_indices[fold_idx]["teIndices"] = [int(i) for i in teIndices_f.read().split()]
+            self.xp_indices[fold_idx]["ssIndices"] = []
+            for ss_idx in xrange(self.num_subsamples) :
+                with open(ssIndices_fname  %(fold_idx,ss_idx), 'r') as ssIndices_f:
+                    self.xp_indices[fold_idx]["ssIndices"].append(
+                        [int(i) for i in ssIndices_f.read().split()])
@@ -6,9 +6,10 @@ import logging
 import numpy as np
 import os
 import tables as tb
-import scipy.stats as st 
 import sys
 
+import score
+
 NUM_CAUSAL_TOTAL = 30 # total number of causal features
 NUM_CAUSAL_EACH = 20 # how many of these features are causal for each task
 MOD_SIZE = 15 # number of nodes in each fully connected module of the network.
@@ -156,6 +157,7 @@ class SyntheticDataGenerator(object):
         # generate phenotypes and Pearson scores, and save to file
         with tb.open_file(fname, 'r') as h5f:
             Xtr = h5f.root.Xtr
+            Y = np.zeros((self.num_samples, self.num_tasks))
             for task_idx in range(self.num_tasks):
                 y = Xtr[:NUM_CAUSAL_TOTAL,:].transpose().dot(beta.transpose()[:,
                                                                               task_idx])
@@ -165,12 +167,17 @@ class SyntheticDataGenerator(object):
                 np.savetxt(fname, y, fmt='%.3f')
                 logging.info("Phenotype for task %d saved under %s\n" % (task_idx,
                                                                          fname))
-
-                # compute feature-phenotype correlations
-                r2 = [st.pearsonr(Xtr[feat_idx, :].transpose(), y)[0]**2 \
-                      for feat_idx in range(self.num_features)]
-                fname = "%s/%s.scores_%d.txt" % (self.root_dir, self.simu_id, task_idx)
-                np.savetxt(fname, r2, fmt='%.3e')
+                Y[:, task_idx] = y
+
+            # compute feature-phenotype correlations, for all tasks at once,
+            # by blocks of features
+            fnames = ["%s/%s.scores_%d.txt" % (self.root_dir, self.simu_id, task_idx) \
+                      for task_idx in range(self.num_tasks)]
+            scores_files = [open(fname, 'w') for fname in fnames]
+            score.save_r2(Xtr, Y, scores_files)
+            for f in scores_files:
+                f.close()
+            for task_idx, fname in enumerate(fnames):
                 logging.info("Node weights for task %d saved under %s\n" % (task_idx,
                                                                             fname))
 
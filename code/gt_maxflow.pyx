@@ -1,5 +1,180 @@
 cdef extern from "c++sources/entry_point.cpp":
 	void entry_point(int argc, char *argv, int num_nodes)
-    
+	int entry_point_cut(char *argv, int size, int *cut, double *flow, double *cost)
+	int entry_point_cut_arrays(int num_nodes, int num_arcs, int source, int sink,
+				   const int *tails, const int *heads, const float *caps, const float *rev_caps,
+				   int size, int *cut, double *flow, double *cost)
+	int entry_point_cut_tensor(int num_tasks, int num_nodes_each, int num_arcs,
+				   const int *tails, const int *heads, const double *caps, const double *rev_caps,
+				   const double *task_scales, const double *coupling, const double *terminal_caps,
+				   int size, int *cut, double *flow, double *cost)
+	void entry_point_last_timings(double *build_time, double *maxflow_time)
+
 cpdef python_entry_point(char *argv, int num_nodes):
-	entry_point(1, argv, num_nodes)
\ No newline at end of file
+	entry_point(1, argv, num_nodes)
+
+def python_cut_entry_point(char *argv, int[::1] cut):
+	""" Solve the dimacs problem argv without printing anything.
+
+	cut is filled with 1 for the nodes on the source side of the minimum cut
+	and 0 for the others. It must hold (at least) one entry per node,
+	source and sink included.
+
+	Returns the flow value and the cost of the cut.
+	"""
+	cdef double flow = 0.
+	cdef double cost = 0.
+	if entry_point_cut(argv, cut.shape[0], &cut[0], &flow, &cost):
+		raise RuntimeError("gt_maxflow could not solve the problem")
+	return flow, cost
+
+def python_cut_arrays_entry_point(int num_nodes, int source, int sink,
+				  const int[::1] tails, const int[::1] heads,
+				  const float[::1] caps, const float[::1] rev_caps,
+				  int[::1] cut):
+	""" Same as python_cut_entry_point, but the graph is read directly
+	from contiguous int32 / float32 buffers instead of a dimacs description.
+
+	Arc pair e goes from tails[e] to heads[e] with capacity caps[e]
+	and from heads[e] to tails[e] with capacity rev_caps[e].
+	Node indices start at 0.
+	"""
+	cdef double flow = 0.
+	cdef double cost = 0.
+	cdef int num_arcs = tails.shape[0]
+	if heads.shape[0] != num_arcs or caps.shape[0] != num_arcs or rev_caps.shape[0] != num_arcs:
+		raise ValueError("tails, heads, caps and rev_caps must have the same length")
+	if num_arcs == 0:
+		raise ValueError("the graph has no arcs")
+	if entry_point_cut_arrays(num_nodes, num_arcs, source, sink,
+				  &tails[0], &heads[0], &caps[0], &rev_caps[0],
+				  cut.shape[0], &cut[0], &flow, &cost):
+		raise RuntimeError("gt_maxflow could not solve the problem")
+	return flow, cost
+
+def python_cut_tensor_entry_point(int num_tasks, int num_nodes_each,
+				  const int[::1] tails, const int[::1] heads,
+				  const double[::1] caps, const double[::1] rev_caps,
+				  const double[::1] task_scales, const double[:, ::1] coupling,
+				  const double[::1] terminal_caps, int[::1] cut):
+	""" Same as python_cut_arrays_entry_point, for a super-network whose tasks
+	all share the same network, without expanding it beforehand.
+
+	The shared network has one pair of arcs from tails[e] to heads[e]
+	(and back) for each e, with capacities caps[e] (and rev_caps[e]),
+	scaled by task_scales[t] in task t.
+	Node i of task t (index t * num_nodes_each + i) is linked to node i of task t2
+	with capacity coupling[t, t2], and to the source with capacity terminal_caps[v]
+	if it is non-negative, or to the sink with capacity -terminal_caps[v] otherwise.
+	The source and the sink come after the nodes of all tasks.
+	"""
+	cdef double flow = 0.
+	cdef double cost = 0.
+	cdef int num_arcs = tails.shape[0]
+	if heads.shape[0] != num_arcs or caps.shape[0] != num_arcs or rev_caps.shape[0] != num_arcs:
+		raise ValueError("tails, heads, caps and rev_caps must have the same length")
+	if task_scales.shape[0] != num_tasks or coupling.shape[0] != num_tasks or \
+	   coupling.shape[1] != num_tasks:
+		raise ValueError("task_scales and coupling must have one entry per task")
+	if terminal_caps.shape[0] < num_tasks * num_nodes_each:
+		raise ValueError("terminal_caps must have one entry per node")
+	if entry_point_cut_tensor(num_tasks, num_nodes_each, num_arcs,
+				  &tails[0] if num_arcs else NULL, &heads[0] if num_arcs else NULL,
+				  &caps[0] if num_arcs else NULL, &rev_caps[0] if num_arcs else NULL,
+				  &task_scales[0], &coupling[0, 0], &terminal_caps[0],
+				  cut.shape[0], &cut[0], &flow, &cost):
+		raise RuntimeError("gt_maxflow could not solve the problem")
+	return flow, cost
+
+def python_last_timings():
+	""" Wall-clock times (in seconds) of building the graph and of running maxflow,
+	for the last problem solved by one of the entry points above.
+
+	Returns (build_time, maxflow_time).
+	"""
+	cdef double build_time = 0.
+	cdef double maxflow_time = 0.
+	entry_point_last_timings(&build_time, &maxflow_time)
+	return build_time, maxflow_time
+
+cdef extern from "c++sources/gt_maxflow_sources/maxflow_warm.h":
+	cdef cppclass maxflow_warm:
+		int solve(const float *caps, const float *rev_caps, const float *terminal_caps,
+			  int size, int *cut, double *flow, double *cost)
+		bint warm_started()
+		double last_build_time()
+		double last_maxflow_time()
+	maxflow_warm *new_maxflow_warm(int n, int S, int T, int m, const int *tails, const int *heads)
+	void delete_maxflow_warm(maxflow_warm *solver)
+
+cdef class WarmMaxflow:
+	""" Maxflow solver for a sequence of problems on the same graph.
+
+	The graph has one pair of arcs from tails[e] to heads[e] (and back)
+	for each e, and one arc from the source to each other node and from each
+	other node to the sink. Node indices start at 0.
+	The graph is allocated once, and each call to solve starts from the flow
+	found by the previous one.
+	"""
+	cdef maxflow_warm *solver
+	cdef int num_nodes
+	cdef int num_arcs
+
+	def __cinit__(self, int num_nodes, int source, int sink,
+		      const int[::1] tails, const int[::1] heads):
+		cdef int e
+		self.num_nodes = num_nodes
+		self.num_arcs = tails.shape[0]
+		if heads.shape[0] != self.num_arcs:
+			raise ValueError("tails and heads must have the same length")
+		if num_nodes < 3 or not (0 <= source < num_nodes) or not (0 <= sink < num_nodes):
+			raise ValueError("invalid number of nodes, source or sink")
+		for e in range(self.num_arcs):
+			if not (0 <= tails[e] < num_nodes and 0 <= heads[e] < num_nodes):
+				raise ValueError("node out of range in arc %d" % e)
+		self.solver = new_maxflow_warm(num_nodes, source, sink, self.num_arcs,
+					       &tails[0] if self.num_arcs else NULL,
+					       &heads[0] if self.num_arcs else NULL)
+		if self.solver == NULL:
+			raise MemoryError("gt_maxflow could not build the graph")
+
+	def __dealloc__(self):
+		if self.solver != NULL:
+			delete_maxflow_warm(self.solver)
+
+	def solve(self, const float[::1] caps, const float[::1] rev_caps,
+		  const float[::1] terminal_caps, int[::1] cut):
+		""" Solve the problem with the given capacities.
+
+		caps[e] and rev_caps[e] are the capacities of the arcs from tails[e]
+		to heads[e] and back. Node v is linked to the source with capacity
+		terminal_caps[v] if it is non-negative, and to the sink with capacity
+		-terminal_caps[v] otherwise (entries of the source and sink are ignored).
+
+		cut is filled as in python_cut_entry_point.
+
+		Returns the flow value and the cost of the cut.
+		"""
+		cdef double flow = 0.
+		cdef double cost = 0.
+		if caps.shape[0] != self.num_arcs or rev_caps.shape[0] != self.num_arcs:
+			raise ValueError("caps and rev_caps must have one entry per pair of arcs")
+		if terminal_caps.shape[0] != self.num_nodes:
+			raise ValueError("terminal_caps must have one entry per node")
+		if self.solver.solve(&caps[0] if self.num_arcs else NULL,
+				     &rev_caps[0] if self.num_arcs else NULL,
+				     &terminal_caps[0], cut.shape[0], &cut[0], &flow, &cost):
+			raise RuntimeError("gt_maxflow could not solve the problem")
+		return flow, cost
+
+	property warm_started:
+		""" Whether the last solve started from the previous flow. """
+		def __get__(self):
+			return self.solver.warm_started()
+
+	property last_timings:
+		""" Wall-clock times (in seconds) of the last solve: setting the capacities
+		(and building the graph, for the first solve), and running maxflow.
+		"""
+		def __get__(self):
+			return self.solver.last_build_time(), self.solver.last_maxflow_time()
@@ -63,25 +63,46 @@ def print_and_save_measure_table(measure_name, data, out_fname):
 
 
 
-def extract_plotable_data_from_analysis_files(f_names, num_tasks, num_repeats, num_folds):
-    """ Extract plotable data from analsis files 
+def save_measures(store, repeat_idx, fold_idx, algo, measures_dict):
+    """ Save measures, for each task, in the results store.
 
     Arguments
     ---------
-    f_names : filenames
-        Path to files in the order st, np, msfan
-        holding values whith space separated lists of values :
-        -    one per task for each fold,
-             or just one per task
-        - one line per repeat
+    store : ef.ResultsStore
+        Results store.
+    repeat_idx : int
+        Index of the repeat.
+    fold_idx : int
+        Index of the fold, or -1 for measures over all the folds of the repeat.
+    algo : string
+        Algorithm ('sfan', 'msfan_np' or 'msfan').
+    measures_dict : dictionary
+        measures_dict[measure_name] = list of values, one per task.
+    """
+    measure_names = sorted(measures_dict)
+    store.append('measures', repeat=repeat_idx, fold=fold_idx, algo=algo,
+                 task=[task_idx for measure_name in measure_names \
+                       for task_idx in xrange(len(measures_dict[measure_name]))],
+                 measure=[measure_name for measure_name in measure_names \
+                          for value in measures_dict[measure_name]],
+                 value=[value for measure_name in measure_names \
+                        for value in measures_dict[measure_name]])
+
+
+
+def extract_plotable_data_from_store(store, measure_name, num_tasks, num_repeats):
+    """ Extract plotable data from the results store
+
+    Arguments
+    ---------
+    store : ef.ResultsStore
+        Results store.
+    measure_name : string
+        Name of the measure ('acc', 'mcc', 'ppv', 'tpr', 'rmse' or 'ci').
     num_tasks: int
         Number of tasks. 
     num_repeat : int 
         Number of repeat
-    num_folds : int
-        Number of folds.
-        Needed for ppv and tpr files 
-        because values per repeat are per fold then per task. 
 
     Return
     -------
@@ -91,33 +112,18 @@ def extract_plotable_data_from_analysis_files(f_names, num_tasks, num_repeats, n
         for the sample sample_idx, 
         for the task task_idx, 
         for the algo algo_name.
+        Measures computed for each fold are averaged over the folds of a repeat.
     """
     data = {}
-    algos = ('SConES', 'MSConESnp', 'MSConES')
-
-    # for acc, mcc, ppv and tpr file for which values per repeat = per line 
-    # are per fold, then per task, 
-    # we have to compute means per task taking account of value per repeat and per fold. 
-    for algo_idx, algo in enumerate(algos) : 
-        data_for_an_algo  = [[float() for i in xrange(num_repeats)] for j in xrange(num_tasks)]
-        with open (f_names[algo_idx], 'r') as f : 
-            # for repeat_idx, line in enumerate(f) :
-            for repeat_idx in xrange(num_repeats) : 
-                line = f.readline()
-                line_content = [float (item) for item in line.split()]
-                # line_content contains every float of the line 
-                for task_idx in xrange(num_tasks) :
-                    # we get values for the current task in content_for_a_task using a slice : 
-                    # - if data are holded one line per repeat, then per task, for each fold, 
-                    #   the slice take values stepped by num_tasks until the end of the line
-                    # - if data are holded one line per repeat, one column per task as mean for every fold, 
-                    #   then it works too, taking the task_idx th value
-                    content_for_a_task = line_content[task_idx::num_tasks]
-                    #print content_for_a_task
-                    # content_for_a_task_contains float of the current task for each folds of the current repeat
-                    # we take the mean of them to have the mean of the repeat
-                    data_for_an_algo[task_idx][repeat_idx]  = np.mean(content_for_a_task)
-            data[ algos[algo_idx] ] = data_for_an_algo
+    algos = ('sfan', 'msfan_np', 'msfan')
+    algos_names = ('SConES', 'MSConESnp', 'MSConES')
+
+    means = store.get_means('measures', 'value', ['algo', 'task', 'repeat'],
+                            'measure == "%s"' % measure_name)
+    for algo, algo_name in zip(algos, algos_names):
+        data[algo_name] = [[means[(algo, task_idx, repeat_idx)] \
+                            for repeat_idx in xrange(num_repeats)] \
+                           for task_idx in xrange(num_tasks)]
     return data
 
 
@@ -167,26 +173,16 @@ if __name__ == "__main__":
 
 
 
-    For each algo in (`sfan`, `msfan_np`, `msfan`):
+    In the 'measures' table of the results store <resu_dir>/<simu_id>.results.h5
+    (see ef.ResultsStore), for each algo in (`sfan`, `msfan_np`, `msfan`) and each task:
 
-        <resu_dir>/<simu_id>.<algo>.rmse : 
-          List of final RMSEs 
-          one line per repeat
-          for each repeat, one value per task
-        <resu_dir>/<simu_id>.<algo>.consistency : 
-          List of final Consistency Indices 
-          one line per repeat
-          for each repeat, one value per task
+        rmse, ci : 
+          Final RMSE and consistency index of each repeat (fold -1).
 
-        For each classification measure 
-        (accuracy (acc), Mathieu coefficient (mcc), Prositive Predictive Value (ppv) and True Positive Value (tpr) )
-        a file named `<resu_dir>/<simu_id>.<algo>.<measure>` :
-        <args.resu_dir>/<simu_id>.<algo>.acc
-        <args.resu_dir>/<simu_id>.<algo>.mcc
-        <args.resu_dir>/<simu_id>.<algo>.ppv
-        <args.resu_dir>/<simu_id>.<algo>.tpr 
-            Space-separated lists of PPVs (one value per task and per fold),
-            each line corresponds to one repeat. 
+        acc, mcc, ppv, tpr : 
+          Classification measures 
+          (accuracy (acc), Mathieu coefficient (mcc), Prositive Predictive Value (ppv)
+          and True Positive Value (tpr)) of each repeat and fold.
 
 
         #### For each repeat, fold and task : 
@@ -218,13 +214,15 @@ if __name__ == "__main__":
     """
     args = sde.get_integrous_arguments_values()
 
+    # Measures are all computed again
+    store = sde.get_results_store(args.resu_dir, args.simu_id, args.num_features)
+    store.remove('measures')
+
     for repeat_idx in xrange(args.num_repeats) : 
         print '=========== repeat : ', repeat_idx
         resu_dir = "%s/repeat_%d" % (args.resu_dir, repeat_idx)
         data_dir = '%s/repeat_%d' % (args.data_dir, repeat_idx)
         
-
-        analysis_files = sde.get_analysis_files_names(args.resu_dir, args.simu_id)
         #-----------------
         genotype_fname = '%s/%s.genotypes.txt' % (data_dir, args.simu_id)
         #------------------
@@ -322,39 +320,16 @@ if __name__ == "__main__":
                                                             args.num_features)
 
             #--------------------------------------------------------------------------------
-            # Measure saving in <measure>_fname
-            # print in analysis files 
-            # Files structure : 
-            # 1 line per repeat
-            # on each line : valTask1, valTask2, ... valTaskn for each fold
-            
-            with open(analysis_files['acc_st'], 'a') as f:
-                f.write('%s ' % ' '.join(['%.2f ' % x for x in acc_list_st]))
-            with open(analysis_files['acc_msfan_np'], 'a') as f:
-                f.write('%s ' % ' '.join(['%.2f ' % x for x in acc_list_np]))
-            with open(analysis_files['acc_msfan'], 'a') as f:
-                f.write('%s ' % ' '.join(['%.2f ' % x for x in acc_list_msfan]))
-
-            with open(analysis_files['mcc_st'], 'a') as f:
-                f.write('%s ' % ' '.join(['%.2f ' % x for x in mcc_list_st]))
-            with open(analysis_files['mcc_msfan_np'], 'a') as f:
-                f.write('%s ' % ' '.join(['%.2f ' % x for x in mcc_list_np]))
-            with open(analysis_files['mcc_msfan'], 'a') as f:
-                f.write('%s ' % ' '.join(['%.2f ' % x for x in mcc_list_msfan]))
-
-            with open(analysis_files['ppv_st'], 'a') as f:
-                f.write('%s ' % ' '.join(['%.2f ' % x for x in ppv_list_st]))
-            with open(analysis_files['ppv_msfan_np'], 'a') as f:
-                f.write('%s ' % ' '.join(['%.2f ' % x for x in ppv_list_np]))
-            with open(analysis_files['ppv_msfan'], 'a') as f:
-                f.write('%s ' % ' '.join(['%.2f ' % x for x in ppv_list_msfan]))
-
-            with open(analysis_files['tpr_st'], 'a') as f:
-                f.write('%s ' % ' '.join(['%.2f ' % x for x in tpr_list_st]))
-            with open(analysis_files['tpr_msfan_np'], 'a') as f:
-                f.write('%s ' % ' '.join(['%.2f ' % x for x in tpr_list_np]))
-            with open(analysis_files['tpr_msfan'], 'a') as f:
-                f.write('%s ' % ' '.join(['%.2f ' % x for x in tpr_list_msfan]))
+            # Measure saving in the results store
+            save_measures(store, repeat_idx, fold_idx, 'sfan',
+                          {'acc': acc_list_st, 'mcc': mcc_list_st,
+                           'ppv': ppv_list_st, 'tpr': tpr_list_st})
+            save_measures(store, repeat_idx, fold_idx, 'msfan_np',
+                          {'acc': acc_list_np, 'mcc': mcc_list_np,
+                           'ppv': ppv_list_np, 'tpr': tpr_list_np})
+            save_measures(store, repeat_idx, fold_idx, 'msfan',
+                          {'acc': acc_list_msfan, 'mcc': mcc_list_msfan,
+                           'ppv': ppv_list_msfan, 'tpr': tpr_list_msfan})
                 
             #-----------------------------------------------------------------------   
             # Run predictions : 
@@ -399,11 +374,7 @@ if __name__ == "__main__":
         #   - an external function : compute_ridge_selected_RMSE() returns list of rmse, task per task
         #   - the predictions saved in files (fold per fold)
         #   - the true values given by phenotypes_fnames[task_idx] and te_indices
-        # save to file '%s/%s.<algo>.rmse' % (args.resu_dir, args.simu_id)
-        # => rmse_st_fname ; rmse_np_fname ; rmse_fname
-        # Files structure : 
-        # each line = a repeat
-        # on each line there are several RMSE values, one per task
+        # save to the results store, one value per task (fold -1 = all folds)
 
         # Single task
         predicted_phenotypes_fname = resu_dir+'/'+args.simu_id+'.sfan.fold_%d.task_%d.predicted' 
@@ -412,22 +383,19 @@ if __name__ == "__main__":
         rmse_list = ef.compute_ridge_selected_RMSE( phenotypes_fnames, predicted_phenotypes_fname, 
                                         xp_indices)
         print rmse_list
-        with open(analysis_files['rmse_st'], 'a') as f:
-            f.write('%s \n' % ' '.join(['%.2f ' % x for x in rmse_list]))
+        save_measures(store, repeat_idx, -1, 'sfan', {'rmse': rmse_list})
         # Multitask (no precision)
         predicted_phenotypes_fname = resu_dir+'/'+args.simu_id+'.msfan_np.fold_%d.task_%d.predicted' 
         rmse_list = ef.compute_ridge_selected_RMSE( phenotypes_fnames, predicted_phenotypes_fname, 
                                         xp_indices)
         print rmse_list
-        with open(analysis_files['rmse_msfan_np'], 'a') as f:
-            f.write('%s \n' % ' '.join(['%.2f ' % x for x in rmse_list]))
+        save_measures(store, repeat_idx, -1, 'msfan_np', {'rmse': rmse_list})
         # Multitask (precision)
         predicted_phenotypes_fname = resu_dir+'/'+args.simu_id+'.msfan.fold_%d.task_%d.predicted' 
         rmse_list = ef.compute_ridge_selected_RMSE( phenotypes_fnames, predicted_phenotypes_fname, 
                                         xp_indices)       
         print rmse_list      
-        with open(analysis_files['rmse_msfan'], 'a') as f:
-            f.write('%s \n' % ' '.join(['%.2f ' % x for x in rmse_list]))
+        save_measures(store, repeat_idx, -1, 'msfan', {'rmse': rmse_list})
         #----------------------------------------------------------------------
 
         #-----------------------------------------------------------------------
@@ -436,57 +404,20 @@ if __name__ == "__main__":
         # between the features selected for each fold.
         # Use an external function using ef.consistency_index_k()
         # use the selected features saved to files and the true causal features
-        # save to file '%s/%s.<algo>.consistency' % (args.resu_dir, args.simu_id)
-        # File structure : 
-        # each line = a repeat
-        # on each line there are several ci values, one per task
+        # save to the results store, one value per task (fold -1 = all folds)
 
         # Single task
         selection_fname = resu_dir+'/'+args.simu_id+'.sfan.fold_%d.selected_features'
         ci_list = ef.consistency_index_task(selection_fname, args.num_folds, args.num_tasks, args.num_features)
-        with open(analysis_files['ci_st'], 'a') as f:
-            f.write('%s \n' % ' '.join(['%.2f ' % x for x in ci_list]))
+        save_measures(store, repeat_idx, -1, 'sfan', {'ci': ci_list})
         # Multitask (no precision)
         selection_fname = resu_dir+'/'+args.simu_id+'.msfan_np.fold_%d.selected_features'
         ci_list = ef.consistency_index_task(selection_fname, args.num_folds, args.num_tasks, args.num_features)
-        with open(analysis_files['ci_msfan_np'], 'a') as f:
-            f.write('%s \n' % ' '.join(['%.2f ' % x for x in ci_list]))
+        save_measures(store, repeat_idx, -1, 'msfan_np', {'ci': ci_list})
         # Multitask (precision)
         selection_fname = resu_dir+'/'+args.simu_id+'.msfan.fold_%d.selected_features'
         ci_list = ef.consistency_index_task(selection_fname, args.num_folds, args.num_tasks, args.num_features)
-        with open(analysis_files['ci_msfan'], 'a') as f:
-            f.write('%s \n' % ' '.join(['%.2f ' % x for x in ci_list]))
-
-        #-----------------------------------------------------------------------
-        # At the end of a repeat, add a carriage return to analysis files holding measures assessing classification : 
-        # acc, mcc, ppv, tpr files : 
-        with open(analysis_files['acc_st'], 'a') as f:
-            f.write('\n')
-        with open(analysis_files['acc_msfan_np'], 'a') as f:
-            f.write('\n')
-        with open(analysis_files['acc_msfan'], 'a') as f:
-            f.write('\n')
-
-        with open(analysis_files['mcc_st'], 'a') as f:
-            f.write('\n')
-        with open(analysis_files['mcc_msfan_np'], 'a') as f:
-            f.write('\n')
-        with open(analysis_files['mcc_msfan'], 'a') as f:
-            f.write('\n')
-
-        with open(analysis_files['ppv_st'], 'a') as f:
-            f.write('\n')
-        with open(analysis_files['ppv_msfan_np'], 'a') as f:
-            f.write('\n')
-        with open(analysis_files['ppv_msfan'], 'a') as f:
-            f.write('\n')
-
-        with open(analysis_files['tpr_st'], 'a') as f:
-            f.write('\n')
-        with open(analysis_files['tpr_msfan_np'], 'a') as f:
-            f.write('\n')
-        with open(analysis_files['tpr_msfan'], 'a') as f:
-            f.write('\n')
+        save_measures(store, repeat_idx, -1, 'msfan', {'ci': ci_list})
 
         
     # END for repeat_idx in xrange(args.num_repeats)
@@ -494,7 +425,7 @@ if __name__ == "__main__":
     
     #----------------------------------------------------------------------------
     # For each measures :
-    #  - extract data of measures from analysis_files, 
+    #  - extract data of measures from the results store, 
     #  - print tables, 
     #  - save tables in Latex format, 
     #  - and Plots
@@ -503,45 +434,27 @@ if __name__ == "__main__":
     
     # data [algo_id][task_id] = list of values
 
-    data = extract_plotable_data_from_analysis_files(
-        [analysis_files['acc_st'], analysis_files['acc_msfan_np'], analysis_files['acc_msfan'] ], 
-        args.num_tasks, args.num_repeats, args.num_folds
-    )
+    data = extract_plotable_data_from_store(store, 'acc', args.num_tasks, args.num_repeats)
     print_and_save_measure_table("accuracy", data, "%s/%s.table.accuracy.tex"%(args.resu_dir, args.simu_id ))
     plot.horizontal_boxplots(data, template_name%'accuracy')
 
-    data = extract_plotable_data_from_analysis_files(
-        [analysis_files['mcc_st'], analysis_files['mcc_msfan_np'], analysis_files['mcc_msfan'] ], 
-        args.num_tasks, args.num_repeats, args.num_folds
-    )
+    data = extract_plotable_data_from_store(store, 'mcc', args.num_tasks, args.num_repeats)
     print_and_save_measure_table("mcc", data, "%s/%s.table.mcc.tex"%(args.resu_dir, args.simu_id ))
     plot.horizontal_boxplots(data, template_name%'mcc')
 
-    data = extract_plotable_data_from_analysis_files(
-        [analysis_files['ppv_st'], analysis_files['ppv_msfan_np'], analysis_files['ppv_msfan'] ], 
-        args.num_tasks, args.num_repeats, args.num_folds
-    )
+    data = extract_plotable_data_from_store(store, 'ppv', args.num_tasks, args.num_repeats)
     print_and_save_measure_table("ppv", data, "%s/%s.table.ppv.tex"%(args.resu_dir, args.simu_id ))
     plot.horizontal_boxplots(data, template_name%'ppv')
 
-    data = extract_plotable_data_from_analysis_files(
-        [analysis_files['tpr_st'], analysis_files['tpr_msfan_np'], analysis_files['tpr_msfan'] ], 
-        args.num_tasks, args.num_repeats, args.num_folds
-    )
+    data = extract_plotable_data_from_store(store, 'tpr', args.num_tasks, args.num_repeats)
     print_and_save_measure_table("tpr", data, "%s/%s.table.tpr.tex"%(args.resu_dir, args.simu_id ))
     plot.horizontal_boxplots(data, template_name%'tpr')
 
-    data = extract_plotable_data_from_analysis_files(
-        [analysis_files['rmse_st'], analysis_files['rmse_msfan_np'], analysis_files['rmse_msfan'] ], 
-        args.num_tasks, args.num_repeats, args.num_folds
-    )
+    data = extract_plotable_data_from_store(store, 'rmse', args.num_tasks, args.num_repeats)
     print_and_save_measure_table("rmse", data, "%s/%s.table.rmse.tex" %(args.resu_dir, args.simu_id ))
     plot.horizontal_boxplots(data, template_name%'rmse')
 
-    data = extract_plotable_data_from_analysis_files(
-        [analysis_files['ci_st'], analysis_files['ci_msfan_np'], analysis_files['ci_msfan'] ], 
-        args.num_tasks, args.num_repeats, args.num_folds
-    )
+    data = extract_plotable_data_from_store(store, 'ci', args.num_tasks, args.num_repeats)
     print_and_save_measure_table("ci", data,  "%s/%s.table.ci.tex" %(args.resu_dir, args.simu_id ))
     plot.horizontal_boxplots(data, template_name%'ci')
 
@@ -101,6 +101,70 @@ Same problem, with mu=0 (equivalent to solving both tasks independently, as with
 >>> p.communicate()[0][:-1]
 '# lambda 0.001\\n# eta 0.02\\n4 6 13 17 18 19 20 22 24 26 28 30 49 \\n3 4 7 9 12 16 19 20 22 23 24 27 29 41 43 '
 
+Same problem, solved in-process (selected nodes are returned, indices start at 0):
+>>> sfan_solver = Sfan(2, ['../data/simu_01/simu_01.network.dimacs'], \
+                       ['../data/simu_01/simu_01.scores_0.txt', \
+                        '../data/simu_01/simu_01.scores_1.txt'], \
+                       0.001, 0.02, mu=0)
+>>> tt = sfan_solver.create_super_network()
+>>> sel_list, flow, cut_cost = sfan_solver.solve()
+>>> [' '.join(str(x + 1) for x in sel) for sel in sel_list]
+['4 6 13 17 18 19 20 22 24 26 28 30 49', '3 4 7 9 12 16 19 20 22 23 24 27 29 41 43']
+
+Same problem for two values of eta, the second one being solved starting from the first flow:
+>>> warm_solver = WarmStartSolver()
+>>> sel_list, flow, cut_cost = sfan_solver.solve(warm_solver)
+>>> sfan_solver = Sfan(2, ['../data/simu_01/simu_01.network.dimacs'], \
+                       ['../data/simu_01/simu_01.scores_0.txt', \
+                        '../data/simu_01/simu_01.scores_1.txt'], \
+                       0.001, 0.05, mu=0)
+>>> tt = sfan_solver.create_super_network()
+>>> sel_list, flow, cut_cost = sfan_solver.solve(warm_solver)
+>>> [' '.join(str(x + 1) for x in sel) for sel in sel_list]
+['13 18 20 24 26 28 30', '3 22 23 27 29']
+>>> warm_solver.num_builds, warm_solver.num_warm_solves
+(1, 1)
+
+All the selections obtained for eta between 0.02 and 0.05:
+>>> breakpoints, sel_lists = sfan_solver.compute_path('eta', 0.02, 0.05)
+>>> len(breakpoints), len(sel_lists)
+(16, 17)
+>>> [' '.join(str(x + 1) for x in sel) for sel in sel_lists[-1]]
+['13 18 20 24 26 28 30', '3 22 23 27 29']
+
+The same selections as solving the ends of the path, on the same (rescaled) super-network:
+>>> [[sel.tolist() for sel in sel_list] \
+     for sel_list in sfan_solver.solve_values('eta', [0.02, 0.05])] == \
+    [[sel.tolist() for sel in sel_list] for sel_list in (sel_lists[0], sel_lists[-1])]
+True
+
+Same problem, with the network and node weights given as arrays instead of files:
+>>> adjacency = super_network.read_network('../data/simu_01/simu_01.network.dimacs').adjacency
+>>> node_weights = [np.loadtxt('../data/simu_01/simu_01.scores_%d.txt' % task_idx) \
+                    for task_idx in range(2)]
+>>> sfan_solver = Sfan(2, [adjacency], node_weights, 0.001, 0.05, mu=0)
+>>> tt = sfan_solver.create_super_network()
+>>> sel_list, flow, cut_cost = sfan_solver.solve()
+>>> [' '.join(str(x + 1) for x in sel) for sel in sel_list]
+['13 18 20 24 26 28 30', '3 22 23 27 29']
+>>> sfan_solver.networks[0] is sfan_solver.networks[1]
+True
+>>> sfan_solver.super_network.get_shared_topology() is not None
+True
+
+Same problem for two values of eta, solved by a single process from a batch file
+(one problem per line, runtimes omitted here):
+>>> problem = '--num_tasks 2 --networks ../data/simu_01/simu_01.network.dimacs \
+               --node_weights ../data/simu_01/simu_01.scores_0.txt \
+                              ../data/simu_01/simu_01.scores_1.txt \
+               -l 0.001 -e %s -m 0\\n'
+>>> open('/tmp/test.batch', 'w').write(problem % '0.02' + problem % '0.05')
+>>> p = subprocess.Popen(['python', 'multitask_sfan.py', '--batch', '/tmp/test.batch'], \
+                         stdout=subprocess.PIPE)
+>>> [line for line in p.communicate()[0].split('\\n') if line and not ':' in line and \
+                                                         not line.startswith('# maxRSS')]
+['# job 0', '# lambda 0.001', '# eta 0.02', '4 6 13 17 18 19 20 22 24 26 28 30 49', '3 4 7 9 12 16 19 20 22 23 24 27 29 41 43', '# job 1', '# lambda 0.001', '# eta 0.05', '13 18 20 24 26 28 30', '3 22 23 27 29']
+
 References
 ----------
 [1] Azencott, C.-A., Grimm, D., Sugiyama, M., Kawahara, Y., and Borgwardt, K.M. (2013).
@@ -112,14 +176,28 @@ References
 """
 
 import argparse
+import contextlib
+import copy
 import doctest
+import json
 import logging
+import multiprocessing
 import numpy as np
+import resource
+import shlex
 import sys
 import time
 
 import gt_maxflow
+import super_network
+
 
+# Minimum number of nodes of the parts of a super-network solved in parallel
+MIN_NODES_PER_JOB = 100000
+
+# Minimum fraction of nodes fixed by pre-solve reductions for a super-network
+# whose tasks share the same network to be contracted (which expands it)
+MIN_FIXED_FRACTION = 0.5
 
 #EPSILON = 0.1 # For the case where no covariance/precision matrix between tasks is provided
 
@@ -146,6 +224,37 @@ def get_network(network_arg, task_idx):
 
 
 
+def load_node_weights(node_weights):
+    """ Get node weights from a file, or as given.
+
+    Parameters
+    ----------
+    node_weights: filename or (num_nodes, ) array
+        Path to the node weights file (one weight per line), or node weights.
+
+    Returns
+    -------
+    node_weights: (num_nodes, ) np.array
+        Node weights.
+    """
+    if isinstance(node_weights, basestring):
+        return np.loadtxt(node_weights, ndmin=1)
+    return np.asarray(node_weights, dtype=float).reshape((-1, ))
+
+
+
+def _get_log_range(lmin, lmed, lmax, num_values):
+    """ Values of a hyperparameter, spread on a log scale around 10**lmed:
+    (num_values + 1) / 2 values from 10**lmin (included) to 10**lmed (excluded),
+    and num_values / 2 values from 10**lmed (included) to 10**lmax (excluded).
+    """
+    values = [10**(lmed - float(idx)/float((num_values+1)/2) * \
+                   (lmed-lmin)) for idx in range((num_values+1)/2, 0, -1)]
+    values.extend([10**(lmed + float(idx)/float(num_values/2) * \
+                        (lmax-lmed)) for idx in range(num_values/2)])
+    return values
+
+
 def sort_hyperparameters(hyperparams):
     """ Sort a list of hyperparameters.
 
@@ -194,6 +303,115 @@ def sort_hyperparameters(hyperparams):
     return hyperparams_sorted
 
 
+class Instrumentation(object):
+    """ Record of the resources used by each stage of the solution of problems.
+
+    Stages are 'networks' (reading the networks), 'setup' (rest of the setup of a
+    Sfan instance), 'build' (creating the super-network), 'dimacs' (creating its
+    dimacs description), 'maxflow' (solving the minimum cut problem) and 'output'
+    (printing the selected nodes, from the command line).
+
+    Each stage is recorded as a dictionary holding its name ('stage'), the wall-clock
+    and CPU times spent in it, in seconds ('wall_time', 'cpu_time'), and the maximum
+    resident set size of the process at its end, in kilobytes ('max_rss'), as well as:
+      - for 'build': the number of nodes of the super-network ('num_nodes', source and
+        sink included) and of pairs of edges of each class ('num_intra_edges',
+        'num_cross_edges', 'num_terminal_edges');
+      - for 'maxflow': the wall-clock times spent by gt_maxflow building its graph and
+        running maxflow ('gt_build_time', 'gt_maxflow_time', summed over the parts of
+        the super-network solved separately), and, without a warm solver, the size of
+        the super-network after pre-solve reductions (see solve_super_network).
+
+    Attributes
+    ----------
+    records: list of dictionaries
+        Records of the stages, in the order in which they ended.
+    """
+    def __init__(self):
+        self.records = []
+
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """ Record a stage, run within a with statement.
+
+        Parameters
+        ----------
+        name: string
+            Name of the stage.
+
+        Yields
+        ------
+        record: dictionary
+            Record of the stage, to which information can be added.
+            It is only added to self.records if the stage ends without error.
+        """
+        record = {'stage': name}
+        wall_start = time.time()
+        cpu_start = time.clock()
+        yield record
+        record['wall_time'] = time.time() - wall_start
+        record['cpu_time'] = time.clock() - cpu_start
+        record['max_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.records.append(record)
+
+
+    def write(self, f, **info):
+        """ Write the records, one JSON object per line.
+
+        Parameters
+        ----------
+        f: file
+            Open file.
+        info: keyword arguments
+            Added to each record (e.g. job=<job_idx>).
+        """
+        for record in self.records:
+            f.write("%s\n" % json.dumps(dict(record, **info), sort_keys=True))
+
+
+def read_records(records_f):
+    """ Read records written by Instrumentation.write.
+
+    Parameters
+    ----------
+    records_f: filename
+        Path to the records file.
+
+    Returns
+    -------
+    records: list of dictionaries
+        Records (see Instrumentation).
+    """
+    with open(records_f, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def get_records_totals(records):
+    """ Get the resources used by all the stages of a list of records.
+
+    Parameters
+    ----------
+    records: list of dictionaries
+        Records (see Instrumentation).
+
+    Returns
+    -------
+    totals: dictionary
+        'wall_time', 'cpu_time', 'gt_build_time', 'gt_maxflow_time': times summed over
+        all stages, in seconds; 'max_rss': largest maximum resident set size, in kilobytes
+        (-1 if there are no records); 'num_nodes', 'num_intra_edges', 'num_cross_edges',
+        'num_terminal_edges': size of the last super-network built (0 if none).
+    """
+    totals = dict((key, sum(record.get(key, 0.) for record in records)) \
+                  for key in ['wall_time', 'cpu_time', 'gt_build_time', 'gt_maxflow_time'])
+    totals['max_rss'] = max([record['max_rss'] for record in records] or [-1])
+    build_records = [record for record in records if record['stage'] == 'build'] or [{}]
+    for key in ['num_nodes', 'num_intra_edges', 'num_cross_edges', 'num_terminal_edges']:
+        totals[key] = build_records[-1].get(key, 0)
+    return totals
+
+
 class Sfan(object):
     """ Solve a multi-task network-guided feature selection problem.
 
@@ -209,11 +427,15 @@ class Sfan(object):
         List of paths of network files, space-separated.
         If the same network is to be used for all files, only specify one file.
         /!\ All networks must have the same number of nodes.
+        Networks can also be given as adjacency matrices (see super_network.as_network).
     node_weights_f: filename(s)
         List of paths of network node weights (i.e. feature relevance scores),
         space-separated.
         One list per task.
+        Node weights can also be given as arrays.
 
+    networks: list of super_network.Network
+        Network of each task (shared with other instances using the same files).
     num_nodes_each_network: int
         Number of nodes per task network.
     super_num_nodes: int
@@ -221,9 +443,20 @@ class Sfan(object):
     super_num_edges: int
         Total number of edges of the super network.
 
+    super_network: SuperNetwork
+        Super-network, as arrays of edges.
+    reduction_stats: dictionary
+        Size of the super-network before and after pre-solve reductions,
+        for the last call to solve without a warm solver (see solve_super_network).
+    instrumentation: Instrumentation
+        Record of the resources used by each stage.
     dimacs_graph: string
         Dimacs description of the super-network.
     
+    covariance_matrix_f: {filename, None}, optional
+        Path to covariance matrix.
+    precision_matrix_f: {filename, None}, optional
+        Path to precision matrix.
     mu: {float, None}, optional
         Regularization paramter for task relatednes.
     output: {filename, None}, optional
@@ -239,7 +472,8 @@ class Sfan(object):
         File where to store computation run times.        
     """
     def __init__(self, num_tasks, networks_f, node_weights_f, lbd, eta, mu=None,
-                 covariance_matrix_f=None, precision_matrix_f=None, output_f=None):
+                 covariance_matrix_f=None, precision_matrix_f=None, output_f=None,
+                 instrumentation=None):
         """
         Parameters
         ----------
@@ -249,10 +483,13 @@ class Sfan(object):
             List of paths of network files, space-separated.
             If the same network is to be used for all files, only specify one file.
             /!\ All networks must have the same number of nodes.
+            Networks can also be given as (num_nodes, num_nodes) scipy.sparse
+            adjacency matrices, or super_network.Network objects, to avoid files.
         node_weights_f: filename(s)
             List of paths of network node weights (i.e. feature relevance scores),
             space-separated.
             One list per task.
+            Node weights can also be given as (num_nodes, ) arrays, to avoid files.
         lbd: float
             Regularization parameter for connectivity.
         eta: float
@@ -265,6 +502,9 @@ class Sfan(object):
             Path to precision matrix.
         output_f: {filename, None}, optional
             File where to store computation run times.        
+        instrumentation: {Instrumentation, None}, optional
+            Where to record the resources used by each stage (default: a new one),
+            e.g. to share it across problems.
         """
         self.num_tasks = num_tasks
         self.networks_f = networks_f
@@ -273,28 +513,50 @@ class Sfan(object):
         self.eta = eta
         self.mu = mu
         self.output_f = output_f
-        
-        # Read networks nodes count and edges count
-        self.super_num_nodes = 0
-        self.num_nodes_each_network = 0
-        self.super_num_edges = 0
-        for task_idx in range(num_tasks):
-            with open(get_network(networks_f, task_idx), 'r') as f:
-                ls = f.readline().split()
+        self.covariance_matrix_f = covariance_matrix_f
+        self.precision_matrix_f = precision_matrix_f
+        self._hyperparameters_statistics = None
+        if instrumentation is None:
+            instrumentation = Instrumentation()
+        self.instrumentation = instrumentation
 
-                if not self.num_nodes_each_network:
-                    self.num_nodes_each_network = int(ls[2])
+        with self.instrumentation.stage('networks'):
+            self._read_networks(networks_f)
 
-                elif (self.num_nodes_each_network != int(ls[2])) :
-                    f.close
-                    logging.error("All networks must have the same number of" + \
-                                     " nodes.\n")
-                    sys.exit(-1)
+        with self.instrumentation.stage('setup'):
+            self._read_task_matrices(covariance_matrix_f, precision_matrix_f)
 
-                self.super_num_nodes += int(ls[2])
-                self.super_num_edges += int(ls[3])
 
-                f.close()
+    def _read_networks(self, networks_f):
+        """ Read the networks, and count the nodes and edges of the super-network
+        within and to the source and sink (see __init__).
+        """
+        # Read networks nodes count and edges count
+        # (networks are only read once, see super_network.load_network)
+        self.networks = []
+        self.super_num_nodes = 0
+        self.num_nodes_each_network = 0
+        self.super_num_edges = 0
+        # Networks given in memory, by id, so that a network given for all tasks
+        # is only converted once and shared by them (see SuperNetwork.get_shared_topology)
+        converted_networks = {}
+        for task_idx in range(self.num_tasks):
+            network_f = get_network(networks_f, task_idx)
+            if id(network_f) not in converted_networks:
+                converted_networks[id(network_f)] = super_network.as_network(network_f)
+            network = converted_networks[id(network_f)]
+
+            if not self.num_nodes_each_network:
+                self.num_nodes_each_network = network.num_nodes
+
+            elif (self.num_nodes_each_network != network.num_nodes) :
+                logging.error("All networks must have the same number of" + \
+                                 " nodes.\n")
+                sys.exit(-1)
+
+            self.networks.append(network)
+            self.super_num_nodes += network.num_nodes
+            self.super_num_edges += network.num_edges
 
         # The super network has one node for each node in the task networks,
         # + source and sink
@@ -302,12 +564,17 @@ class Sfan(object):
         # Edges in the super-network are either:
         #    - initial connections inside each network
         #    - connections of each node to source or sink (directed)
-        #    - connections between the corresponding nodes of each network (undirected)
+        #    - connections between the corresponding nodes of each network (undirected),
+        #      only for pairs of tasks with a non-zero entry in the precision matrix
+        #      (counted below)
         self.super_num_edges =  self.super_num_edges + \
-                                (self.num_nodes_each_network * self.num_tasks) + \
-                                (self.num_tasks * (self.num_tasks - 1) * \
-                                 self.num_nodes_each_network)
-        
+                                (self.num_nodes_each_network * self.num_tasks)
+
+
+    def _read_task_matrices(self, covariance_matrix_f, precision_matrix_f):
+        """ Read or compute the precision matrix between tasks, and count the edges
+        of the super-network across tasks (see __init__).
+        """
         # Read covariance/precision matrix (if more than one task)
         if (self.num_tasks > 1):
             if covariance_matrix_f:
@@ -364,6 +631,26 @@ class Sfan(object):
                 # Sum rows of the precision matrix
                 self.phi = self.precision_matrix.sum(axis=1, dtype='float')
 
+                # Connections across tasks
+                num_coupled_tasks = np.count_nonzero(self.precision_matrix) - \
+                                    np.count_nonzero(np.diag(self.precision_matrix))
+                self.super_num_edges += num_coupled_tasks * self.num_nodes_each_network
+
+
+    def get_hyperparameters_statistics(self):
+        """ Get the statistics of the data from which ranges of hyperparameters
+        are computed, computing them on first use.
+
+        Returns
+        -------
+        statistics: HyperparametersStatistics
+            Statistics of the node weights and networks of the problem.
+        """
+        if self._hyperparameters_statistics is None:
+            self._hyperparameters_statistics = HyperparametersStatistics(
+                self.node_weights_f, self.networks)
+        return self._hyperparameters_statistics
+
 
     def compute_hyperparameters_range_multiscones(self, num_values=5):
         """ Compute a reasonable range of hyperparameters for a MultiSConES problem.
@@ -382,81 +669,34 @@ class Sfan(object):
             "-l <lambda -e <eta> -m <mu>".
         """
         params_dict = {} # eta_val:{[lbd_val, mu_val]}
-        cmax = 0.
-        cmin = np.inf
-        for current_task in range(self.num_tasks):
-            with open(self.node_weights_f[current_task], 'r') as f:
-                cvec = np.loadtxt(f)
-                cmax = max(cmax, np.max(cvec))
-                cmin = min(cmin, np.min(cvec))
-                f.close()
-
-        emax = cmax/2
-        emin = cmin*2
+        statistics = self.get_hyperparameters_statistics()
+
+        emax = statistics.cmax/2
+        emin = statistics.cmin*2
         eta_values = [(emin + float(idx) / float(num_values) * (emax - emin)) \
                       for idx in range(num_values, 0, -1)]
 
-        for eta in eta_values:
-            #print "eta ", eta
-            
-            eta_to_reject_list = list() 
-            
-            amax = 0
-            amin = np.inf
-            for current_task in range(self.num_tasks):
-                with open(self.node_weights_f[current_task], 'r') as f:
-                    cvec = np.loadtxt(f)
-                    avec = np.abs(cvec - eta)
-                    amax = max(amax, np.max(avec))
-                    amin = min(amin, np.min(avec))
-                    if amin < 1e-10:
-                        logging.error("!amin too small! amin = %f eta = %f", amin, eta)
-                        #sys.exit(-1)
-                        # if cvec -eta next to 0, it is as nodes were not connected
-                        # -> trivial solution -> we don't want this kind of value
-                        eta_to_reject_list.append(eta)
-                    amed = np.median(avec)
-                    f.close()
-        
-        for eta_to_reject in eta_to_reject_list : 
-            eta_values.remove(eta_to_reject) 
+        amin, amax, amed = statistics.get_shifted_statistics(
+            np.zeros((len(eta_values), self.num_tasks)), eta_values)
+        for eta_idx in np.flatnonzero(amin < 1e-10):
+            logging.error("!amin too small! amin = %f eta = %f", amin[eta_idx], eta_values[eta_idx])
+        # The statistics of the last (smallest) value of eta are used for all values,
+        # and it is rejected if
+        # |c - eta| is next to 0 for some node: it is as if nodes were not connected
+        # -> trivial solution -> we don't want this kind of value
+        amin, amax, amed = amin[-1], amax[-1], amed[-1]
+        if amin < 1e-10:
+            eta_values = eta_values[:-1]
 
         for eta in eta_values:
-
-            Wmax = 0
-            Wmin = np.inf
-            for current_task in range(self.num_tasks):
-                with open(self.networks_f[current_task], 'r') as f:
-                    for line in f:
-                        if line[0] == 'a':
-                            w_val = float(line.split()[3])
-                            Wmax = max(Wmax, w_val)
-                            if w_val > 0:
-                                Wmin = min(Wmin, w_val)
-                    f.close()
-                    if len(self.networks_f) == 1:
-                        break
-
-            llmax = np.log10(amax / Wmin)
-            llmin = np.log10(amin / Wmax)              
-            llmed = np.log10(amed / Wmax)
-            lbd_values = [10**(llmed - float(idx)/float((num_values+1)/2) * \
-                                   (llmed-llmin)) for idx in range((num_values+1)/2, 0, -1)]
-            lbd_values.extend([10**(llmed + float(idx)/float(num_values/2) * \
-                                   (llmax-llmed)) for idx in range(num_values/2)])
-
+            lbd_values = _get_log_range(np.log10(amin / statistics.wmax),
+                                        np.log10(amed / statistics.wmax),
+                                        np.log10(amax / statistics.wmin), num_values)
             lbd_values = ['%.2e' % lbd for lbd in lbd_values]
             #print "\t lbd ", lbd_values
 
-
-            lmmax = np.log10(amax)
-            lmmin = np.log10(amin)
-            lmmed = np.log10(amed)
-            mu_values = [10**(lmmed - float(idx)/float((num_values+1)/2) * \
-                                   (lmmed-lmmin)) for idx in range((num_values+1)/2, 0, -1)]
-            mu_values.extend([10**(lmmed + float(idx)/float(num_values/2) * \
-                                   (lmmax-lmmed)) for idx in range(num_values/2)])
-
+            mu_values = _get_log_range(np.log10(amin), np.log10(amed), np.log10(amax),
+                                       num_values)
             mu_values = ['%.2e' % mu for mu in mu_values]
             #print "\t mu  ", mu_values
 
@@ -488,14 +728,9 @@ class Sfan(object):
             "-l <lambda -e <eta> -m <mu>".
         """
         params_dict = {} # mu_val:{eta_val:[lbd_val]}
-        cmax = 0.
-        cmin = np.inf
-        for current_task in range(self.num_tasks):
-            with open(self.node_weights_f[current_task], 'r') as f:
-                cvec = np.loadtxt(f)
-                cmax = max(cmax, np.max(cvec))
-                cmin = min(cmin, np.min(cvec))
-                f.close()
+        statistics = self.get_hyperparameters_statistics()
+        cmax = statistics.cmax
+        cmin = statistics.cmin
 
         pmin = np.min(self.phi)
         pmax = np.max(self.phi)
@@ -504,10 +739,9 @@ class Sfan(object):
 
         mu_values = [mmax / (2*(2**idx)) for idx in range(num_values)]
 
+        # Grid of (mu, eta) values
+        grid = []
         for mu in mu_values:
-            logging.info("mu  %s" % mu)
-            params_dict['%.2e' % mu] = {}
-            
             emax = cmax - mu * pmin
             emin = cmin - mu * pmax
 
@@ -518,48 +752,30 @@ class Sfan(object):
                 lemin = np.log10(emin*2)
                 eta_values = [10**(lemin + float(idx) / float(num_values) * (lemax - lemin)) \
                               for idx in range(num_values, 0, -1)]
-                
-            for eta in eta_values:
-                logging.info("\teta  %s" % eta)
-                amax = 0
-                amin = np.inf
-                for current_task in range(self.num_tasks):
-                    with open(self.node_weights_f[current_task], 'r') as f:
-                        cvec = np.loadtxt(f)
-                        avec = np.abs(cvec - mu * self.phi[current_task] - eta)
-                        amax = max(amax, np.max(avec))
-                        amin = min(amin, np.min(avec))
-                        if amin < 1e-10:
-                            logging.error("!amin too small! amin = %f mu = %f eta = %f\n", amin, mu, eta)
-                            sys.exit(-1)
-                        amed = np.median(avec)
-                        f.close()
-
-                Wmax = 0
-                Wmin = np.inf
-                for current_task in range(self.num_tasks):
-                    with open(self.networks_f[current_task], 'r') as f:
-                        for line in f:
-                            if line[0] == 'a':
-                                w_val = float(line.split()[3])
-                                Wmax = max(Wmax, w_val)
-                                if w_val > 0:
-                                    Wmin = min(Wmin, w_val)
-                        f.close()
-                        if len(self.networks_f) == 1:
-                            break
-
-                llmax = np.log10(amax / Wmin)
-                llmin = np.log10(amin / Wmax)              
-                llmed = np.log10(amed / Wmax)
-                lbd_values = [10**(llmed - float(idx)/float((num_values+1)/2) * \
-                                       (llmed-llmin)) for idx in range((num_values+1)/2, 0, -1)]
-                lbd_values.extend([10**(llmed + float(idx)/float(num_values/2) * \
-                                       (llmax-llmed)) for idx in range(num_values/2)])
-
-                lbd_values = ['%.2e' % lbd for lbd in lbd_values]
-                logging.info("\t\t %s" % " ".join(lbd_values))
-                params_dict['%.2e' % mu]['%.2e' % eta] = lbd_values
+            grid.extend([(mu, eta) for eta in eta_values])
+
+        # Statistics of |c - mu * phi - eta| for the whole grid at once
+        amin, amax, amed = statistics.get_shifted_statistics(
+            [[mu * phi for phi in self.phi] for (mu, eta) in grid],
+            [eta for (mu, eta) in grid])
+
+        for grid_idx, (mu, eta) in enumerate(grid):
+            if '%.2e' % mu not in params_dict:
+                logging.info("mu  %s" % mu)
+                params_dict['%.2e' % mu] = {}
+            logging.info("\teta  %s" % eta)
+            if amin[grid_idx] < 1e-10:
+                logging.error("!amin too small! amin = %f mu = %f eta = %f\n",
+                              amin[grid_idx], mu, eta)
+                sys.exit(-1)
+
+            lbd_values = _get_log_range(np.log10(amin[grid_idx] / statistics.wmax),
+                                        np.log10(amed[grid_idx] / statistics.wmax),
+                                        np.log10(amax[grid_idx] / statistics.wmin),
+                                        num_values)
+            lbd_values = ['%.2e' % lbd for lbd in lbd_values]
+            logging.info("\t\t %s" % " ".join(lbd_values))
+            params_dict['%.2e' % mu]['%.2e' % eta] = lbd_values
 
         hyperparams = ['-l %s -e %s -m %s' % (lbd, eta, mu) \
                        for mu, eta_dict in params_dict.iteritems() \
@@ -569,105 +785,79 @@ class Sfan(object):
         return sort_hyperparameters(hyperparams)
             
             
-    def create_dimacs(self):
-        """ Create the dimacs description of the problem's super-network.
+    def create_super_network(self):
+        """ Create the problem's super-network, as arrays of edges.
 
         Modified attributes
         -------------------
-        self.dimacs_graph: string
-            Dimacs description of the super-network.
+        self.super_network: SuperNetwork
+            Super-network.
 
         Return
         ------
         time_task_computations: list
             Computation times for each task.
         """
+        with self.instrumentation.stage('build') as record:
+            time_task_computations = self._build_super_network()
+            record['num_nodes'] = self.super_network.num_nodes
+            for edge_class, num_pairs in self.super_network.num_pairs_per_class.iteritems():
+                record['num_%s_edges' % edge_class] = num_pairs
+        return time_task_computations
+
+
+    def _build_super_network(self):
+        """ Create the problem's super-network (see create_super_network).
+        """
         # Initialize runtimes
         time_task_computations = []
-        
-        source_node_data = []
-        self.dimacs_graph = ""
-        self.dimacs_graph += ("p max %d %d\n" % (self.super_num_nodes,
-                                                 self.super_num_edges))
-        self.dimacs_graph += ("n %d s\n" % (self.super_num_nodes - 1))
-        self.dimacs_graph += ("n %d t\n" % self.super_num_nodes)
 
-        a = 0.0
+        self.super_network = super_network.SuperNetwork(self.num_tasks,
+                                                        self.num_nodes_each_network)
 
         for current_task in range(self.num_tasks):
-            with open(get_network(self.networks_f, current_task), 'r') as f_nt:
-                with open(self.node_weights_f[current_task], 'r') as f_nw:
-                    ls = f_nt.readline().split()
-                    while ls[0] != "a":
-                        ls = f_nt.readline().split()
-                        
-                    for node_idx in range(self.num_nodes_each_network):
-                        try:
-                            current_node = ((self.num_nodes_each_network * current_task) \
-                                            + int(ls[1]))
-                            neighbour_node = ((self.num_nodes_each_network * current_task) \
-                                              + int(ls[2]))
-                            # Connect nodes within the same task
-                            while int(ls[1]) == node_idx + 1:
-                                self.dimacs_graph += ("a %d %d %f\n" % \
-                                                      (current_node, neighbour_node,
-                                                       (float(ls[3])) * self.lbd))
-                                ls = f_nt.readline().split()
-                                if len(ls) == 0:
-                                    break
-                                neighbour_node = ((self.num_nodes_each_network * \
-                                                   current_task) + int(ls[2]))
-
-                        except IndexError:
-                            # Some nodes (with indices greater than the last one in networks_f)
-                            # are disconnected from the rest of the network.
-                            current_node = ((self.num_nodes_each_network * current_task) \
-                                            + int(node_idx) + 1)
-
-                        # Connect corresponding nodes across tasks
-                        if self.num_tasks > 1:
-                            target_node = current_node
-                            while target_node > self.num_nodes_each_network:
-                                target_node -= self.num_nodes_each_network
-
-                            for task_idx in range(self.num_tasks):
-                                real_target_node = self.num_nodes_each_network * \
-                                                   task_idx + target_node
-
-                                if real_target_node != current_node:
-                                    if self.mu:
-                                        omega_k = - self.precision_matrix[current_task]
-                                    else:
-                                        omega_k = np.zeros((self.num_tasks, ))
-                                    
-                                    self.dimacs_graph += ("a %d %d %f\n" % \
-                                                     (current_node, real_target_node,
-                                                      self.mu * omega_k[task_idx]))
-
-                        # Connect nodes to the source and sink nodes
-                        if self.num_tasks > 1 and self.mu > 0:
-                            a = (float(f_nw.readline())) - \
-                                self.mu * self.phi[current_task] - self.eta
-                        else:
-                            a = (float(f_nw.readline())) - self.eta
-
-                        if a >= 0.0:
-                            source_node_data.append("a %d %d %f\n" % \
-                                                    (self.super_num_nodes-1,
-                                                     current_node, a)) 
-                        else:
-                            self.dimacs_graph += ("a %d %d %f\n" % \
-                                                  (current_node,
-                                                   self.super_num_nodes, -a))
-                                                   
-                    f_nw.close()
-                f_nt.close()
+            # Connect nodes within the same task
+            self.super_network.add_intra_task_edges(current_task,
+                                                    self.networks[current_task],
+                                                    self.lbd)
+
+            # Connect nodes to the source and sink nodes
+            node_weights = load_node_weights(
+                self.node_weights_f[current_task])[:self.num_nodes_each_network]
+            if self.num_tasks > 1 and self.mu > 0:
+                a = node_weights - self.mu * self.phi[current_task] - self.eta
+            else:
+                a = node_weights - self.eta
+            self.super_network.add_terminal_edges(current_task, a)
 
             time_task_computations.append(time.clock())
 
-        for x in source_node_data:
-            self.dimacs_graph += x
+        # Connect corresponding nodes across tasks
+        # (only those of tasks with a non-zero entry in the precision matrix)
+        if self.num_tasks > 1 and self.mu:
+            self.super_network.add_cross_task_edges(- self.mu * self.precision_matrix)
+
+        return time_task_computations
+
+
+    def create_dimacs(self):
+        """ Create the dimacs description of the problem's super-network.
+
+        Modified attributes
+        -------------------
+        self.super_network: SuperNetwork
+            Super-network.
+        self.dimacs_graph: string
+            Dimacs description of the super-network.
 
+        Return
+        ------
+        time_task_computations: list
+            Computation times for each task.
+        """
+        time_task_computations = self.create_super_network()
+        with self.instrumentation.stage('dimacs'):
+            self.dimacs_graph = self.super_network.to_dimacs()
         return time_task_computations
 
         
@@ -679,7 +869,807 @@ class Sfan(object):
         Prints to screen the list of nodes selected in each network. 
         """
         # Pass super network to gt_maxflow
-        gt_maxflow.python_entry_point(self.dimacs_graph, self.num_nodes_each_network)
+        with self.instrumentation.stage('maxflow') as record:
+            gt_maxflow.python_entry_point(self.dimacs_graph, self.num_nodes_each_network)
+            record['gt_build_time'], record['gt_maxflow_time'] = \
+                gt_maxflow.python_last_timings()
+
+
+    def solve(self, warm_solver=None, num_jobs=1):
+        """ Run gt_maxflow on the super-network, in-process.
+
+        Contrary to run_maxflow, nothing is printed to screen,
+        and the super-network is handed to gt_maxflow as arrays of edges
+        rather than as its dimacs description.
+
+        Parameters
+        ----------
+        warm_solver: {WarmStartSolver, None}, optional
+            Solver to reuse across problems that only differ by their
+            hyperparameters (see WarmStartSolver).
+        num_jobs: {int, 1}, optional
+            Number of processes among which to split independent parts of the
+            super-network, when not using a warm_solver (see solve_super_network).
+
+        Returns
+        -------
+        sel_list: list of np.array
+            For each task, array of the selected nodes, as indices,
+            STARTING AT 0.
+        flow: float
+            Value of the maximum flow.
+        cut_cost: float
+            Cost of the minimum cut.
+        """
+        # One entry per node of the super-network (source and sink included)
+        cut = np.zeros((self.super_num_nodes, ), dtype=np.int32)
+        with self.instrumentation.stage('maxflow') as record:
+            if warm_solver is not None:
+                flow, cut_cost = warm_solver.solve(self.super_network, cut)
+                record['gt_build_time'], record['gt_maxflow_time'] = warm_solver.last_timings
+            else:
+                self.reduction_stats = {}
+                flow, cut_cost = solve_super_network(self.super_network, cut, num_jobs,
+                                                     stats=self.reduction_stats)
+                logging.info("Pre-solve reductions: %d of %d nodes fixed " % \
+                             (self.reduction_stats['num_nodes'] - \
+                              self.reduction_stats['num_core_nodes'],
+                              self.reduction_stats['num_nodes']) + \
+                             "(%d selected), %d of %d edges left" % \
+                             (self.reduction_stats['num_fixed_source'],
+                              self.reduction_stats['num_core_pairs'],
+                              self.reduction_stats['num_pairs']))
+                record.update(self.reduction_stats)
+
+        # Drop source and sink and split the remaining nodes by task
+        cut = cut[:(self.num_tasks * self.num_nodes_each_network)]
+        cut.shape = (self.num_tasks, self.num_nodes_each_network)
+        sel_list = [np.flatnonzero(cut_task) for cut_task in cut]
+        return sel_list, flow, cut_cost
+
+
+    def compute_path(self, parameter, min_value, max_value, warm_solver=None,
+                     tol=1e-6):
+        """ Compute the regularization path of the problem for eta or lambda.
+
+        All other hyperparameters being fixed, the minimum of the objective
+        is a concave, piecewise linear function of eta (resp. lambda), and the
+        selected features only change at its breakpoints. These breakpoints
+        are found exactly by intersecting the lines of the selections found at
+        both ends of an interval, and solving at that intersection: either
+        it is a breakpoint, or it splits the interval in two.
+        The number of problems solved is therefore about twice the number
+        of breakpoints (see solve_values to solve a few values only). The super-network
+        is built once and rescaled for each problem, which is warm-started
+        (see WarmStartSolver).
+
+        Parameters
+        ----------
+        parameter: string
+            'eta' or 'lbd'.
+        min_value: float
+            Smallest value of the parameter.
+        max_value: float
+            Largest value of the parameter.
+        warm_solver: {WarmStartSolver, None}, optional
+            Solver to use (default: a new one).
+        tol: float
+            Relative tolerance on objective values.
+
+        Returns
+        -------
+        breakpoints: list of floats
+            Values of the parameter, in increasing order, where the selection
+            changes.
+        sel_lists: list of list of np.array
+            len(breakpoints) + 1 selections (see solve):
+            sel_lists[i] is selected between breakpoints[i-1] and breakpoints[i]
+            (at a breakpoint, the selection is the one of the interval below).
+        """
+        if parameter not in ('eta', 'lbd'):
+            raise ValueError("parameter must be 'eta' or 'lbd'")
+        if min_value > max_value:
+            raise ValueError("min_value must not be larger than max_value")
+        if warm_solver is None:
+            warm_solver = WarmStartSolver()
+
+        def solve_at(value):
+            """ Return the selection at value and its (value, intercept, slope) line. """
+            selected, sfan_solver = self._solve_rescaled(parameter, value, warm_solver)
+            objective, slope = sfan_solver.get_objective(selected, parameter)
+            return selected, (value, objective - slope * value, slope)
+
+        def objective_at(line, value):
+            return line[1] + line[2] * value
+
+        lo = solve_at(min_value)
+        hi = solve_at(max_value)
+        breakpoints = [] # (breakpoint, selection below, selection above)
+        intervals = [(lo, hi)]
+        while intervals:
+            (sel_lo, line_lo), (sel_hi, line_hi) = intervals.pop()
+            if np.array_equal(sel_lo, sel_hi):
+                continue
+            value_lo = line_lo[0]
+            value_hi = line_hi[0]
+            if line_lo[2] == line_hi[2]:
+                # Both selections are optimal on the whole interval
+                breakpoints.append((value_hi, sel_lo, sel_hi))
+                continue
+            # Intersection of the two lines
+            value = (line_hi[1] - line_lo[1]) / (line_lo[2] - line_hi[2])
+            if not (value_lo < value < value_hi):
+                # Numerically at one end of the interval
+                value = min(max(value, value_lo), value_hi)
+                breakpoints.append((value, sel_lo, sel_hi))
+                continue
+            sel, line = solve_at(value)
+            threshold = objective_at(line_lo, value)
+            if objective_at(line, value) >= threshold - tol * max(1., abs(threshold)) \
+               or np.array_equal(sel, sel_lo) or np.array_equal(sel, sel_hi):
+                breakpoints.append((value, sel_lo, sel_hi))
+            else:
+                intervals.append(((sel_lo, line_lo), (sel, line)))
+                intervals.append(((sel, line), (sel_hi, line_hi)))
+
+        breakpoints.sort(key=lambda x: x[0])
+        selections = [lo[0]] + [x[2] for x in breakpoints]
+        sel_lists = []
+        for selected in selections:
+            selected = selected[:(self.num_tasks * self.num_nodes_each_network)]
+            selected = selected.reshape((self.num_tasks, self.num_nodes_each_network))
+            sel_lists.append([np.flatnonzero(sel_task) for sel_task in selected])
+        return [x[0] for x in breakpoints], sel_lists
+
+
+    def solve_values(self, parameter, values, warm_solver=None):
+        """ Solve the problem for several values of eta or lambda, all other
+        hyperparameters being fixed.
+
+        The super-network is built once, and rescaled for each value
+        (see super_network.SuperNetwork.rescale); each problem is warm-started
+        (see WarmStartSolver).
+
+        Parameters
+        ----------
+        parameter: string
+            'eta' or 'lbd'.
+        values: list of floats
+            Values of the parameter.
+        warm_solver: {WarmStartSolver, None}, optional
+            Solver to use (default: a new one).
+
+        Returns
+        -------
+        sel_lists: list of list of np.array
+            Selection for each value (see solve).
+        """
+        if parameter not in ('eta', 'lbd'):
+            raise ValueError("parameter must be 'eta' or 'lbd'")
+        if warm_solver is None:
+            warm_solver = WarmStartSolver()
+        sel_lists = []
+        for value in values:
+            selected, sfan_solver = self._solve_rescaled(parameter, value, warm_solver)
+            selected = selected[:(self.num_tasks * self.num_nodes_each_network)]
+            selected = selected.reshape((self.num_tasks, self.num_nodes_each_network))
+            sel_lists.append([np.flatnonzero(sel_task) for sel_task in selected])
+        return sel_lists
+
+
+    def _solve_rescaled(self, parameter, value, warm_solver):
+        """ Solve the problem for another value of eta or lambda
+        (see compute_path and solve_values).
+
+        Returns
+        -------
+        selected: (super_num_nodes, ) np.array of booleans
+            Nodes of the super-network on the source side of the cut
+            (source included, sink excluded).
+        sfan_solver: Sfan
+            Solver of the problem for that value.
+        """
+        if getattr(self, 'super_network', None) is None:
+            self.create_super_network()
+        if parameter == 'eta' and self.num_tasks > 1 and self.mu > 0 and \
+           not (self.covariance_matrix_f or self.precision_matrix_f):
+            # eta also sets the canonical precision matrix (see _read_task_matrices)
+            sfan_solver = Sfan(self.num_tasks, self.networks, self.node_weights_f,
+                               self.lbd, value, self.mu,
+                               instrumentation=self.instrumentation)
+            sfan_solver.create_super_network()
+        else:
+            # Only the terminal (resp. intra-task) capacities depend on eta (resp. lambda)
+            sfan_solver = copy.copy(self)
+            if parameter == 'eta':
+                sfan_solver.eta = value
+                sfan_solver.super_network = self.super_network.rescale(
+                    terminal_shift=(self.eta - value))
+            else:
+                sfan_solver.lbd = value
+                sfan_solver.super_network = self.super_network.rescale(intra_scale=value)
+        cut = np.zeros((self.super_num_nodes, ), dtype=np.int32)
+        with self.instrumentation.stage('maxflow') as record:
+            warm_solver.solve(sfan_solver.super_network, cut)
+            record['gt_build_time'], record['gt_maxflow_time'] = warm_solver.last_timings
+        selected = cut.astype(bool)
+        selected[sfan_solver.super_network.source] = True
+        selected[sfan_solver.super_network.sink] = False
+        return selected, sfan_solver
+
+
+    def get_objective(self, selected, parameter=None):
+        """ Compute the value of the objective for a given selection.
+
+        The objective is the cost of the corresponding cut of the super-network,
+        up to a constant that does not depend on the selection.
+        It is linear in eta and in lambda.
+
+        Parameters
+        ----------
+        selected: (super_num_nodes, ) np.array of booleans
+            Nodes of the super-network on the source side of the cut
+            (source included, sink excluded).
+        parameter: {'eta', 'lbd', None}, optional
+            Parameter with respect to which to differentiate the objective.
+
+        Returns
+        -------
+        objective: float
+            Value of the objective.
+        slope: float
+            Derivative of the objective with respect to parameter (0 if None).
+        """
+        network = self.super_network
+        tails, heads, caps, rev_caps = network.get_arrays(['intra'])
+        cut_intra = caps[selected[tails] & ~selected[heads]].sum() + \
+                    rev_caps[selected[heads] & ~selected[tails]].sum()
+        tails, heads, caps, rev_caps = network.get_arrays(['cross'])
+        cut_cross = caps[selected[tails] & ~selected[heads]].sum() + \
+                    rev_caps[selected[heads] & ~selected[tails]].sum()
+        # Terminal edges: only the part that depends on the selection
+        cut_terminal = - network.terminal_caps[selected].sum()
+        objective = cut_intra + cut_cross + cut_terminal
+
+        slope = 0.
+        if parameter == 'eta':
+            # Each selected node's terminal capacity decreases by 1
+            slope = float(selected[:-2].sum())
+        elif parameter == 'lbd':
+            # Intra-task edges are scaled by lambda
+            slope = cut_intra / self.lbd if self.lbd else \
+                    sum(self._get_unscaled_cut_intra(selected))
+        return objective, slope
+
+
+    def _get_unscaled_cut_intra(self, selected):
+        """ Weights of the intra-task edges cut by a selection, for each task
+        (that is to say, for lambda = 1).
+        """
+        for current_task, network in enumerate(self.networks):
+            tails, heads, caps, rev_caps = network.get_pairs()
+            offset = current_task * self.num_nodes_each_network
+            sel_tails = selected[tails + offset]
+            sel_heads = selected[heads + offset]
+            yield caps[sel_tails & ~sel_heads].sum() + rev_caps[sel_heads & ~sel_tails].sum()
+
+
+class HyperparametersStatistics(object):
+    """ Statistics of the node weights and networks of a problem, from which
+    ranges of hyperparameters are computed (see Sfan.compute_hyperparameters_range).
+
+    Node weights files are read once, when the statistics are created.
+
+    Attributes
+    ----------
+    node_weights: list of np.array
+        Node weights of each task.
+    cmin: float
+        Smallest node weight.
+    cmax: float
+        Largest node weight (0 if all are negative).
+    wmin: float
+        Smallest positive edge weight of the networks (inf if there is none).
+    wmax: float
+        Largest edge weight of the networks (0 if all are negative).
+    """
+    def __init__(self, node_weights_f, networks):
+        """
+        Parameters
+        ----------
+        node_weights_f: list of filenames
+            Paths of the node weights of each task (or node weights, see load_node_weights).
+        networks: list of super_network.Network
+            Network of each task.
+        """
+        self.node_weights = [load_node_weights(node_weights) for node_weights in node_weights_f]
+        self.cmax = max([0.] + [np.max(c) for c in self.node_weights])
+        self.cmin = min(np.min(c) for c in self.node_weights)
+
+        self.wmax = 0.
+        self.wmin = np.inf
+        # Each network only once
+        for network in dict((id(network), network) for network in networks).values():
+            weights = network.adjacency.data
+            if len(weights):
+                self.wmax = max(self.wmax, np.max(weights))
+            if np.any(weights > 0):
+                self.wmin = min(self.wmin, np.min(weights[weights > 0]))
+
+
+    def get_shifted_statistics(self, task_shifts, shifts, max_chunk_size=2**22):
+        """ Compute statistics of |c - task_shift - shift| for a grid of values
+        of task_shift and shift, c being the node weights.
+
+        Parameters
+        ----------
+        task_shifts: (num_shifts, num_tasks) array
+            Value subtracted from the node weights of each task, for each point of the grid.
+        shifts: (num_shifts, ) array
+            Value subtracted from all node weights, for each point of the grid.
+        max_chunk_size: {int, 2**22}, optional
+            Maximum number of values computed at once.
+
+        Returns
+        -------
+        amin: (num_shifts, ) np.array
+            Smallest |c - task_shift - shift| over all tasks.
+        amax: (num_shifts, ) np.array
+            Largest |c - task_shift - shift| over all tasks.
+        amed: (num_shifts, ) np.array
+            Median of |c - task_shift - shift|, for the last task.
+        """
+        task_shifts = np.asarray(task_shifts, dtype=float)
+        shifts = np.asarray(shifts, dtype=float)
+        num_shifts = len(shifts)
+        amin = np.zeros((num_shifts, )) + np.inf
+        amax = np.zeros((num_shifts, ))
+        amed = np.zeros((num_shifts, ))
+        for task_idx, c in enumerate(self.node_weights):
+            chunk_size = max(1, max_chunk_size / max(1, len(c)))
+            for start in range(0, num_shifts, chunk_size):
+                chunk = slice(start, start + chunk_size)
+                avec = np.abs((c[None, :] - task_shifts[chunk, task_idx][:, None]) - \
+                              shifts[chunk][:, None])
+                amin[chunk] = np.minimum(amin[chunk], np.min(avec, axis=1))
+                amax[chunk] = np.maximum(amax[chunk], np.max(avec, axis=1))
+                if task_idx == len(self.node_weights) - 1:
+                    amed[chunk] = np.median(avec, axis=1)
+        return amin, amax, amed
+
+
+class WarmStartSolver(object):
+    """ Reusable gt_maxflow solver for problems with the same super-network topology.
+
+    Problems that only differ by their hyperparameters (lambda, eta, mu) share
+    the edges of their super-networks, and only differ by their capacities.
+    The solver keeps the graph allocated between problems, and starts from the
+    previous flow instead of building and solving a new graph from scratch.
+    If the topology changes (other networks, other number of tasks, ...),
+    the graph is built again.
+
+    Attributes
+    ----------
+    num_builds: int
+        Number of times the graph was built.
+    num_warm_solves: int
+        Number of problems solved starting from the previous flow.
+    last_timings: tuple
+        Wall-clock times (in seconds) spent by gt_maxflow setting the capacities
+        (and building the graph, if it was built again) and running maxflow,
+        for the last problem.
+    """
+    def __init__(self):
+        self._maxflow = None
+        self._tails = None
+        self._heads = None
+        self.num_builds = 0
+        self.num_warm_solves = 0
+        self.last_timings = (0., 0.)
+
+
+    def solve(self, network, cut):
+        """ Solve the minimum cut problem on a super-network.
+
+        Parameters
+        ----------
+        network: super_network.SuperNetwork
+            Super-network.
+        cut: (network.num_nodes, ) np.array of np.int32
+            Filled with 1 for the nodes on the source side of the minimum cut
+            and 0 for the others.
+
+        Returns
+        -------
+        flow: float
+            Value of the maximum flow.
+        cut_cost: float
+            Cost of the minimum cut.
+        """
+        # Terminal edges are handled by gt_maxflow.WarmMaxflow
+        tails, heads, caps, rev_caps = network.get_arrays(['intra', 'cross'])
+        if self._maxflow is None or (self._num_nodes, self._source, self._sink) != \
+           (network.num_nodes, network.source, network.sink) or \
+           not np.array_equal(self._tails, tails) or \
+           not np.array_equal(self._heads, heads):
+            self._maxflow = gt_maxflow.WarmMaxflow(network.num_nodes, network.source,
+                                                   network.sink, tails, heads)
+            self._num_nodes = network.num_nodes
+            self._source = network.source
+            self._sink = network.sink
+            self._tails = tails
+            self._heads = heads
+            self.num_builds += 1
+
+        flow, cut_cost = self._maxflow.solve(
+            np.ascontiguousarray(caps, dtype=np.float32),
+            np.ascontiguousarray(rev_caps, dtype=np.float32),
+            np.ascontiguousarray(network.terminal_caps, dtype=np.float32),
+            cut)
+        if self._maxflow.warm_started:
+            self.num_warm_solves += 1
+        self.last_timings = self._maxflow.last_timings
+        return flow, cut_cost
+
+
+def solve_super_network(network, cut, num_jobs=1, stats=None):
+    """ Solve the minimum cut problem on a super-network, in-process.
+
+    Nodes whose side of the cut is obvious are first contracted into the
+    source and the sink (see super_network.SuperNetwork.reduce).
+    The rest of the super-network is then split into independent parts
+    (see super_network.SuperNetwork.decompose), and only the parts that
+    need it are handed to gt_maxflow. If num_jobs > 1, large enough parts
+    are solved in parallel, in num_jobs processes.
+
+    Parameters
+    ----------
+    network: super_network.SuperNetwork
+        Super-network.
+    cut: (network.num_nodes, ) np.array of np.int32
+        Filled with 1 for the nodes on the source side of the minimum cut
+        and 0 for the others.
+    num_jobs: {int, 1}, optional
+        Number of processes.
+    stats: {dictionary, None}, optional
+        If given, filled with the size of the super-network ('num_nodes',
+        'num_pairs', source and sink excluded), what was left of it after
+        pre-solve reductions ('num_fixed_source', 'num_fixed_sink',
+        'num_core_nodes', 'num_core_pairs'), and the wall-clock times spent
+        by gt_maxflow building graphs and running maxflow ('gt_build_time',
+        'gt_maxflow_time', summed over all the parts of the super-network).
+
+    Returns
+    -------
+    flow: float
+        Value of the maximum flow.
+    cut_cost: float
+        Cost of the minimum cut.
+    """
+    num_nodes = network.num_nodes - 2
+    fixed = network.reduce()
+    num_fixed = np.count_nonzero(fixed >= 0)
+    if num_fixed and (network.get_shared_topology() is None or \
+                      num_fixed >= MIN_FIXED_FRACTION * num_nodes):
+        core_nodes, core, constant = network.contract(fixed)
+    else:
+        fixed[:] = -1
+        core_nodes, core, constant = np.arange(num_nodes), network, 0.
+
+    if stats is not None:
+        stats['num_nodes'] = num_nodes
+        stats['num_pairs'] = sum(network.num_pairs_per_class.values()) - num_nodes
+        stats['num_fixed_source'] = np.count_nonzero(fixed == 1)
+        stats['num_fixed_sink'] = np.count_nonzero(fixed == 0)
+        stats['num_core_nodes'] = len(core_nodes)
+        stats['num_core_pairs'] = sum(core.num_pairs_per_class.values()) - len(core_nodes)
+
+    cut[:num_nodes] = (fixed == 1)
+    cut[network.source] = 1
+    cut[network.sink] = 0
+    core_cut = np.zeros((core.num_nodes, ), dtype=np.int32)
+    flow, cut_cost, gt_timings = _solve_core(core, core_cut, num_jobs)
+    if stats is not None:
+        stats['gt_build_time'], stats['gt_maxflow_time'] = gt_timings
+    cut[core_nodes] = core_cut[:len(core_nodes)]
+    return flow + constant, cut_cost + constant
+
+
+def _solve_core(network, cut, num_jobs):
+    """ Solve the minimum cut problem on a super-network, by parts
+    (see solve_super_network).
+
+    Returns the flow value, the cost of the cut, and the times spent by gt_maxflow
+    (see _solve_subnetwork), summed over all parts.
+    """
+    selected, parts = network.decompose(num_jobs,
+                                        MIN_NODES_PER_JOB if num_jobs > 1 else 0)
+    cut[:(network.num_nodes - 2)] = selected
+
+    subnetworks = [subnetwork for (nodes, subnetwork) in parts]
+    if num_jobs > 1 and len(parts) > 1:
+        pool = multiprocessing.Pool(min(num_jobs, len(parts)))
+        results = pool.map(_solve_subnetwork, subnetworks)
+        pool.close()
+        pool.join()
+    else:
+        results = [_solve_subnetwork(subnetwork) for subnetwork in subnetworks]
+
+    flow = 0.
+    cut_cost = 0.
+    for (nodes, subnetwork), (subnetwork_cut, subnetwork_flow, subnetwork_cut_cost,
+                              subnetwork_timings) in zip(parts, results):
+        cut[nodes] = subnetwork_cut[:(subnetwork.num_nodes - 2)]
+        flow += subnetwork_flow
+        cut_cost += subnetwork_cut_cost
+    gt_timings = (sum(result[3][0] for result in results),
+                  sum(result[3][1] for result in results))
+    return flow, cut_cost, gt_timings
+
+
+def _solve_subnetwork(network):
+    """ Solve the minimum cut problem on a whole super-network with gt_maxflow.
+
+    Returns the cut (see solve_super_network), the flow value, the cost of the cut,
+    and the wall-clock times spent by gt_maxflow building the graph and running maxflow
+    (see gt_maxflow.python_last_timings).
+    """
+    cut = np.zeros((network.num_nodes, ), dtype=np.int32)
+    shared_topology = network.get_shared_topology()
+    if shared_topology is not None:
+        # Same network for all tasks: gt_maxflow expands the super-network itself
+        shared_network, task_scales, coupling = shared_topology
+        tails, heads, caps, rev_caps = shared_network.get_pairs()
+        flow, cut_cost = gt_maxflow.python_cut_tensor_entry_point(
+            network.num_tasks, network.num_nodes_each_network,
+            np.ascontiguousarray(tails, dtype=np.int32),
+            np.ascontiguousarray(heads, dtype=np.int32),
+            np.ascontiguousarray(caps, dtype=float),
+            np.ascontiguousarray(rev_caps, dtype=float),
+            task_scales, np.ascontiguousarray(coupling),
+            np.ascontiguousarray(network.terminal_caps, dtype=float),
+            cut)
+    else:
+        tails, heads, caps, rev_caps = network.get_arrays()
+        flow, cut_cost = gt_maxflow.python_cut_arrays_entry_point(
+            network.num_nodes, network.source, network.sink,
+            tails, heads,
+            np.ascontiguousarray(caps, dtype=np.float32),
+            np.ascontiguousarray(rev_caps, dtype=np.float32),
+            cut)
+    return cut, flow, cut_cost, gt_maxflow.python_last_timings()
+
+
+def get_runtime_str(time_post_setout_process, time_task_computations,
+                    time_all_tasks_computations, time_gt_maxflow, time_total_time):
+    """ Process runtimes into a printable string.
+
+    Parameters
+    ----------
+    time_post_setout_process: float
+        Time stamp of the end of preprocessing.
+    time_task_computations: list
+        Time stamps of the end of the computations for each task
+        (as returned by Sfan.create_dimacs).
+    time_all_tasks_computations: float
+        Time stamp of the end of the generation of the super-network.
+    time_gt_maxflow: float
+        Time stamp of the end of the optimization.
+    time_total_time: float
+        Total processing time.
+
+    Returns
+    -------
+    runtime_str: string
+        Runtimes, one per line, in the "<description>: <value>" format.
+        The last value is the total processing time.
+    """
+    runtime_str = ""
+    real_time_task_computations = [0 for x in time_task_computations]
+
+    for (i, x) in enumerate(time_task_computations):
+        if i > 0:
+            real_time_task_computations[i] = x - time_task_computations[i - 1]
+            runtime_str += "Task ({0}) computation time: {1}\n".\
+                           format(i + 1, x - time_task_computations[i - 1])
+            
+        else:
+            real_time_task_computations[i] = x - time_post_setout_process
+            runtime_str += "Task ({0}) computation time: {1}\n".\
+                           format(1, x - time_post_setout_process)
+
+    runtime_str += "Task average computation time: {0}\n".\
+                   format(np.mean(np.array(real_time_task_computations)))
+    runtime_str += "Standard deviation computation time: {0}\n".\
+                      format(np.std(np.array(real_time_task_computations)))
+    runtime_str += "Network building time: {0}\n".\
+                      format(time_all_tasks_computations - time_post_setout_process)
+    runtime_str += "gt_maxflow computation time: {0}\n".\
+                      format(time_gt_maxflow - time_all_tasks_computations)
+    runtime_str += "Process time: {0}\n".format(time_total_time)
+
+    return runtime_str
+
+
+def get_arg_parser():
+    """ Get the parser of the command line arguments (see main).
+
+    Returns
+    -------
+    parser: argparse.ArgumentParser
+        Parser of the command line arguments, also used for the lines of batch files
+        (see run_batch).
+    """
+    parser = argparse.ArgumentParser(description="Solve multi-task problem",
+                                     add_help=True)
+    parser.add_argument("-k", "--num_tasks", help="Number of tasks", type=int)
+    parser.add_argument("-w", "--networks", help="Paths of networks. /!\ All networks must have the same number of nodes.", nargs='+')
+    parser.add_argument("-r", "--node_weights", help="Paths of node weights", nargs='+')
+    parser.add_argument("-t", "--test", help="Run tests", action='store_true')
+    parser.add_argument("-c", "--covariance_matrix", help="Path to the covariance matrix")
+    parser.add_argument("-p", "--precision_matrix", help="Path to the precision matrix")
+    parser.add_argument("-l", "--lbd", help="lambda parameter", type=float)
+    parser.add_argument("-e", "--eta", help="eta parameter", type=float)
+    parser.add_argument("-m", "--mu", help="mu parameter", type=float)
+    parser.add_argument("-o", "--output", help="File name for runtime output")
+    parser.add_argument("-b", "--batch", help="Path to a batch file, one problem per line")
+    parser.add_argument("--records", help="File name for the resources used by each stage " + \
+                        "(one JSON record per line)")
+    parser.add_argument("-v", "--verbose", help="Turn on detailed info log",
+                        action='store_true')
+    return parser
+
+
+def check_arguments(args):
+    """ Check the integrity of the arguments of a problem.
+    Exit with an error message if they are not valid.
+
+    Parameters
+    ----------
+    args: argparse.Namespace
+        Arguments, as parsed by get_arg_parser().
+    """
+    try:
+        assert(args.num_tasks >= 1)
+    except AssertionError:
+        logging.error("There must be at least one task specified.\n")
+        logging.error("Use --help for help.\n")
+        sys.exit(-1)
+        
+    try:
+        assert(args.networks is not None and \
+               (len(args.networks) == args.num_tasks or len(args.networks) == 1))
+    except AssertionError:
+        logging.error("There must be either 1 network or as many networks " + \
+                         "as tasks specified.\n")
+        logging.error("Use --help for help.\n")
+        sys.exit(-1)
+        
+    try:
+        assert(args.node_weights is not None and len(args.node_weights) == args.num_tasks)
+    except AssertionError:
+        logging.error("There must be as many weight lists as tasks specified.\n")
+        logging.error("Use --help for help.\n")
+        sys.exit(-1)
+        
+    try:
+        assert(args.lbd is not None and args.lbd > 0.0)
+    except AssertionError:
+        logging.error("The lambda parameter must be strictly positive.\n")
+        logging.error("Use --help for help.\n")
+        sys.exit(-1)
+        
+    try:
+        assert(args.eta is not None and args.eta > 0.0)
+    except AssertionError:
+        logging.error("The eta parameter must be strictly positive.\n")
+        logging.error("Use --help for help.\n")
+        sys.exit(-1)
+        
+    if (args.num_tasks > 1) :
+        try:
+            assert(args.mu is not None and args.mu >= 0.0)
+        except AssertionError:
+            logging.error("The mu parameter must be strictly positive.\n")
+            logging.error("Use --help for help.\n")
+            sys.exit(-1)
+
+
+def run_batch(batch_f, parser, output_f=None, records_f=None):
+    """ Solve the problems listed in a batch file, within the current process.
+
+    Each line of the batch file holds the arguments of one problem, in the format
+    of the command line (e.g. "--num_tasks 2 --networks <network>
+    --node_weights <weights_0> <weights_1> -l 0.001 -e 0.02 -m 0.01").
+    Empty lines and lines starting with '#' are ignored.
+    As for a single problem, sfan is run with "-m 0", and msfan without
+    a covariance or precision matrix.
+
+    All the problems are checked before any of them is solved.
+    Networks are read only once (see super_network.load_network), and the
+    gt_maxflow graph is reused by consecutive problems with the same super-network
+    topology (see WarmStartSolver).
+
+    Parameters
+    ----------
+    batch_f: filename
+        Path to the batch file.
+    parser: argparse.ArgumentParser
+        Parser of the lines of the batch file (see get_arg_parser).
+    output_f: {filename, None}, optional
+        File where to store the output. If None, it is printed to screen.
+    records_f: {filename, None}, optional
+        File where to store the resources used by each stage of each problem
+        (see Instrumentation), one JSON object per line, with the index of the
+        problem ('job').
+
+    Output
+    ------
+    For each problem, in the order of the batch file:
+        # job <job_idx>
+        # lambda <lambda>
+        # eta <eta>
+        # mu <mu> (if mu is not 0)
+        <list of nodes selected in each network, one line per task, starting at 1>
+        <runtimes, in the format of get_runtime_str>
+        # maxRSS <maxRSS>
+    The process time only accounts for the problem, and maxRSS is the maximum
+    resident set size (in kilobytes) of the process so far.
+    """
+    jobs_args = []
+    with open(batch_f, 'r') as f:
+        for line_idx, line in enumerate(f):
+            if not line.strip() or line.startswith('#'):
+                continue
+            job_args = parser.parse_args(shlex.split(line))
+            try:
+                check_arguments(job_args)
+            except SystemExit:
+                logging.error("Invalid problem on line %d of %s.\n" % (line_idx + 1, batch_f))
+                raise
+            jobs_args.append(job_args)
+
+    warm_solver = WarmStartSolver()
+    output_file = open(output_f, 'w') if output_f is not None else sys.stdout
+    records_file = open(records_f, 'w') if records_f is not None else None
+    try:
+        for job_idx, job_args in enumerate(jobs_args):
+            time_start = time.clock()
+            sfan_solver = Sfan(job_args.num_tasks, job_args.networks, job_args.node_weights,
+                               job_args.lbd, job_args.eta, mu=job_args.mu,
+                               covariance_matrix_f=job_args.covariance_matrix,
+                               precision_matrix_f=job_args.precision_matrix)
+            time_post_setout_process = time.clock()
+            time_task_computations = sfan_solver.create_super_network()
+            time_all_tasks_computations = time.clock()
+            sel_list, flow, cut_cost = sfan_solver.solve(warm_solver)
+            time_gt_maxflow = time.clock()
+
+            with sfan_solver.instrumentation.stage('output'):
+                output_file.write("# job %d\n" % job_idx)
+                output_file.write("# lambda %s\n" % job_args.lbd)
+                output_file.write("# eta %s\n" % job_args.eta)
+                if job_args.mu:
+                    output_file.write("# mu %s\n" % job_args.mu)
+                for sel in sel_list:
+                    output_file.write("%s\n" % ' '.join(str(x + 1) for x in sel))
+                output_file.write(get_runtime_str(time_post_setout_process,
+                                                  time_task_computations,
+                                                  time_all_tasks_computations,
+                                                  time_gt_maxflow,
+                                                  time_gt_maxflow - time_start))
+                output_file.write("# maxRSS %d\n" % \
+                                  resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+                # Problems solved so far are not lost if a later one fails
+                output_file.flush()
+            if records_file is not None:
+                sfan_solver.instrumentation.write(records_file, job=job_idx)
+                records_file.flush()
+    finally:
+        if output_f is not None:
+            output_file.close()
+        if records_file is not None:
+            records_file.close()
 
 
 def main() : 
@@ -708,7 +1698,14 @@ def main() :
     args.mu: {float, None}, optional
         Regularization paramter for task relatednes.
     args.output: {filename, None}, optional
-        File where to store computation run times.
+        File where to store computation run times
+        (in batch mode, file where to store the output of all problems).
+    args.batch: {filename, None}, optional
+        Path to a batch file: solve all the problems it lists, within this process,
+        instead of the problem given by the other arguments (see run_batch).
+    args.records: {filename, None}, optional
+        File where to store the resources used by each stage (see Instrumentation),
+        one JSON object per line.
 
     Output
     ------
@@ -732,22 +1729,7 @@ def main() :
         4 6 13 17 18 19 20 22 24 26 28 30 49
         3 4 7 9 12 16 19 22 23 27 29 41 43
     """
-    # Get arguments values
-    parser = argparse.ArgumentParser(description="Solve multi-task problem",
-                                     add_help=True)
-    parser.add_argument("-k", "--num_tasks", help="Number of tasks", type=int)
-    parser.add_argument("-w", "--networks", help="Paths of networks. /!\ All networks must have the same number of nodes.", nargs='+')
-    parser.add_argument("-r", "--node_weights", help="Paths of node weights", nargs='+')
-    parser.add_argument("-t", "--test", help="Run tests", action='store_true')
-    parser.add_argument("-c", "--covariance_matrix", help="Path to the covariance matrix")
-    parser.add_argument("-p", "--precision_matrix", help="Path to the precision matrix")
-    parser.add_argument("-l", "--lbd", help="lambda parameter", type=float)
-    parser.add_argument("-e", "--eta", help="eta parameter", type=float)
-    parser.add_argument("-m", "--mu", help="mu parameter", type=float)
-    parser.add_argument("-o", "--output", help="File name for runtime output")
-    parser.add_argument("-v", "--verbose", help="Turn on detailed info log",
-                        action='store_true')
-    
+    parser = get_arg_parser()
     args = parser.parse_args()
     num_tasks = args.num_tasks
 
@@ -765,52 +1747,16 @@ def main() :
     if args.test:
         logging.info("If no output, all tests passed!\n")
         doctest.testmod()
+        doctest.testmod(super_network)
         sys.exit(0)
 
+    # Batch of problems
+    if args.batch:
+        run_batch(args.batch, parser, output_f=args.output, records_f=args.records)
+        return
+
     # Check arguments integrity
-    try:
-        assert(args.num_tasks >= 1)
-    except AssertionError:
-        logging.error("There must be at least one task specified.\n")
-        logging.error("Use --help for help.\n")
-        sys.exit(-1)
-        
-    try:
-        assert(len(args.networks) == args.num_tasks or len(args.networks) == 1)
-    except AssertionError:
-        logging.error("There must be either 1 network or as many networks " + \
-                         "as tasks specified.\n")
-        logging.error("Use --help for help.\n")
-        sys.exit(-1)
-        
-    try:
-        assert(len(args.node_weights) == args.num_tasks)
-    except AssertionError:
-        logging.error("There must be as many weight lists as tasks specified.\n")
-        logging.error("Use --help for help.\n")
-        sys.exit(-1)
-        
-    try:
-        assert(args.lbd is not None and args.lbd > 0.0)
-    except AssertionError:
-        logging.error("The lambda parameter must be strictly positive.\n")
-        logging.error("Use --help for help.\n")
-        sys.exit(-1)
-        
-    try:
-        assert(args.eta is not None and args.eta > 0.0)
-    except AssertionError:
-        logging.error("The eta parameter must be strictly positive.\n")
-        logging.error("Use --help for help.\n")
-        sys.exit(-1)
-        
-    if (args.num_tasks > 1) :
-        try:
-            assert(args.mu is not None and args.mu >= 0.0)
-        except AssertionError:
-            logging.error("The mu parameter must be strictly positive.\n")
-            logging.error("Use --help for help.\n")
-            sys.exit(-1)
+    check_arguments(args)
 
     # Time stamp: beginning of computations
     time_start = time.clock()
@@ -843,38 +1789,24 @@ def main() :
     time_total_time = time_gt_maxflow = time.clock()
     
     # Process runtimes into a printable string
-    runtime_str = ""
-    real_time_task_computations = [0 for x in time_task_computations]
+    runtime_str = get_runtime_str(time_post_setout_process, time_task_computations,
+                                  time_all_tasks_computations, time_gt_maxflow,
+                                  time_total_time)
 
-    for (i, x) in enumerate(time_task_computations):
-        if i > 0:
-            real_time_task_computations[i] = x - time_task_computations[i - 1]
-            runtime_str += "Task ({0}) computation time: {1}\n".\
-                           format(i + 1, x - time_task_computations[i - 1])
-            
+    # Save runtime_str to file (if provided), otherwise print to screen
+    with sfan_solver.instrumentation.stage('output'):
+        if sfan_solver.output_f is not None:
+            with open(sfan_solver.output_f, 'w') as output_file:
+                output_file.write(runtime_str)
+                output_file.close()
         else:
-            real_time_task_computations[i] = x - time_post_setout_process
-            runtime_str += "Task ({0}) computation time: {1}\n".\
-                           format(1, x - time_post_setout_process)
-
-    runtime_str += "Task average computation time: {0}\n".\
-                   format(np.mean(np.array(real_time_task_computations)))
-    runtime_str += "Standard deviation computation time: {0}\n".\
-                      format(np.std(np.array(real_time_task_computations)))
-    runtime_str += "Network building time: {0}\n".\
-                      format(time_all_tasks_computations - time_post_setout_process)
-    runtime_str += "gt_maxflow computation time: {0}\n".\
-                      format(time_gt_maxflow - time_all_tasks_computations)
-    runtime_str += "Process time: {0}\n".format(time_total_time)
-
+            print("%s" % runtime_str)
+        sys.stdout.flush()
 
-    # Save runtime_str to file (if provided), otherwise print to screen
-    if sfan_solver.output_f is not None:
-        with open(sfan_solver.output_f, 'w') as output_file:
-            output_file.write(runtime_str)
-            output_file.close()
-    else:
-        print("%s" % runtime_str)
+    # Save the records of the stages to file (if provided)
+    if args.records is not None:
+        with open(args.records, 'w') as records_file:
+            sfan_solver.instrumentation.write(records_file)
                 
         
 if __name__ == "__main__":
@@ -1,6 +1,11 @@
 #!/bin/sh 
-python synthetic_data_experiments__parallel-fold.py -k $1 -m $2 -n $3 -r $4 -f $5 -s $6 $7 $8 $9 $10 $11 $12 $SGE_TASK_ID --verbose\
->$8'/SGE-outputs/'$2'r'$12'f'$SGE_TASK_ID'.o'
+# Arguments after the 12th are options of synthetic_data_experiments__parallel-fold.py
+# (-j <num_workers>, --cache_dir <dirname>, --cache_size <MB>)
+FOLD_ARGS="-k $1 -m $2 -n $3 -r $4 -f $5 -s $6 $7 $8 $9 ${10} ${11} ${12} $SGE_TASK_ID"
+OUTPUT_FNAME=$8'/SGE-outputs/'$2'r'${12}'f'$SGE_TASK_ID'.o'
+shift 12
+python synthetic_data_experiments__parallel-fold.py "$@" $FOLD_ARGS --verbose\
+>$OUTPUT_FNAME
 
 # "-k = num_tasks",
 # "-m = num_features"
@@ -1,4 +1,61 @@
 """ score.py -- Compute individual feature scores.
+
+Tests are run with python -m doctest score.py.
+
+compute_r2 gives the squared Pearson correlation of each feature with each outcome,
+and a score of 0 to features with zero variance:
+>>> rng = np.random.RandomState(0)
+>>> num_features, num_samples = 20, 50
+>>> X = rng.randint(0, 3, (num_features, num_samples))
+>>> X[3, :] = 1
+>>> Y = rng.randn(num_samples, 2)
+>>> scores = compute_r2(X, Y)
+>>> np.allclose([[st.pearsonr(X[feat_idx, :], Y[:, task_idx])[0]**2 for task_idx in range(2)] \\
+...              for feat_idx in range(num_features) if feat_idx != 3],
+...             np.delete(scores, 3, axis=0))
+True
+>>> scores[3, :].tolist()
+[0.0, 0.0]
+>>> np.allclose(compute_r2(X, Y[:, 0]), scores[:, 0])
+True
+
+The scores computed by blocks of features, on some of the samples,
+do not depend on the size of the blocks:
+>>> sample_indices = sorted(rng.choice(num_samples, 30, replace=False))
+>>> scores = compute_r2(X[:, sample_indices], Y[sample_indices, :])
+>>> for max_memory in [1, 5000, MAX_BLOCK_MEMORY]:
+...     blocks = list(iter_r2_blocks(X, Y[sample_indices, :], sample_indices, max_memory))
+...     print len(blocks), np.allclose(np.vstack([block for start, block in blocks]), scores)
+20 True
+5 True
+1 True
+
+and are written one per line by save_r2:
+>>> from StringIO import StringIO
+>>> score_files = [StringIO(), StringIO()]
+>>> save_r2(X, Y[sample_indices, :], score_files, sample_indices, max_memory=5000)
+>>> np.allclose([np.loadtxt(f.getvalue().splitlines()) for f in score_files], scores.T,
+...             rtol=1e-3)
+True
+
+The scores of subsamples of a training set, obtained from its sufficient statistics,
+are those computed on each subsample, including for features that are constant
+on a subsample only:
+>>> train_indices = sorted(rng.choice(num_samples, 40, replace=False))
+>>> subsample_indices_list = [sorted(rng.choice(train_indices, 30, replace=False)) \\
+...                           for ss_idx in range(3)]
+>>> X[5, subsample_indices_list[0]] = 2
+>>> for max_memory in [1, 5000, MAX_BLOCK_MEMORY]:
+...     blocks = list(iter_subsample_r2_blocks(X, Y, train_indices, subsample_indices_list,
+...                                            max_memory))
+...     print len(blocks), all(np.allclose(np.vstack([scores_list[ss_idx] \\
+...                                                   for start, scores_list in blocks]),
+...                                        compute_r2(X[:, subsample_indices],
+...                                                   Y[subsample_indices, :])) \\
+...                            for ss_idx, subsample_indices in enumerate(subsample_indices_list))
+20 True
+7 True
+1 True
 """
 
 import argparse
@@ -8,6 +65,9 @@ import os
 import scipy.stats as st 
 import sys
 
+MAX_BLOCK_MEMORY = 2**28 # default memory ceiling of iter_r2_blocks, in bytes
+
+
 class ScoreFeatures(object):
     """ Class for scoring individual features.
 
@@ -43,6 +103,241 @@ class ScoreFeatures(object):
         """
         scores = (np.dot(self.X, (self.y - np.mean(self.y))))**2
         return scores
-        
-        
-        
+
+
+    def compute_r2(self):
+        """
+        Compute the squared Pearson correlation between each feature and the outcome
+        (see compute_r2).
+
+        Returns
+        -------
+        scores: (num_features, ) np.array
+            Squared Pearson correlation for each feature.
+        """
+        return compute_r2(self.X, self.y)
+
+
+
+def compute_r2(X, Y):
+    """ Compute the squared Pearson correlation between each feature and each outcome.
+
+    Same as st.pearsonr(X[feat_idx, :], Y[:, task_idx])[0]**2 for all features and
+    outcomes, but X is standardized once and all correlations are computed
+    with a single matrix product.
+    Features (or outcomes) with zero variance get a score of 0.
+
+    Parameters
+    ----------
+    X: (num_features, num_samples) np.array
+        Design matrix (genotype).
+    Y: (num_samples, ) or (num_samples, num_tasks) np.array
+        Outcome(s) (phenotypes).
+
+    Returns
+    -------
+    scores: (num_features, ) or (num_features, num_tasks) np.array
+        Squared Pearson correlation for each feature (and each outcome).
+    """
+    Y = np.asarray(Y, dtype=float)
+    r = np.dot(standardize(X, axis=1), standardize(Y.reshape((Y.shape[0], -1)), axis=0))
+    scores = np.clip(r, -1., 1.)**2
+    if Y.ndim == 1:
+        return scores[:, 0]
+    return scores
+
+
+def iter_r2_blocks(X, Y, sample_indices=None, max_memory=MAX_BLOCK_MEMORY, dtype=float):
+    """ Compute the squared Pearson correlation between each feature and each outcome
+    (see compute_r2) by blocks of features, without loading X in memory.
+
+    X is read by blocks of rows aligned to its chunks (for a PyTables array),
+    as large as allowed by max_memory.
+
+    Parameters
+    ----------
+    X: (num_features, num_samples) array-like, e.g. tables.CArray
+        Design matrix (genotype).
+    Y: (num_selected_samples, ) or (num_selected_samples, num_tasks) np.array
+        Outcome(s) (phenotypes) of the selected samples.
+    sample_indices: {list of int, None}, optional
+        Indices of the selected samples (None for all samples).
+    max_memory: {int, MAX_BLOCK_MEMORY}, optional
+        Approximate memory used by a block, in bytes.
+    dtype: {np.dtype, float}, optional
+        Type of the computations (e.g. np.float32 to halve memory use).
+
+    Yields
+    ------
+    start: int
+        Index of the first feature of the block.
+    scores: (block_size, ) or (block_size, num_tasks) np.array
+        Squared Pearson correlation for each feature of the block (and each outcome).
+    """
+    num_features, num_samples = X.shape
+    Y = np.asarray(Y, dtype=float)
+    Ys = standardize(Y.reshape((Y.shape[0], -1)), axis=0, dtype=dtype)
+    num_selected_samples = Ys.shape[0]
+
+    # Memory per feature: raw row, standardized row (and a temporary copy), scores
+    row_memory = num_samples * np.dtype(X.dtype).itemsize + \
+                 3 * num_selected_samples * np.dtype(dtype).itemsize + \
+                 Ys.shape[1] * np.dtype(dtype).itemsize
+    block_rows = _get_block_rows(X, row_memory, max_memory)
+
+    for start in xrange(0, num_features, block_rows):
+        X_block = X[start:(start + block_rows), :]
+        if sample_indices is not None:
+            X_block = X_block[:, sample_indices]
+        r = np.dot(standardize(X_block, axis=1, dtype=dtype), Ys)
+        scores = np.clip(r, -1., 1.)**2
+        if Y.ndim == 1:
+            scores = scores[:, 0]
+        yield start, scores
+
+
+def iter_subsample_r2_blocks(X, Y, train_indices, subsample_indices_list,
+                             max_memory=MAX_BLOCK_MEMORY):
+    """ Compute the squared Pearson correlation between each feature and each outcome
+    (see compute_r2) on several subsamples of a training set, by blocks of features
+    (see iter_r2_blocks).
+
+    The sums and squared sums of each feature, and its cross-products with each
+    outcome, are computed once on the training set. The statistics of each subsample
+    are obtained by subtracting the contributions of the training samples it leaves
+    out, so that scoring a subsample only costs in proportion to those samples.
+
+    Parameters
+    ----------
+    X: (num_features, num_samples) array-like, e.g. tables.CArray
+        Design matrix (genotype).
+    Y: (num_samples, num_tasks) np.array
+        Outcomes (phenotypes) of all samples.
+    train_indices: list of int
+        Indices of the samples of the training set.
+    subsample_indices_list: list of list of int
+        Indices of the samples of each subsample (subsets of train_indices).
+    max_memory: {int, MAX_BLOCK_MEMORY}, optional
+        Approximate memory used by a block, in bytes.
+
+    Yields
+    ------
+    start: int
+        Index of the first feature of the block.
+    scores_list: list of (block_size, num_tasks) np.array
+        Squared Pearson correlation for each feature of the block and each outcome,
+        for each subsample.
+    """
+    num_features, num_samples = X.shape
+    train_indices = np.asarray(train_indices)
+    heldout_indices_list = [np.setdiff1d(train_indices, subsample_indices) \
+                            for subsample_indices in subsample_indices_list]
+    for heldout_indices, subsample_indices in zip(heldout_indices_list,
+                                                  subsample_indices_list):
+        if len(heldout_indices) + len(subsample_indices) != len(train_indices):
+            raise ValueError("subsamples must be subsets of the training set")
+
+    # Centering the outcomes on the training set limits cancellations
+    Y = np.asarray(Y, dtype=float)
+    Y = Y - np.mean(Y[train_indices, :], axis=0)
+    y_sums = np.sum(Y[train_indices, :], axis=0)
+    y_squared_sums = np.sum(Y[train_indices, :]**2, axis=0)
+    # Statistics of the outcomes, for each subsample
+    y_stats = []
+    for heldout_indices in heldout_indices_list:
+        num = len(train_indices) - len(heldout_indices)
+        sums = y_sums - np.sum(Y[heldout_indices, :], axis=0)
+        squared_sums = y_squared_sums - np.sum(Y[heldout_indices, :]**2, axis=0)
+        y_stats.append((num, sums, num * squared_sums - sums**2))
+
+    # Memory per feature: raw row, row as floats, training samples (and their squares)
+    row_memory = num_samples * (np.dtype(X.dtype).itemsize + np.dtype(float).itemsize) + \
+                 2 * len(train_indices) * np.dtype(float).itemsize
+    block_rows = _get_block_rows(X, row_memory, max_memory)
+
+    for start in xrange(0, num_features, block_rows):
+        X_block = np.asarray(X[start:(start + block_rows), :], dtype=float)
+        # (genotypes are integers: sums of features are exact in floating point)
+        X_train = X_block[:, train_indices]
+        sums = np.sum(X_train, axis=1)
+        squared_sums = np.sum(X_train**2, axis=1)
+        cross_products = np.dot(X_train, Y[train_indices, :])
+        del X_train
+
+        scores_list = []
+        for heldout_indices, (num, y_sums_s, y_variances) in zip(heldout_indices_list,
+                                                                y_stats):
+            X_heldout = X_block[:, heldout_indices]
+            sums_s = sums - np.sum(X_heldout, axis=1)
+            variances = num * (squared_sums - np.sum(X_heldout**2, axis=1)) - sums_s**2
+            covariances = num * (cross_products - np.dot(X_heldout, Y[heldout_indices, :])) - \
+                          sums_s[:, None] * y_sums_s[None, :]
+            norms = np.sqrt(np.outer(variances, y_variances))
+            # Features (or outcomes) with zero variance
+            norms[~(norms > 0)] = np.inf
+            scores_list.append(np.clip(covariances / norms, -1., 1.)**2)
+        yield start, scores_list
+
+
+def _get_block_rows(X, row_memory, max_memory):
+    """ Number of rows of X in a block of at most max_memory bytes
+    (at least one chunk of X for a PyTables array), row_memory being the memory
+    used per row.
+    """
+    chunkshape = getattr(X, 'chunkshape', None)
+    chunk_rows = chunkshape[0] if chunkshape else 1
+    return max(1, max_memory / row_memory / chunk_rows) * chunk_rows
+
+
+def save_r2(X, Y, score_files, sample_indices=None, max_memory=MAX_BLOCK_MEMORY,
+            dtype=float):
+    """ Compute the squared Pearson correlation between each feature and each outcome
+    by blocks of features (see iter_r2_blocks), and write them to files as they come.
+
+    Parameters
+    ----------
+    X: (num_features, num_samples) array-like, e.g. tables.CArray
+        Design matrix (genotype).
+    Y: (num_selected_samples, num_tasks) np.array
+        Outcomes (phenotypes) of the selected samples.
+    score_files: list of file objects
+        Open files to which the scores of each outcome are written, one per line.
+    sample_indices: {list of int, None}, optional
+        Indices of the selected samples (None for all samples).
+    max_memory: {int, MAX_BLOCK_MEMORY}, optional
+        Approximate memory used by a block, in bytes.
+    dtype: {np.dtype, float}, optional
+        Type of the computations.
+    """
+    for start, scores in iter_r2_blocks(X, Y, sample_indices=sample_indices,
+                                        max_memory=max_memory, dtype=dtype):
+        for task_idx, f in enumerate(score_files):
+            np.savetxt(f, scores[:, task_idx], fmt='%.3e')
+
+
+def standardize(X, axis=1, dtype=float):
+    """ Center X along the given axis and scale it to unit norm.
+
+    Rows (or columns) with zero variance are set to 0.
+
+    Parameters
+    ----------
+    X: np.array
+        Data.
+    axis: {int, 1}, optional
+        Axis along which to standardize.
+    dtype: {np.dtype, float}, optional
+        Type of the standardized data.
+
+    Returns
+    -------
+    Xs: np.array of dtype
+        Standardized data.
+    """
+    X = np.asarray(X, dtype=dtype)
+    Xs = X - np.mean(X, axis=axis, keepdims=True)
+    norms = np.sqrt(np.sum(Xs**2, axis=axis, keepdims=True))
+    # Constant rows (or columns), which centering may not map exactly to 0
+    norms[np.ptp(X, axis=axis, keepdims=True) == 0] = np.inf
+    Xs /= norms
+    return Xs
@@ -0,0 +1,973 @@
+""" super_network.py: Super-network of a multi-task network-guided feature selection
+problem, stored as arrays of edges.
+
+Nodes of the super-network are indexed from 0:
+    - node i of task t has index (t * num_nodes_each_network + i);
+    - the source has index (num_tasks * num_nodes_each_network);
+    - the sink has index (num_tasks * num_nodes_each_network + 1).
+
+Tests are run with multitask_sfan.py -t (gt_maxflow must be imported before scipy).
+Minimum cuts computed in-process (multitask_sfan.solve_super_network) are compared
+to those of gt_maxflow on the dimacs description of the super-network:
+>>> import gt_maxflow
+>>> import multitask_sfan
+>>> def check_cut(network):
+...     cut = np.zeros((network.num_nodes, ), dtype=np.int32)
+...     flow, cut_cost = multitask_sfan.solve_super_network(network, cut)
+...     dimacs_cut = np.zeros((network.num_nodes, ), dtype=np.int32)
+...     dimacs_flow, dimacs_cut_cost = gt_maxflow.python_cut_entry_point(network.to_dimacs(),
+...                                                                      dimacs_cut)
+...     return np.flatnonzero(cut[:-2]).tolist(), np.array_equal(cut, dimacs_cut), \\
+...            round(cut_cost, 4), round(dimacs_cut_cost, 4)
+>>> def make_network(adjacency, terminal_caps, coupling=None, shared=True):
+...     networks = [Network(adjacency)] * len(terminal_caps) if shared else \\
+...                [Network(adjacency) for caps in terminal_caps]
+...     super_network = SuperNetwork(len(terminal_caps), adjacency.shape[0])
+...     for task_idx, caps in enumerate(terminal_caps):
+...         super_network.add_intra_task_edges(task_idx, networks[task_idx], 1.)
+...         super_network.add_terminal_edges(task_idx, np.array(caps, dtype=float))
+...     if coupling is not None:
+...         super_network.add_cross_task_edges(coupling)
+...     return super_network
+
+Network without edges:
+>>> pair_edges(sp.csr_matrix((5, 5)))
+(array([], dtype=int32), array([], dtype=int32), array([], dtype=float64), array([], dtype=float64))
+>>> check_cut(make_network(sp.csr_matrix((3, 3)), [[1., -1., 2.], [-1., 1., -2.]], \\
+...                        [[0., 0.5], [0.5, 0.]]))
+([0, 2, 4], True, 1.5, 1.5)
+
+Network with self-loops only (they are ignored):
+>>> pair_edges(sp.diags([1., 2., 3.]).tocsr())
+(array([], dtype=int32), array([], dtype=int32), array([], dtype=float64), array([], dtype=float64))
+>>> check_cut(make_network(sp.diags([1., 2., 3.]), [[1., -1., 2.]]))
+([0, 2], True, 0.0, 0.0)
+
+Each edge of a path 0 - 1 - 2 - 3 is paired with its reverse edge:
+>>> path = sp.csr_matrix(np.diag([1., 1., 1.], 1) + np.diag([1., 1., 1.], -1))
+>>> pair_edges(path)
+(array([0, 1, 2], dtype=int32), array([1, 2, 3], dtype=int32), array([1., 1., 1.]), array([1., 1., 1.]))
+
+Two tasks on this path, coupled by cross-task edges:
+>>> network = make_network(path, [[1., 0.5, -0.5, -3.], [-1., 0.5, 2., -3.]], \\
+...                        np.array([[0., 0.2], [0.2, 0.]]))
+>>> network.num_nodes, network.num_pairs_per_class
+(10, {'terminal': 8, 'intra': 6, 'cross': 4})
+>>> network.to_dimacs().splitlines()[:5]
+['p max 10 28', 'n 9 s', 'n 10 t', 'a 1 2 1.000000', 'a 2 1 1.000000']
+>>> check_cut(network)
+([0, 1, 4, 5, 6], True, 3.2, 3.2)
+
+Pre-solve reductions, on the same path: node 0 is linked to the source
+with a capacity equal to the total capacity of its edges, node 3 to the sink
+with a capacity larger than the total capacity of its edges; once they are fixed,
+node 1 (resp. 2) is linked to the source (resp. sink) through them:
+>>> network = make_network(path, [[1., 0.5, -0.5, -3.]])
+>>> network.reduce(max_rounds=1)
+array([ 1, -1, -1,  0], dtype=int8)
+>>> network.reduce()
+array([1, 1, 0, 0], dtype=int8)
+>>> core_nodes, core, constant = network.contract(network.reduce(max_rounds=1))
+>>> core_nodes, core.terminal_caps[:-2], constant
+(array([1, 2]), array([ 1.5, -1.5]), 0.0)
+>>> check_cut(network)
+([0, 1], True, 1.0, 1.0)
+
+Decomposition into connected components: nodes 0 and 1 are all linked to the source,
+node 4 is isolated and linked to the source with a capacity of 0, and node 5 is isolated
+and linked to the sink. They are settled without running maxflow (nodes 0, 1 and 4 being
+on the source side, as with gt_maxflow), and only nodes 2 and 3 are left to solve:
+>>> adjacency = sp.csr_matrix((np.ones(4), ([0, 1, 2, 3], [1, 0, 3, 2])), shape=(6, 6))
+>>> network = make_network(adjacency, [[1., 2., 1., -2., 0., -1.]])
+>>> network.get_components()
+(4, array([0, 0, 1, 1, 2, 3], dtype=int32))
+>>> selected, parts = network.decompose()
+>>> np.flatnonzero(selected), [nodes.tolist() for (nodes, subnetwork) in parts]
+(array([0, 1, 4]), [[2, 3]])
+>>> check_cut(network)
+([0, 1, 2, 4], True, 1.0, 1.0)
+>>> check_cut(make_network(adjacency, [[1., 2., 1., -2., 0., -1.]] * 2, [[0., 0.3], [0.3, 0.]], \\
+...                        shared=False))
+([0, 1, 2, 4, 6, 7, 8, 10], True, 2.0, 2.0)
+
+The network is only stored once when it is shared by all tasks,
+and gt_maxflow expands the super-network itself:
+>>> network = make_network(path, [[1., 0.5, -0.5, -3.], [-1., 0.5, 2., -3.]], \\
+...                        [[0., 0.2], [0.2, 0.]])
+>>> shared_network, task_scales, coupling = network.get_shared_topology()
+>>> shared_network.num_nodes, task_scales, coupling.tolist()
+(4, array([1., 1.]), [[0.0, 0.2], [0.2, 0.0]])
+>>> tails, heads, caps, rev_caps = shared_network.get_pairs()
+>>> cut = np.zeros((network.num_nodes, ), dtype=np.int32)
+>>> flow, cut_cost = gt_maxflow.python_cut_tensor_entry_point(
+...     2, 4, tails.astype(np.int32), heads.astype(np.int32), caps, rev_caps,
+...     task_scales, coupling, network.terminal_caps, cut)
+>>> np.flatnonzero(cut[:-2]).tolist(), round(cut_cost, 4)
+([0, 1, 4, 5, 6], 3.2)
+>>> check_cut(network)
+([0, 1, 4, 5, 6], True, 3.2, 3.2)
+>>> print make_network(path, [[1., 0.5, -0.5, -3.]] * 2, shared=False).get_shared_topology()
+None
+
+Rescaling a super-network gives the same cuts as building it with the new capacities:
+>>> rescaled = network.rescale(intra_scale=0.5, terminal_shift=-0.6)
+>>> rescaled.get_shared_topology()[1], network.get_shared_topology()[1]
+(array([0.5, 0.5]), array([1., 1.]))
+>>> check_cut(rescaled) == check_cut(make_network(0.5 * path, [[0.4, -0.1, -1.1, -3.6],
+...                                                            [-1.6, -0.1, 1.4, -3.6]],
+...                                               [[0., 0.2], [0.2, 0.]]))
+True
+
+Tasks with a zero entry in the precision matrix are not connected by cross-task edges
+(here, task 2 is not connected to the others):
+>>> precision = np.array([[2., -1., 0.], [-1., 2., 0.], [0., 0., 1.]])
+>>> np.savetxt('/tmp/test.precision', precision)
+>>> node_weights = [np.array([1., 0.5, -0.5, -3.]), np.array([-1., 0.5, 2., -3.]), \\
+...                 np.array([1., -1., 1., -1.])]
+>>> sfan_solver = multitask_sfan.Sfan(3, [path], node_weights, 0.1, 0.1, mu=0.1, \\
+...                                   precision_matrix_f='/tmp/test.precision')
+>>> tt = sfan_solver.create_super_network()
+>>> sfan_solver.super_network.num_pairs_per_class
+{'terminal': 12, 'intra': 9, 'cross': 4}
+>>> sfan_solver.super_network.get_components()
+(2, array([0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1], dtype=int32))
+>>> check_cut(sfan_solver.super_network)
+([0, 1, 5, 6, 8, 10], True, 0.8, 0.8)
+
+Random networks, some of their nodes having a terminal capacity of 0,
+some pairs of tasks not being coupled:
+>>> rng = np.random.RandomState(0)
+>>> results = []
+>>> for trial in range(40):
+...     num_nodes, num_tasks = rng.randint(1, 8), rng.randint(1, 4)
+...     adjacency = sp.random(num_nodes, num_nodes, density=rng.rand(), random_state=rng)
+...     terminal_caps = np.round(rng.randn(num_tasks, num_nodes), 1)
+...     terminal_caps[rng.rand(num_tasks, num_nodes) < 0.2] = 0.
+...     coupling = np.round(rng.rand(num_tasks, num_tasks), 1) * \\
+...                (rng.rand(num_tasks, num_tasks) < 0.5)
+...     results.append(check_cut(make_network(adjacency, terminal_caps, coupling,
+...                                           shared=(trial % 2 == 0))))
+>>> all(same_cut and (cut_cost == dimacs_cut_cost) \\
+...     for (selected, same_cut, cut_cost, dimacs_cut_cost) in results)
+True
+"""
+
+import copy
+import numpy as np
+import os
+import scipy.sparse as sp
+import scipy.sparse.csgraph as csgraph
+
+# Networks already read, indexed by absolute path (see load_network)
+_network_cache = {}
+
+
+class Network(object):
+    """ Network of features, held in memory in compressed sparse row format.
+
+    Attributes
+    ----------
+    num_nodes: int
+        Number of nodes.
+    num_edges: int
+        Number of edges, as announced in the header of the network file.
+    adjacency: (num_nodes, num_nodes) scipy.sparse.csr_matrix
+        Weighted adjacency matrix of the network (indices start at 0).
+        Zero-weight edges are dropped.
+    """
+    def __init__(self, adjacency, num_edges=None):
+        """
+        Parameters
+        ----------
+        adjacency: (num_nodes, num_nodes) scipy.sparse matrix
+            Weighted adjacency matrix of the network.
+        num_edges: {int, None}, optional
+            Number of edges (default: number of non-zero entries of adjacency).
+        """
+        self.adjacency = sp.csr_matrix(adjacency)
+        self.adjacency.eliminate_zeros()
+        self.num_nodes = self.adjacency.shape[0]
+        if num_edges is None:
+            num_edges = self.adjacency.nnz
+        self.num_edges = num_edges
+        self._pairs = None
+
+
+    def get_pairs(self):
+        """ Get the edges of the network grouped by pairs of reverse edges.
+
+        Computed once (see pair_edges).
+
+        Returns
+        -------
+        tails, heads, caps, rev_caps: (num_pairs, ) np.arrays
+            See pair_edges.
+        """
+        if self._pairs is None:
+            self._pairs = pair_edges(self.adjacency)
+        return self._pairs
+
+
+    def get_subnetwork(self, nodes):
+        """ Restrict the network to a set of nodes.
+
+        Parameters
+        ----------
+        nodes: (num_subnetwork_nodes, ) np.array
+            Indices of the nodes, in increasing order.
+
+        Returns
+        -------
+        subnetwork: Network
+            Network in which node nodes[i] has index i
+            (the network itself if nodes are all its nodes).
+        """
+        if len(nodes) == self.num_nodes:
+            return self
+        subnetwork = Network(self.adjacency[nodes][:, nodes])
+        if self._pairs is not None:
+            # Pairs of the subnetwork, in the same order as pair_edges would give them
+            new_index = -np.ones((self.num_nodes, ), dtype=np.int32)
+            new_index[nodes] = np.arange(len(nodes))
+            tails, heads, caps, rev_caps = self._pairs
+            keep = (new_index[tails] >= 0) & (new_index[heads] >= 0)
+            subnetwork._pairs = (new_index[tails[keep]], new_index[heads[keep]],
+                                 caps[keep], rev_caps[keep])
+        return subnetwork
+
+
+def read_network(network_f):
+    """ Read a network file in DIMACS format.
+
+    The first line of the file must be the problem line ('p max <nodes> <edges>').
+
+    Parameters
+    ----------
+    network_f: filename
+        Path to the network file.
+
+    Returns
+    -------
+    network: Network
+        The network.
+    """
+    with open(network_f, 'r') as f:
+        ls = f.readline().split()
+        num_nodes = int(ls[2])
+        num_edges = int(ls[3])
+        arcs = np.loadtxt(f, comments=('c', 'p', 'n'), usecols=(1, 2, 3),
+                          ndmin=2)
+        f.close()
+    if not arcs.size:
+        arcs = np.zeros((0, 3))
+    adjacency = sp.csr_matrix((arcs[:, 2],
+                               (arcs[:, 0].astype(int) - 1, arcs[:, 1].astype(int) - 1)),
+                              shape=(num_nodes, num_nodes))
+    return Network(adjacency, num_edges)
+
+
+def load_network(network_f):
+    """ Get a network, reading its file only if it was not read before.
+
+    Networks are cached by path, and read again if the size or the
+    modification time of the file changed.
+
+    Parameters
+    ----------
+    network_f: filename
+        Path to the network file.
+
+    Returns
+    -------
+    network: Network
+        The network. It is shared by all callers and must not be modified.
+    """
+    path = os.path.abspath(network_f)
+    stat = os.stat(path)
+    file_id = (stat.st_size, stat.st_mtime)
+    if path not in _network_cache or _network_cache[path][0] != file_id:
+        _network_cache[path] = (file_id, read_network(path))
+    return _network_cache[path][1]
+
+
+def as_network(network):
+    """ Get a network given as a file, as an adjacency matrix, or as a Network.
+
+    Parameters
+    ----------
+    network: filename, (num_nodes, num_nodes) scipy.sparse matrix or Network
+        Path to the network file (read with load_network), or weighted adjacency
+        matrix of the network, in which entry (i, j) is the weight of the edge
+        from node i to node j (indices start at 0).
+
+    Returns
+    -------
+    network: Network
+        The network.
+    """
+    if isinstance(network, Network):
+        return network
+    if isinstance(network, basestring):
+        return load_network(network)
+    return Network(network)
+
+
+def clear_network_cache():
+    """ Forget all networks read by load_network.
+    """
+    _network_cache.clear()
+
+
+def pair_edges(adjacency):
+    """ Group the edges of a network by pairs of reverse edges.
+
+    Parameters
+    ----------
+    adjacency: (num_nodes, num_nodes) scipy.sparse matrix
+        Weighted adjacency matrix of the network.
+
+    Returns
+    -------
+    tails: (num_pairs, ) np.array
+        Tail of each pair (lowest node index).
+    heads: (num_pairs, ) np.array
+        Head of each pair (highest node index).
+    caps: (num_pairs, ) np.array
+        Weight of the edge from tail to head (possibly 0).
+    rev_caps: (num_pairs, ) np.array
+        Weight of the edge from head to tail (possibly 0).
+    """
+    upper = sp.triu(adjacency, 1).tocsr()
+    lower = sp.tril(adjacency, -1).transpose().tocsr()
+    pattern = (abs(upper) + abs(lower)).tocoo()
+    tails = pattern.row
+    heads = pattern.col
+    if not pattern.nnz:
+        # Indexing with empty arrays would give a (1, 0) matrix
+        return tails, heads, np.zeros(0), np.zeros(0)
+    caps = np.asarray(upper[tails, heads], dtype=float).ravel()
+    rev_caps = np.asarray(lower[tails, heads], dtype=float).ravel()
+    return tails, heads, caps, rev_caps
+
+
+class SuperNetwork(object):
+    """ Super-network of a multi-task network-guided feature selection problem.
+
+    Edges are stored by pairs (see get_arrays): the pair e goes from tails[e]
+    to heads[e] with capacity caps[e], and from heads[e] to tails[e] with
+    capacity rev_caps[e].
+
+    Intra-task and cross-task edges are only stored as the network of each task,
+    scaled by a per-task factor, and the matrix of coupling between tasks.
+    They are expanded into arrays when needed only (see get_arrays),
+    and not at all when all tasks share the same network (see get_shared_topology).
+
+    Attributes
+    ----------
+    num_tasks: int
+        Number of tasks.
+    num_nodes_each_network: int
+        Number of nodes per task network.
+    num_nodes: int
+        Total number of nodes of the super network (source and sink included).
+    source: int
+        Index of the source.
+    sink: int
+        Index of the sink.
+    num_pairs_per_class: dictionary
+        Number of pairs of edges of each class:
+        'intra' (within a task), 'cross' (between tasks) and 'terminal'
+        (from the source or to the sink).
+    terminal_caps: (num_nodes, ) np.array
+        Signed capacity of the terminal edge of each node (see add_terminal_edges);
+        0 for the source and the sink.
+    """
+    def __init__(self, num_tasks, num_nodes_each_network):
+        """
+        Parameters
+        ----------
+        num_tasks: int
+            Number of tasks.
+        num_nodes_each_network: int
+            Number of nodes per task network.
+        """
+        self.num_tasks = num_tasks
+        self.num_nodes_each_network = num_nodes_each_network
+        self.num_nodes = num_tasks * num_nodes_each_network + 2
+        self.source = self.num_nodes - 2
+        self.sink = self.num_nodes - 1
+
+        self._edges = []
+        self._arrays = None
+        # (task_idx, network, scale) for each call to add_intra_task_edges
+        self._intra_edges = []
+        # (num_tasks, num_tasks) capacities of cross-task edges, if any
+        self._coupling = None
+        self.num_pairs_per_class = {'intra': 0, 'cross': 0, 'terminal': 0}
+        self.terminal_caps = np.zeros((self.num_nodes, ))
+
+
+    def add_edges(self, edge_class, tails, heads, caps, rev_caps=None):
+        """ Add pairs of edges to the super-network.
+
+        Parameters
+        ----------
+        edge_class: string
+            'intra', 'cross' or 'terminal'.
+        tails: (num_pairs, ) np.array
+            Tail of each pair of edges.
+        heads: (num_pairs, ) np.array
+            Head of each pair of edges.
+        caps: (num_pairs, ) np.array
+            Capacity of the edges from tail to head.
+        rev_caps: {(num_pairs, ) np.array, None}, optional
+            Capacity of the edges from head to tail (default: 0).
+        """
+        if rev_caps is None:
+            rev_caps = np.zeros(len(tails))
+        self._edges.append((edge_class,
+                            np.asarray(tails, dtype=np.int32),
+                            np.asarray(heads, dtype=np.int32),
+                            np.asarray(caps, dtype=float),
+                            np.asarray(rev_caps, dtype=float)))
+        self.num_pairs_per_class[edge_class] += len(tails)
+        # Concatenated lazily
+        self._arrays = None
+
+
+    def add_intra_task_edges(self, task_idx, network, lbd):
+        """ Connect nodes within the same task.
+
+        Parameters
+        ----------
+        task_idx: int
+            Index of the task.
+        network: Network
+            Task network (with num_nodes_each_network nodes).
+        lbd: float
+            Regularization parameter for connectivity.
+        """
+        self._intra_edges.append((task_idx, network, lbd))
+        self.num_pairs_per_class['intra'] += len(network.get_pairs()[0])
+        self._arrays = None
+
+
+    def add_cross_task_edges(self, coupling):
+        """ Connect corresponding nodes across tasks.
+
+        Parameters
+        ----------
+        coupling: (num_tasks, num_tasks) np.array
+            coupling[t1, t2] is the capacity of the edges going from
+            a node of task t1 to the corresponding node of task t2.
+            Tasks t1 and t2 are only connected if coupling[t1, t2]
+            or coupling[t2, t1] is not 0.
+        """
+        self._coupling = np.array(coupling, dtype=float)
+        self.num_pairs_per_class['cross'] += self.num_nodes_each_network * \
+                                             len(self._get_coupled_tasks()[0])
+        self._arrays = None
+
+
+    def _get_coupled_tasks(self):
+        """ Pairs of tasks (t1 < t2) connected by cross-task edges.
+
+        Returns
+        -------
+        tasks1, tasks2: np.arrays
+            Tasks t1 and t2 of each pair.
+        """
+        if self._coupling is None:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        return np.nonzero(np.triu((self._coupling != 0) | (self._coupling.T != 0), 1))
+
+
+    def add_terminal_edges(self, task_idx, terminal_caps):
+        """ Connect the nodes of a task to the source or the sink.
+
+        Parameters
+        ----------
+        task_idx: int
+            Index of the task.
+        terminal_caps: (num_nodes_each_network, ) np.array
+            Nodes with a non-negative value are connected to the source,
+            the others to the sink, with a capacity equal to the absolute value.
+        """
+        nodes = np.arange(self.num_nodes_each_network) + \
+                task_idx * self.num_nodes_each_network
+        self.terminal_caps[nodes] = terminal_caps
+        to_source = (terminal_caps >= 0)
+        self.add_edges('terminal',
+                       np.where(to_source, self.source, nodes),
+                       np.where(to_source, nodes, self.sink),
+                       np.abs(terminal_caps))
+
+
+    def rescale(self, intra_scale=None, terminal_shift=0.):
+        """ Copy the super-network, with other capacities of the intra-task
+        and terminal edges (e.g. for other values of lambda or eta).
+
+        The networks of the tasks and the coupling between tasks are shared
+        with the copy, so that it costs no more than setting terminal capacities.
+
+        Parameters
+        ----------
+        intra_scale: {float, None}, optional
+            Factor applied to the weights of the network of each task
+            (default: the same as in this super-network).
+        terminal_shift: {float, 0.}, optional
+            Added to the signed capacity of the terminal edge of each node
+            (see add_terminal_edges).
+
+        Returns
+        -------
+        network: SuperNetwork
+            Rescaled super-network.
+        """
+        network = copy.copy(self)
+        if intra_scale is not None:
+            network._intra_edges = [(task_idx, task_network, intra_scale) \
+                                    for (task_idx, task_network, scale) in self._intra_edges]
+        network._edges = [edges for edges in self._edges if edges[0] != 'terminal']
+        network._arrays = None
+        network.num_pairs_per_class = dict(self.num_pairs_per_class, terminal=0)
+        network.terminal_caps = np.zeros((self.num_nodes, ))
+        for task_idx in range(self.num_tasks):
+            nodes = np.arange(self.num_nodes_each_network) + \
+                    task_idx * self.num_nodes_each_network
+            network.add_terminal_edges(task_idx, self.terminal_caps[nodes] + terminal_shift)
+        return network
+
+
+    def get_arrays(self, edge_classes=None):
+        """ Get pairs of edges as arrays.
+
+        Parameters
+        ----------
+        edge_classes: {list of strings, None}, optional
+            Classes of the edges to get (default: all).
+
+        Returns
+        -------
+        tails: (num_pairs, ) np.array of np.int32
+            Tail of each pair of edges.
+        heads: (num_pairs, ) np.array of np.int32
+            Head of each pair of edges.
+        caps: (num_pairs, ) np.array
+            Capacity of the edges from tail to head.
+        rev_caps: (num_pairs, ) np.array
+            Capacity of the edges from head to tail.
+        """
+        if edge_classes is not None:
+            return self._concatenate([edges[1:] for edges in self._iter_edges() \
+                                      if edges[0] in edge_classes])
+        if self._arrays is None:
+            self._arrays = self._concatenate([edges[1:] for edges in self._iter_edges()])
+        return self._arrays
+
+
+    def get_shared_topology(self):
+        """ Get the super-network in implicit form, if all tasks share the same network.
+
+        Returns
+        -------
+        shared_topology: {tuple, None}
+            None if tasks have different networks, or if edges were added with
+            add_edges other than terminal ones. Otherwise:
+            network: Network
+                Network shared by all tasks.
+            task_scales: (num_tasks, ) np.array
+                Factor applied to the weights of the network in each task.
+            coupling: (num_tasks, num_tasks) np.array
+                Capacities of cross-task edges (see add_cross_task_edges).
+        """
+        if len(self._intra_edges) != self.num_tasks or \
+           any(edges[0] != 'terminal' for edges in self._edges):
+            return None
+        networks = dict((task_idx, network) for (task_idx, network, scale) in self._intra_edges)
+        if sorted(networks.keys()) != range(self.num_tasks) or \
+           any(network is not networks[0] for network in networks.values()):
+            return None
+        task_scales = np.zeros((self.num_tasks, ))
+        for (task_idx, network, scale) in self._intra_edges:
+            task_scales[task_idx] = scale
+        coupling = self._coupling
+        if coupling is None:
+            coupling = np.zeros((self.num_tasks, self.num_tasks))
+        return networks[0], task_scales, coupling
+
+
+    def get_components(self):
+        """ Find the connected components of the super-network, source and sink excluded.
+
+        Edges whose capacities are 0 in single precision (as in gt_maxflow)
+        in both directions are ignored.
+
+        Returns
+        -------
+        num_components: int
+            Number of connected components.
+        labels: (num_nodes - 2, ) np.array
+            Component of each node.
+        """
+        shared_components = self._get_shared_components()
+        if shared_components is not None:
+            # Components are products of a group of coupled tasks
+            # and of a component of the shared network
+            num_task_groups, task_labels, num_network_components, network_labels = \
+                shared_components
+            labels = (task_labels[:, None] * num_network_components + \
+                      network_labels[None, :]).ravel()
+            return num_task_groups * num_network_components, labels
+
+        tails, heads, caps, rev_caps = self.get_arrays(['intra', 'cross'])
+        keep = (caps.astype(np.float32) != 0) | (rev_caps.astype(np.float32) != 0)
+        num_nodes = self.num_nodes - 2
+        graph = sp.coo_matrix((np.ones(keep.sum()), (tails[keep], heads[keep])),
+                              shape=(num_nodes, num_nodes))
+        return csgraph.connected_components(graph, directed=False)
+
+
+    def _get_shared_components(self):
+        """ Connected components of the graph of tasks (coupled if the capacity of
+        their cross-task edges is not 0) and of the shared network, if any.
+
+        Returns None if tasks do not share the same network (see get_shared_topology),
+        or if only some of the tasks have intra-task edges.
+        """
+        shared_topology = self.get_shared_topology()
+        if shared_topology is None:
+            return None
+        network, task_scales, coupling = shared_topology
+        if np.all(task_scales != 0):
+            num_network_components, network_labels = \
+                csgraph.connected_components(network.adjacency, directed=False)
+        elif np.all(task_scales == 0):
+            num_network_components = self.num_nodes_each_network
+            network_labels = np.arange(self.num_nodes_each_network)
+        else:
+            return None
+        num_task_groups, task_labels = \
+            csgraph.connected_components(sp.csr_matrix(coupling.astype(np.float32) != 0),
+                                         directed=False)
+        return num_task_groups, task_labels, num_network_components, network_labels
+
+
+    def get_subnetwork(self, nodes):
+        """ Restrict the super-network to a set of nodes.
+
+        No edge of non-zero capacity may link these nodes to the other ones
+        (source and sink excepted), e.g. nodes is a union of connected components
+        (see get_components).
+
+        Parameters
+        ----------
+        nodes: (num_subnetwork_nodes, ) np.array
+            Indices of the nodes, in increasing order (source and sink excluded).
+
+        Returns
+        -------
+        subnetwork: SuperNetwork
+            Super-network in which node nodes[i] has index i
+            (the super-network itself if nodes are all its nodes).
+            If all tasks share the same network and nodes are the same nodes
+            of the shared network in a set of tasks, the tasks of the subnetwork
+            are these tasks, and they share the same network.
+        """
+        if len(nodes) == self.num_nodes - 2:
+            return self
+        shared_topology = self.get_shared_topology()
+        if shared_topology is not None:
+            tasks = np.unique(nodes // self.num_nodes_each_network)
+            network_nodes = np.unique(nodes % self.num_nodes_each_network)
+            if len(tasks) * len(network_nodes) == len(nodes):
+                network, task_scales, coupling = shared_topology
+                subnetwork = SuperNetwork(len(tasks), len(network_nodes))
+                shared_network = network.get_subnetwork(network_nodes)
+                for new_task_idx, task_idx in enumerate(tasks):
+                    subnetwork.add_intra_task_edges(new_task_idx, shared_network,
+                                                    task_scales[task_idx])
+                    subnetwork.add_terminal_edges(new_task_idx, self.terminal_caps[
+                        task_idx * self.num_nodes_each_network + network_nodes])
+                if self._coupling is not None:
+                    subnetwork.add_cross_task_edges(coupling[np.ix_(tasks, tasks)])
+                return subnetwork
+
+        subnetwork = SuperNetwork(1, len(nodes))
+        new_index = -np.ones((self.num_nodes, ), dtype=np.int32)
+        new_index[nodes] = np.arange(len(nodes))
+        for (edge_class, tails, heads, caps, rev_caps) in self._iter_edges():
+            if edge_class == 'terminal':
+                continue
+            keep = (new_index[tails] >= 0) & (new_index[heads] >= 0)
+            subnetwork.add_edges(edge_class, new_index[tails[keep]], new_index[heads[keep]],
+                                 caps[keep], rev_caps[keep])
+        subnetwork.add_terminal_edges(0, self.terminal_caps[nodes])
+        return subnetwork
+
+
+    def decompose(self, num_parts=1, min_part_size=0):
+        """ Split the minimum cut problem on the super-network into independent problems.
+
+        Connected components whose nodes are all linked to the source (or all
+        to the sink) are settled right away: cutting none of their edges,
+        all (resp. none) of their nodes are on the source side of the minimum cut.
+        The other components are grouped into at most num_parts subnetworks
+        of balanced sizes (see get_subnetwork).
+
+        Parameters
+        ----------
+        num_parts: {int, 1}, optional
+            Maximum number of subnetworks per group of coupled tasks.
+        min_part_size: {int, 0}, optional
+            Minimum number of nodes per subnetwork, when there are several.
+
+        Returns
+        -------
+        selected: (num_nodes - 2, ) np.array of booleans
+            Nodes on the source side of the minimum cut, for settled components.
+        parts: list of (nodes, subnetwork) tuples
+            Nodes of each subnetwork, in increasing order, and subnetwork.
+        """
+        num_components, labels = self.get_components()
+        sizes = np.bincount(labels, minlength=num_components)
+        # Number of nodes linked to the sink, in each component
+        num_to_sink = np.bincount(labels, minlength=num_components,
+                                  weights=(self.terminal_caps[:-2].astype(np.float32) < 0))
+        selected = (num_to_sink == 0)[labels]
+        to_solve = (num_to_sink > 0) & (num_to_sink < sizes)
+
+        shared_components = self._get_shared_components()
+        if shared_components is not None:
+            # Only group components of the same tasks, so that subnetworks
+            # keep sharing the same network
+            num_network_components = shared_components[2]
+            groups = [np.flatnonzero(to_solve[(group_idx * num_network_components):\
+                                              ((group_idx + 1) * num_network_components)]) + \
+                      group_idx * num_network_components \
+                      for group_idx in range(shared_components[0])]
+        else:
+            groups = [np.flatnonzero(to_solve)]
+
+        parts = []
+        for components in groups:
+            num_group_parts = min(num_parts, len(components))
+            if min_part_size:
+                num_group_parts = min(num_group_parts,
+                                      max(1, sizes[components].sum() / min_part_size))
+            for part_components in _balance(components, sizes[components], num_group_parts):
+                nodes = np.flatnonzero(np.in1d(labels, part_components))
+                parts.append((nodes, self.get_subnetwork(nodes)))
+        return selected, parts
+
+
+    def reduce(self, max_rounds=5):
+        """ Find nodes whose side of the minimum cut is known without solving it.
+
+        A node linked to the source with a capacity at least as large as
+        the total capacity of its edges to the other nodes is on the source side
+        of the (maximal) minimum cut. A node linked to the sink with a capacity
+        larger than the total capacity of the edges from the other nodes
+        is on the sink side. Once nodes are fixed, their edges to the other nodes
+        count as edges from the source or to the sink, which may fix more nodes:
+        the rules are applied again, for at most max_rounds rounds.
+
+        Parameters
+        ----------
+        max_rounds: {int, 5}, optional
+            Maximum number of rounds.
+
+        Returns
+        -------
+        fixed: (num_nodes - 2, ) np.array of np.int8
+            1 for nodes on the source side, 0 for nodes on the sink side,
+            -1 for the others (source and sink excluded).
+        """
+        num_nodes = self.num_nodes - 2
+        fixed = -np.ones((num_nodes, ), dtype=np.int8)
+        # Terminal capacities rounded to single precision, as in gt_maxflow
+        terminal_caps = self.terminal_caps[:-2].astype(np.float32).astype(float)
+        out_caps_of, in_caps_of = self._get_capacity_operators()
+        # Total capacity of the edges to and from the nodes that are not fixed
+        out_caps = out_caps_of(np.ones((num_nodes, )))
+        in_caps = in_caps_of(np.ones((num_nodes, )))
+
+        for round_idx in range(max_rounds):
+            free = (fixed < 0)
+            to_source = free & (terminal_caps >= out_caps)
+            to_sink = free & (- terminal_caps > in_caps)
+            if not (to_source.any() or to_sink.any()):
+                break
+            fixed[to_source] = 1
+            fixed[to_sink] = 0
+            if round_idx < max_rounds - 1:
+                # Edges from newly fixed nodes to the source side now come
+                # from the source, edges to the sink side now go to the sink
+                from_source = in_caps_of(to_source.astype(float))
+                to_sink_caps = out_caps_of(to_sink.astype(float))
+                in_caps -= from_source + in_caps_of(to_sink.astype(float))
+                out_caps -= to_sink_caps + out_caps_of(to_source.astype(float))
+                terminal_caps += from_source - to_sink_caps
+        return fixed
+
+
+    def contract(self, fixed):
+        """ Contract nodes whose side of the minimum cut is known into the source
+        and the sink.
+
+        Parameters
+        ----------
+        fixed: (num_nodes - 2, ) np.array
+            1 for nodes on the source side, 0 for nodes on the sink side,
+            -1 for the others (see reduce).
+
+        Returns
+        -------
+        core_nodes: np.array
+            Nodes that are not fixed, in increasing order.
+        core: SuperNetwork
+            Super-network (with a single task) in which node core_nodes[i] has index i.
+        constant: float
+            Cost of the edges cut by fixed nodes: the cost of a cut of the super-network
+            is the cost of the corresponding cut of the core plus constant.
+        """
+        num_nodes = self.num_nodes - 2
+        free = (fixed < 0)
+        on_source_side = (fixed == 1).astype(float)
+        on_sink_side = (fixed == 0).astype(float)
+        core_nodes = np.flatnonzero(free)
+        new_index = -np.ones((num_nodes, ), dtype=np.int32)
+        new_index[core_nodes] = np.arange(len(core_nodes))
+
+        out_caps_of, in_caps_of = self._get_capacity_operators()
+        terminal_caps = self.terminal_caps[:-2].astype(np.float32).astype(float)
+        to_source = np.maximum(terminal_caps, 0) + in_caps_of(on_source_side)
+        to_sink = np.maximum(- terminal_caps, 0) + out_caps_of(on_sink_side)
+        # Edges cut by fixed nodes
+        constant = np.dot(on_sink_side, np.maximum(terminal_caps, 0)) + \
+                   np.dot(on_source_side, to_sink)
+        # A node linked to both the source and the sink is linked to one of them only,
+        # with the difference of both capacities
+        constant += np.minimum(to_source, to_sink)[free].sum()
+
+        core = SuperNetwork(1, len(core_nodes))
+        for (edge_class, tails, heads, caps, rev_caps) in self._iter_edges():
+            if edge_class == 'terminal':
+                continue
+            keep = free[tails] & free[heads]
+            core.add_edges(edge_class, new_index[tails[keep]], new_index[heads[keep]],
+                           caps[keep], rev_caps[keep])
+        core.add_terminal_edges(0, (to_source - to_sink)[free])
+        return core_nodes, core, constant
+
+
+    def _get_capacity_operators(self):
+        """ Functions computing, for a vector x of values on the nodes of the
+        super-network (source and sink excluded), the vector of
+        the sums over all edges u -> v (terminal ones excluded)
+        of capacity(u -> v) * x[v] (for each node u),
+        and of capacity(v -> u) * x[v] (for each node u).
+        """
+        num_nodes = self.num_nodes - 2
+        shared_topology = self.get_shared_topology()
+        if shared_topology is not None:
+            # Without expanding the super-network
+            network, task_scales, coupling = shared_topology
+            adjacency = network.adjacency
+            adjacency_t = adjacency.transpose().tocsr()
+            coupling = np.where(np.eye(self.num_tasks, dtype=bool), 0, coupling)
+            shape = (self.num_tasks, self.num_nodes_each_network)
+            def out_caps_of(x):
+                x = x.reshape(shape)
+                return (task_scales[:, None] * adjacency.dot(x.T).T + \
+                        np.dot(coupling, x)).ravel()
+            def in_caps_of(x):
+                x = x.reshape(shape)
+                return (task_scales[:, None] * adjacency_t.dot(x.T).T + \
+                        np.dot(coupling.T, x)).ravel()
+            return out_caps_of, in_caps_of
+
+        tails, heads, caps, rev_caps = self.get_arrays(['intra', 'cross'])
+        adjacency = sp.csr_matrix((np.concatenate((caps, rev_caps)),
+                                   (np.concatenate((tails, heads)),
+                                    np.concatenate((heads, tails)))),
+                                  shape=(num_nodes, num_nodes))
+        adjacency_t = adjacency.transpose().tocsr()
+        return adjacency.dot, adjacency_t.dot
+
+
+    def _iter_edges(self):
+        """ Iterate over the (edge_class, tails, heads, caps, rev_caps) arrays
+        of the super-network, expanding intra-task and cross-task edges.
+        """
+        for (task_idx, network, scale) in self._intra_edges:
+            tails, heads, caps, rev_caps = network.get_pairs()
+            offset = task_idx * self.num_nodes_each_network
+            yield ('intra', (tails + offset).astype(np.int32),
+                   (heads + offset).astype(np.int32), caps * scale, rev_caps * scale)
+
+        nodes = np.arange(self.num_nodes_each_network, dtype=np.int32)
+        for task_idx1, task_idx2 in zip(*self._get_coupled_tasks()):
+            yield ('cross',
+                   nodes + task_idx1 * self.num_nodes_each_network,
+                   nodes + task_idx2 * self.num_nodes_each_network,
+                   np.repeat(self._coupling[task_idx1, task_idx2],
+                             self.num_nodes_each_network),
+                   np.repeat(self._coupling[task_idx2, task_idx1],
+                             self.num_nodes_each_network))
+
+        for edges in self._edges:
+            yield edges
+
+
+    def _concatenate(self, edges_list):
+        """ Concatenate a list of (tails, heads, caps, rev_caps) arrays.
+        """
+        if edges_list:
+            return tuple(np.concatenate(x) for x in zip(*edges_list))
+        return (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32),
+                np.zeros(0), np.zeros(0))
+
+
+    def to_dimacs(self):
+        """ Create the dimacs description of the super-network.
+
+        Reverse edges are listed right after the corresponding edge,
+        so that gt_maxflow's parser stores them as a single pair.
+
+        Returns
+        -------
+        dimacs_graph: string
+            Dimacs description of the super-network.
+        """
+        tails, heads, caps, rev_caps = self.get_arrays()
+
+        # Interleave edges and their (non-zero) reverse edges
+        arc_tails = np.column_stack((tails, heads)).ravel()
+        arc_heads = np.column_stack((heads, tails)).ravel()
+        arc_caps = np.column_stack((caps, rev_caps)).ravel()
+        keep = np.ones(arc_caps.shape, dtype=bool)
+        keep[1::2] = (rev_caps != 0)
+
+        # Node indices start at 1 in dimacs format
+        arcs_str = ["a %d %d %f\n" % arc for arc in \
+                    zip(arc_tails[keep] + 1, arc_heads[keep] + 1, arc_caps[keep])]
+
+        dimacs_graph = "p max %d %d\n" % (self.num_nodes, len(arcs_str))
+        dimacs_graph += "n %d s\n" % (self.source + 1)
+        dimacs_graph += "n %d t\n" % (self.sink + 1)
+        return dimacs_graph + "".join(arcs_str)
+
+
+def _balance(items, sizes, num_bins):
+    """ Split items into num_bins lists of balanced total sizes
+    (largest items first, each one in the least filled list).
+    Empty lists are dropped.
+    """
+    bins = [[] for bin_idx in range(num_bins)]
+    bin_sizes = np.zeros((num_bins, ))
+    for item_idx in np.argsort(-sizes, kind='mergesort'):
+        bin_idx = np.argmin(bin_sizes)
+        bins[bin_idx].append(items[item_idx])
+        bin_sizes[bin_idx] += sizes[item_idx]
+    return [b for b in bins if b]
@@ -1,16 +1,28 @@
 # -*- coding: utf-8 -*-
 """synthetic_data_experiments.py -- Run validation experiments on synthetic data
 
-In this version all experiments are run sequentially.
+By default all experiments are run sequentially, except for the solves of
+the hyperparameters grid search, which can use several processes (--num_workers).
+With --num_jobs, repeats and folds are run on a pool of processes instead.
 """
 
 DEBUG_MODE = False
 TIME_EXP = False
 DATA_GEN = True # have to gene dat or not ?
 SEQ_MODE = True
+IN_PROCESS = True # solve subsample problems within the current process
+PATH_MODE = False # with IN_PROCESS, solve the etas of each (lambda, mu) together
+                  # (on one super-network, or by their path if it takes fewer solves)
+BATCH_MODE = True # without IN_PROCESS, solve the problems of a subsample in one process
+HALVING_MODE = False # drop clearly unstable hyperparameters early (successive halving)
+SEARCH_BUDGET = None # if set, number of solves per algorithm of an adaptive search
+                     # within the range of the NUM_VALUES grid, instead of the grid search
 
 NUM_VALUES=3 #range param
 
+SCORING_MAX_MEMORY = 2**28 # memory used to score a block of features, in bytes
+SCORING_DTYPE = 'float64' # or 'float32', to halve the memory used for scoring
+
 
 tmp_dir= "/tmp"
 #tmp_dir = "/share/data40T/athenais/tmp"
@@ -23,12 +35,12 @@ import multitask_sfan
 import evaluation_framework as ef
 import generate_data
 import plot
+import score
 
 import argparse
 import logging
 import os
 import numpy as np
-import scipy.stats as st
 import subprocess
 import sys
 import tables as tb
@@ -36,7 +48,9 @@ import tempfile
 import shutil
 import shlex
 import glob
+import multiprocessing
 import random
+import traceback
 
 def get_arguments_values(): 
     """ Use argparse module to get arguments values.
@@ -65,6 +79,21 @@ def get_arguments_values():
     parser.add_argument("data_dir", help="Simulated data directory")
     parser.add_argument("resu_dir", help="Results directory")
     parser.add_argument("simu_id", help="Simulation name")
+    parser.add_argument("-j", "--num_workers",
+                        help="Number of processes for the grid search (default: 1)",
+                        type=int, default=1)
+    parser.add_argument("-J", "--num_jobs",
+                        help="Number of repeats / folds run at the same time " + \
+                        "on this machine (default: 1)", type=int, default=1)
+    parser.add_argument("--resume",
+                        help="Resume an interrupted run with the same arguments, " + \
+                        "instead of deleting the results directory", action='store_true')
+    parser.add_argument("--cache_dir",
+                        help="Directory of the cache of solver results, kept across runs " + \
+                        "(default: no cache)")
+    parser.add_argument("--cache_size",
+                        help="Maximum size of the cache of solver results, in MB " + \
+                        "(default: no limit)", type=float)
     parser.add_argument("-v", "--verbose", help="Turn on detailed info log",
                         action='store_true')
     return parser.parse_args()
@@ -126,6 +155,34 @@ def check_arguments_integrity(args):
         logging.error("Use --help for help.\n")
         sys.exit(-1)
 
+    try:
+        assert(args.num_workers > 0)
+    except AssertionError:
+        logging.error("The number of workers must be strictly positive\n")
+        logging.error("Use --help for help.\n")
+        sys.exit(-1)
+
+    try:
+        assert(args.num_jobs > 0)
+    except AssertionError:
+        logging.error("The number of jobs must be strictly positive\n")
+        logging.error("Use --help for help.\n")
+        sys.exit(-1)
+
+    try:
+        assert(not args.resume or SEQ_MODE)
+    except AssertionError:
+        logging.error("Only local runs (SEQ_MODE) can be resumed\n")
+        logging.error("Use --help for help.\n")
+        sys.exit(-1)
+
+    try:
+        assert(args.num_jobs == 1 or SEQ_MODE)
+    except AssertionError:
+        logging.error("Several jobs can only be run locally (SEQ_MODE)\n")
+        logging.error("Use --help for help.\n")
+        sys.exit(-1)
+
     # Verbose
     if args.verbose:
         logging.basicConfig(format="[%(levelname)s] %(message)s",
@@ -167,8 +224,8 @@ def create_dir_if_not_exists(dir_name):
             if not os.path.isdir(dir_name):
                 raise
 
-def get_analysis_files_names(resu_dir, simu_id): 
-    """ Give analysis files names. 
+def get_results_store(resu_dir, simu_id, num_features):
+    """ Give the store of the results of all repeats (see ef.ResultsStore).
 
     Parameters
     ----------
@@ -176,73 +233,58 @@ def get_analysis_files_names(resu_dir, simu_id):
         Path of the directory in which to save the results.
     simu_id: string
         Name of the simulation, to be used to name files.
+    num_features: int
+        Number of features.
 
     Returns
     -------
-    analysis_files : dictionary
-        analysis_files[<measure abbreviation>_<algo>] = filename
+    store : ef.ResultsStore
+        Store saved in <resu_dir>/<simu_id>.results.h5
     """
-    # - to hold accuracy values  
-    acc_st_fname = '%s/%s.sfan.acc' % (resu_dir, simu_id) 
-    acc_np_fname = '%s/%s.msfan_np.acc' % (resu_dir, simu_id) 
-    acc_fname = '%s/%s.msfan.acc' % (resu_dir, simu_id)    
-    # - to hold mcc values
-    mcc_st_fname = '%s/%s.sfan.mcc' % (resu_dir, simu_id) 
-    mcc_np_fname = '%s/%s.msfan_np.mcc' % (resu_dir, simu_id) 
-    mcc_fname = '%s/%s.msfan.mcc' % (resu_dir, simu_id)    
-    # - to hold PPV values
-    ppv_st_fname = '%s/%s.sfan.ppv' % (resu_dir, simu_id)
-    ppv_np_fname = '%s/%s.msfan_np.ppv' % (resu_dir, simu_id)
-    ppv_fname = '%s/%s.msfan.ppv' % (resu_dir, simu_id)
-    # - to hold sensitivity = TPR values
-    tpr_st_fname = '%s/%s.sfan.tpr' % (resu_dir, simu_id)    
-    tpr_np_fname = '%s/%s.msfan_np.tpr' % (resu_dir, simu_id)
-    tpr_fname = '%s/%s.msfan.tpr' % (resu_dir, simu_id)
-    # - to hold consistency values
-    ci_st_fname = '%s/%s.sfan.consistency' % (resu_dir, simu_id)
-    ci_np_fname = '%s/%s.msfan_np.consistency' % (resu_dir, simu_id)
-    ci_fname = '%s/%s.msfan.consistency' % (resu_dir, simu_id)
-    # - to hold RMSE values
-    rmse_st_fname = '%s/%s.sfan.rmse' % (resu_dir, simu_id)
-    rmse_np_fname = '%s/%s.msfan_np.rmse' % (resu_dir, simu_id)
-    rmse_fname = '%s/%s.msfan.rmse' % (resu_dir, simu_id)
-    # - to hold timing values
-    timing_st_fname = '%s/%s.sfan.timing' % (resu_dir, simu_id)
-    timing_np_fname = '%s/%s.msfan_np.timing' % (resu_dir, simu_id)
-    timing_fname = '%s/%s.msfan.timing' % (resu_dir, simu_id)
-    # - to hold maxRSS values 
-    maxRSS_st_fname = '%s/%s.sfan.maxRSS' % (resu_dir, simu_id)
-    maxRSS_np_fname = '%s/%s.msfan_np.maxRSS' % (resu_dir, simu_id)
-    maxRSS_fname = '%s/%s.msfan.maxRSS' % (resu_dir, simu_id)
-    
-    analysis_files = {
-        'acc_st':acc_st_fname, 
-        'acc_msfan_np': acc_np_fname, 
-        'acc_msfan': acc_fname, 
-        'mcc_st': mcc_st_fname, 
-        'mcc_msfan_np': mcc_np_fname, 
-        'mcc_msfan': mcc_fname, 
-        'ppv_st':ppv_st_fname,
-        'ppv_msfan_np':ppv_np_fname,
-        'ppv_msfan':ppv_fname,
-        'tpr_st':tpr_st_fname,
-        'tpr_msfan_np':tpr_np_fname,
-        'tpr_msfan':tpr_fname,
-        'ci_st':ci_st_fname ,
-        'ci_msfan_np':ci_np_fname ,
-        'ci_msfan':ci_fname, 
-        'rmse_st':rmse_st_fname ,
-        'rmse_msfan_np':rmse_np_fname ,
-        'rmse_msfan':rmse_fname,
-        'timing_st':timing_st_fname,
-        'timing_msfan_np':timing_np_fname,
-        'timing_msfan':timing_fname,
-        'maxRSS_st':maxRSS_st_fname,
-        'maxRSS_msfan_np':maxRSS_np_fname,
-        'maxRSS_msfan':maxRSS_fname
-    }
-
-    return analysis_files
+    return ef.ResultsStore('%s/%s.results.h5' % (resu_dir, simu_id), num_features)
+
+def save_search_results(store, repeat_idx, fold_idx, algo, selected_dict, runtimes_dict):
+    """ Save the selections and runtimes of the hyperparameters search of an algorithm
+    on the subsamples of a fold, in the results store.
+
+    Parameters
+    ----------
+    store : ef.ResultsStore
+        Results store.
+    repeat_idx, fold_idx : int
+        Indices of the current repeat and fold.
+    algo : string
+        Algorithm.
+    selected_dict : dictionary
+        [params][task_idx] = packed selections, one row per subsample
+        (selected_dict[algo] as returned by ef.run_grid_search).
+    runtimes_dict : dictionary
+        [params] = list of records (see multitask_sfan.Instrumentation), one per subsample
+        (runtimes_dict[algo] as returned by ef.run_grid_search).
+    """
+    # Rows of a previous, interrupted run
+    condition = '(repeat == %d) & (fold == %d) & (algo == "%s") & (subsample >= 0)' % \
+                (repeat_idx, fold_idx, algo)
+    store.remove('selections', condition)
+    store.remove('runtimes', condition)
+
+    params_list = sorted(runtimes_dict)
+    if not params_list:
+        return
+    store.append_runtimes(repeat_idx, fold_idx, algo,
+                          [(ss_idx, params, records) for params in params_list \
+                           for (ss_idx, records) in enumerate(runtimes_dict[params])])
+    keys = [(params, task_idx) for params in params_list \
+            for task_idx in sorted(selected_dict[params])]
+    store.append('selections', repeat=repeat_idx, fold=fold_idx, algo=algo,
+                 subsample=[ss_idx for (params, task_idx) in keys \
+                            for ss_idx in xrange(len(selected_dict[params][task_idx]))],
+                 params=[params for (params, task_idx) in keys \
+                         for selections in selected_dict[params][task_idx]],
+                 task=[task_idx for (params, task_idx) in keys \
+                       for selections in selected_dict[params][task_idx]],
+                 features=np.vstack([selected_dict[params][task_idx] \
+                                     for (params, task_idx) in keys]))
 
 def determine_hyperparamaters(args, genotype_fname, phenotype_fnames, network_fname, covariance_fname = None, precision_fname=None):
     """ Determine hyperparameters. 
@@ -281,32 +323,29 @@ def determine_hyperparamaters(args, genotype_fname, phenotype_fnames, network_fn
     # Randomly sample 50% of the data
     tmp_scores_f_list = []
     with tb.open_file(genotype_fname, 'r') as h5f:
-        Xtr = h5f.root.Xtr[:, :]
-
         # Define subsample of 50% of the data
         sample_indices = range(args.num_samples)
         np.random.shuffle(sample_indices)
         sample_indices = sample_indices[:(args.num_samples/2)]
-        Xtr = Xtr[:, sample_indices]
 
-        # Compute scores for the subsample
-        for task_idx in range(args.num_tasks):
-            # Read phenotype
-            y = np.loadtxt(phenotype_fnames[task_idx])[sample_indices]
-
-            # Compute feature-phenotype correlations
-            r2 = [st.pearsonr(Xtr[feat_idx, :].transpose(), y)[0]**2 \
-                  for feat_idx in range(args.num_features)]
+        # Read phenotypes
+        Y = np.array([np.loadtxt(phenotype_fnames[task_idx])[sample_indices] \
+                      for task_idx in range(args.num_tasks)]).transpose()
 
-            # Create temporary file of name tmp_fname 
+        # Create temporary files
+        tmp_scores_files = []
+        for task_idx in range(args.num_tasks):
             fd, tmp_fname = tempfile.mkstemp()
-
-            # Save to temporary file
-            np.savetxt(tmp_fname, r2, fmt='%.3e')
-
-            # Append temporary file to list
+            tmp_scores_files.append(os.fdopen(fd, 'w'))
             tmp_scores_f_list.append(tmp_fname)
 
+        # Compute scores for the subsample, for all tasks at once,
+        # by blocks of features (the genotypes may not fit in memory)
+        score.save_r2(h5f.root.Xtr, Y, tmp_scores_files, sample_indices=sample_indices,
+                      max_memory=SCORING_MAX_MEMORY, dtype=SCORING_DTYPE)
+        for f in tmp_scores_files:
+            f.close()
+
     # Compute grid (WARNING: STILL NOT WORKING WELL)
     sfan_ = multitask_sfan.Sfan(args.num_tasks, [network_fname],
                                 tmp_scores_f_list, 1, 1, 1,
@@ -330,7 +369,7 @@ def determine_hyperparamaters(args, genotype_fname, phenotype_fnames, network_fn
     return lbd_eta_values, lbd_eta_mu_values_np, lbd_eta_mu_values
 
 
-def get_tmp_weights_fnames(args, genotype_fname, phenotype_fnames, ssIndices): 
+def get_tmp_weights_fnames(args, genotype_fname, phenotype_fnames, ssIndices, trIndices=None): 
     """
     Parameters
     ----------
@@ -343,6 +382,11 @@ def get_tmp_weights_fnames(args, genotype_fname, phenotype_fnames, ssIndices):
         Path to phenotype data.
     ssIndices: list of list of int
         [subsample_idx] = list of subsample indices for the current fold_idx
+    trIndices: {list of int, None}, optional
+        Train indices of the current fold_idx, of which the subsamples are subsets.
+        If given, the scores of all subsamples are computed in a single pass
+        over the genotypes, from statistics of the train set
+        (see score.iter_subsample_r2_blocks).
     
     Returns
     -------
@@ -350,34 +394,88 @@ def get_tmp_weights_fnames(args, genotype_fname, phenotype_fnames, ssIndices):
         [subsample_idx][task_idx] = tmp filename
     """
     tmp_weights_fnames = []
+    tmp_weights_files = []
+    # Read phenotypes, (num_samples, num_tasks)
+    Y = np.array([np.loadtxt(phenotype_fnames[task_idx]) \
+                  for task_idx in xrange(args.num_tasks)]).transpose()
     for ss_idx in xrange(args.num_subsamples):
-        # Get samples
-        sample_indices = ssIndices[ss_idx]
         # Generate sample-specific network scores from phenotypes and genotypes
         tmp_weights_f_list = [] # to hold temp files storing these scores
-        with tb.open_file(genotype_fname, 'r') as h5f:
-            Xtr = h5f.root.Xtr[:, sample_indices]
-            for task_idx in xrange(args.num_tasks):
-                # Read phenotype
-                y = np.loadtxt(phenotype_fnames[task_idx])[sample_indices]
-
-                # Compute feature-phenotype correlations
-                r2 = [st.pearsonr(Xtr[feat_idx, :].transpose(), y)[0]**2 \
-                      for feat_idx in xrange(args.num_features)]
-
-                # Save to temporary file tmp_weights_f_list[task_idx]
-                # Create temporary file of name tmp_fname (use tempfile)
-                fd, tmp_fname = tempfile.mkstemp(dir = tmp_dir) #TODO : use arg.tmpdir / change TMP TMPDIR TEMP
-                # /!\ tmp_fname is open, fd is the file object
-                #-> close it to avoid 'Too many open files' error
-                os.close(fd)
-                # Save to temporary file
-                np.savetxt(tmp_fname, r2, fmt='%.3e')
-                # Append temporary file to list
-                tmp_weights_f_list.append(tmp_fname)
+        tmp_weights_files.append([])
+        for task_idx in xrange(args.num_tasks):
+            # Create temporary file of name tmp_fname (use tempfile)
+            fd, tmp_fname = tempfile.mkstemp(dir = tmp_dir) #TODO : use arg.tmpdir / change TMP TMPDIR TEMP
+            tmp_weights_files[ss_idx].append(os.fdopen(fd, 'w'))
+            # Append temporary file to list
+            tmp_weights_f_list.append(tmp_fname)
         tmp_weights_fnames.append(tmp_weights_f_list)
+
+        if trIndices is None:
+            # Get samples
+            sample_indices = ssIndices[ss_idx]
+            with tb.open_file(genotype_fname, 'r') as h5f:
+                # Compute feature-phenotype correlations, for all tasks at once,
+                # by blocks of features (the genotypes may not fit in memory),
+                # and save them to the temporary files tmp_weights_f_list
+                score.save_r2(h5f.root.Xtr, Y[sample_indices, :], tmp_weights_files[ss_idx],
+                              sample_indices=sample_indices,
+                              max_memory=SCORING_MAX_MEMORY, dtype=SCORING_DTYPE)
+            # Close the files, to avoid 'Too many open files' error
+            for f in tmp_weights_files[ss_idx]:
+                f.close()
+
+    if trIndices is not None:
+        # Compute feature-phenotype correlations for all subsamples at once
+        with tb.open_file(genotype_fname, 'r') as h5f:
+            for start, scores_list in score.iter_subsample_r2_blocks(
+                    h5f.root.Xtr, Y, trIndices, ssIndices[:args.num_subsamples],
+                    max_memory=SCORING_MAX_MEMORY):
+                for ss_idx, scores in enumerate(scores_list):
+                    for task_idx, f in enumerate(tmp_weights_files[ss_idx]):
+                        np.savetxt(f, scores[:, task_idx], fmt='%.3e')
+        for f_list in tmp_weights_files:
+            for f in f_list:
+                f.close()
     return tmp_weights_fnames
 
+def get_subsample_weights(args, genotype_fname, phenotype_fnames, ssIndices, trIndices):
+    """ Compute the node weights of each subsample and task in memory,
+    instead of saving them to temporary files (see get_tmp_weights_fnames).
+    The weights are only usable when solving within the current process (IN_PROCESS).
+
+    Parameters
+    ----------
+    args : Namespace object
+        Its attributes are arguments names 
+        and contain arguments values (str or int according to code specifications).
+    genotype_fname: filename
+        Path to genotype data.
+    phenotype_fname: filename
+        Path to phenotype data.
+    ssIndices: list of list of int
+        [subsample_idx] = list of subsample indices for the current fold_idx
+    trIndices: list of int
+        Train indices of the current fold_idx, of which the subsamples are subsets.
+
+    Returns
+    -------
+    weights_list : list of list of arrays
+        [subsample_idx][task_idx] = (num_features, ) array of node weights
+    """
+    # Read phenotypes, (num_samples, num_tasks)
+    Y = np.array([np.loadtxt(phenotype_fnames[task_idx]) \
+                  for task_idx in xrange(args.num_tasks)]).transpose()
+    with tb.open_file(genotype_fname, 'r') as h5f:
+        num_features = h5f.root.Xtr.shape[0]
+        weights = np.zeros((args.num_subsamples, args.num_tasks, num_features))
+        # Compute feature-phenotype correlations for all subsamples at once
+        for start, scores_list in score.iter_subsample_r2_blocks(
+                h5f.root.Xtr, Y, trIndices, ssIndices[:args.num_subsamples],
+                max_memory=SCORING_MAX_MEMORY):
+            for ss_idx, scores in enumerate(scores_list):
+                weights[ss_idx, :, start:start + scores.shape[0]] = scores.T
+    return [list(weights[ss_idx]) for ss_idx in xrange(args.num_subsamples)]
+
 def save_tmp_weights_fnames (resu_dir, simu_id, fold_idx, tmp_weights_fnames) :
     """ Save temporary filenames in a filename
 
@@ -428,6 +526,78 @@ def fetch_tmp_weights_fnames(resu_dir, simu_id, fold_idx) :
         tmp_weights_fnames = [line.split() for line in f.readlines()]
     return tmp_weights_fnames
 
+class Manifest(object):
+    """ Record of the units of work of an experiment that are done,
+    so that an interrupted experiment can be resumed (see --resume).
+
+    A unit is identified by (repeat_idx, fold_idx, algo, stage), where stage is
+        'setup' (data generation, folds and grids of hyperparameters of a repeat,
+                 fold_idx and algo being None),
+        'parameters' (optimal parameters of algo on a fold)
+        or 'selected_features' (features selected by algo on the training set of a fold).
+    Each unit is marked as done, once its files are saved, by appending a line
+        <repeat_idx> <fold_idx> <algo> <stage>
+    to the manifest file, with a single write, so that several processes
+    can mark units at the same time, and an interrupted write is ignored.
+
+    Attributes
+    ----------
+    self.fname: filename
+        Path to the manifest file.
+    self.done: set of tuples
+        Units done, as tuples of strings ('-' for None).
+    """
+    def __init__(self, fname):
+        """
+        Parameters
+        ----------
+        fname: filename
+            Path to the manifest file (read if it exists).
+        """
+        self.fname = fname
+        self.done = set()
+        if os.path.exists(fname):
+            with open(fname, 'r') as f:
+                for line in f:
+                    # Only complete lines were fully written
+                    if line.endswith('\n') and len(line.split()) == 4:
+                        self.done.add(tuple(line.split()))
+
+
+    def is_done(self, repeat_idx, fold_idx, algo, stage):
+        """ Whether the unit was marked as done. """
+        return self._get_unit(repeat_idx, fold_idx, algo, stage) in self.done
+
+
+    def mark_done(self, repeat_idx, fold_idx, algo, stage):
+        """ Mark the unit as done, in the manifest file. """
+        unit = self._get_unit(repeat_idx, fold_idx, algo, stage)
+        fd = os.open(self.fname, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+        try:
+            os.write(fd, '%s\n' % ' '.join(unit))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self.done.add(unit)
+
+
+    def _get_unit(self, repeat_idx, fold_idx, algo, stage):
+        return tuple('-' if x is None else str(x) for x in (repeat_idx, fold_idx, algo, stage))
+
+
+def read_fold_parameters(resu_dir, simu_id, fold_idx, algo):
+    """ Read the optimal parameters of algo saved by run_fold.
+
+    Returns
+    -------
+    opt_params: string
+        Hyperparameters, in the '-l <lambda> -e <eta> -m <mu>' format.
+    """
+    fname = '%s/%s.%s.fold_%d.parameters' % (resu_dir, simu_id, algo, fold_idx)
+    # use rstrip in case there is \n
+    with open(fname, 'r') as f:
+        return f.read().rstrip()
+
 def run_fold(   fold_idx, 
                 args, 
                 lbd_eta_values, lbd_eta_mu_values_np, lbd_eta_mu_values, 
@@ -435,7 +605,7 @@ def run_fold(   fold_idx,
                 genotype_fname, network_fname , 
                 tmp_weights_fnames, 
                 covariance_fname, causal_fname, phenotype_fnames, scores_fnames, 
-                resu_dir
+                resu_dir, repeat_idx, manifest=None
             ):
     """ Run the fold n° <fold_idx> of a repeat
 
@@ -467,8 +637,9 @@ def run_fold(   fold_idx,
     network_fname  : filename
         Path to the network file.
 
-    tmp_weights_fnames : list of list of strings
-        [subsample_idx][task_idx] = tmp filename
+    tmp_weights_fnames : list of list of {strings, arrays}
+        [subsample_idx][task_idx] = tmp filename,
+        or node weights (see get_subsample_weights)
 
     covariance_fname : filename
         Path to the covariance matrix file.
@@ -483,13 +654,24 @@ def run_fold(   fold_idx,
         Path to the observed scores file.
     resu_dir : dirname
         Path to the <args.resu_dir>/repeat_<repeat_idx> directory.
+    repeat_idx : int
+        Index of the current repeat.
+    manifest : {Manifest, None}, optional
+        If given, the algorithms of which the optimal parameters, resp. the
+        selected features, were already saved are skipped,
+        and each of these units of work is marked as done once its files are saved.
 
     Side effect 
     -----------
     If SEQ_MODE = False, launch qsub job arrays.
 
     """
-    analysis_files = get_analysis_files_names(args.resu_dir, args.simu_id)
+    store = get_results_store(args.resu_dir, args.simu_id, args.num_features)
+
+    # Algorithms of which the optimal parameters were saved by a previous run
+    algos_done = [algo for algo in ef.GRID_SEARCH_ALGOS \
+                  if manifest is not None and \
+                  manifest.is_done(repeat_idx, fold_idx, algo, 'parameters')]
 
     # If real TIME_EXP (no DEBUG_MODE) : 
     #   Do not search for opt_param but take those found before
@@ -514,120 +696,85 @@ def run_fold(   fold_idx,
         logging.info ("======== Feature selection :")
         #XXX DEBUG ???
 
-        # Inititalize dictionary to store selected features
+        # Select features for each algorithm, hyperparameters and subsample,
+        # on a pool of args.num_workers processes.
         # sf_dict is a nested dictionary, indexed by
         #   - value of the parameters
         #   - value of task_idx
         #   - subsample idx
-        # sf is a list of lists of selected features
-        # (one per subsample iteration)
+        # sf is a (num_subsamples, ceil(num_features / 8)) packed boolean matrix
+        # of selected features (one row per subsample iteration, see ef.pack_selections)
         # you get a specific sf from sf_dict by querying
         # sf_dict[params][task_idx]
-        sf_st_dict = {}       # single task
-        sf_np_dict = {}       # not using precision matrix
-        sf_dict = {}          # using precision matrix
-        for params in lbd_eta_values:
-            sf_st_dict[params] = {}
-            for task_idx in range(args.num_tasks):
-                sf_st_dict[params][task_idx] = []
-        for params in lbd_eta_mu_values_np:
-            sf_np_dict[params] = {}
-            for task_idx in range(args.num_tasks):
-                sf_np_dict[params][task_idx] = []
-        for params in lbd_eta_mu_values:
-            sf_dict[params] = {}
-            for task_idx in range(args.num_tasks):
-                sf_dict[params][task_idx] = []
-
-        #process_time files template : 
-        process_time_file_template = resu_dir+'/'+args.simu_id+'.%s.fold_'+str(fold_idx)+'.ss.processTime'
-        #max RSS files template : 
-        max_RSS_file_template = resu_dir+'/'+args.simu_id+'.%s.fold_'+str(fold_idx)+'.ss.maxRSS'
-
-        for ss_idx in range(args.num_subsamples):
-            logging.info ("========                        SS : %d" % ss_idx)
-
-            # Used to get_tms_weight_f_list
-            tmp_weights_f_list = tmp_weights_fnames[ss_idx]
-        
-            for params in lbd_eta_values:
-                logging.info("========                        lbd_eta_values : "+ `params`)
-                # Select features with single-task sfan
-                logging.info("                                   run_sfan")
-                sel_, timing, max_RSS = ef.run_sfan(args.num_tasks, network_fname,
-                                   tmp_weights_f_list, params)
-                if not sel_ : import pdb; pdb.set_trace() #DEBUG
-                # Store selected features in the dictionary
-                for task_idx, sel_list in enumerate(sel_):
-                    sf_st_dict[params][task_idx].append(sel_list)
-                #Store process time
-                process_time = timing.split()[-1]
-                fname= process_time_file_template % 'sfan'
-                with open(fname, 'a') as f:
-                    f.write("%s\n" % process_time)
-                #Store max RSS : 
-                fname= max_RSS_file_template % 'sfan'
-                with open(fname, 'a') as f:
-                    f.write("%s\n" % max_RSS)
-            
-            for params in lbd_eta_mu_values_np:
-                logging.info("========                        lbd_eta_mu_values_np"+ `params`)
-                # Select features with multi-task (no precision) sfan
-                logging.info("                                   run_msfan_nocorr")
-                sel_ , timing, max_RSS = ef.run_msfan_nocorr(args.num_tasks, network_fname,
-                                           tmp_weights_f_list, params)
-                if not sel_ : import pdb; pdb.set_trace()#DEBUG
-                # Store selected features in the dictionary
-                for task_idx, sel_list in enumerate(sel_):
-                    sf_np_dict[params][task_idx].append(sel_list)
-                #Store process time
-                process_time = timing.split()[-1]
-                fname= process_time_file_template % 'msfan_np'
-                with open(fname, 'a') as f:
-                    f.write("%s\n" % process_time)
-                #Store max RSS : 
-                fname= max_RSS_file_template %  'msfan_np'
-                with open(fname, 'a') as f:
-                    f.write("%s\n" % max_RSS)
-
-            for params in lbd_eta_mu_values:
-                logging.info("========                        lbd_eta_mu_values"+ `params`)
-                # Select features with multi-task sfan
-                logging.info("                                   run_msfan")
-                sel_, timing, max_RSS = ef.run_msfan(args.num_tasks, network_fname,
-                                    tmp_weights_f_list, covariance_fname,
-                                    params)
-                if not sel_ : import pdb; pdb.set_trace() #DEBUG                                      
-                # Store selected features in the dictionary
-                for task_idx, sel_list in enumerate(sel_):
-                    sf_dict[params][task_idx].append(sel_list)
-                #Store process time
-                process_time = timing.split()[-1]
-                fname= process_time_file_template % 'msfan'
-                with open(fname, 'a') as f:
-                    f.write("%s\n" % process_time)
-                #Store max RSS : 
-                fname= max_RSS_file_template % 'msfan'
-                with open(fname, 'a') as f:
-                    f.write("%s\n" % max_RSS)
-
-
-          
-            # Delete the temporary files stored in tmp_weights_f_list
+        logging.info("========                        grid search on %d subsamples, %d workers" % \
+                     (args.num_subsamples, args.num_workers))
+        params_dict = {'sfan': lbd_eta_values, 'msfan_np': lbd_eta_mu_values_np,
+                       'msfan': lbd_eta_mu_values}
+        # No need to search again for the parameters of algorithms done before
+        for algo in algos_done:
+            params_dict[algo] = []
+        cache = None
+        if args.cache_dir:
+            cache = ef.ResultCache(args.cache_dir,
+                                   max_size=(int(args.cache_size * 2**20) \
+                                             if args.cache_size else None))
+        if len(algos_done) == len(ef.GRID_SEARCH_ALGOS):
+            selected_dict, runtimes_dict = {}, {}
+        elif SEARCH_BUDGET:
+            selected_dict, runtimes_dict = ef.run_adaptive_search(
+                args.num_tasks, network_fname, tmp_weights_fnames, params_dict,
+                covariance_fname, args.num_features, SEARCH_BUDGET,
+                num_workers=args.num_workers, in_process=IN_PROCESS,
+                path_mode=PATH_MODE, batch_mode=BATCH_MODE, cache=cache)
+        elif HALVING_MODE:
+            selected_dict, runtimes_dict = ef.run_successive_halving(
+                args.num_tasks, network_fname, tmp_weights_fnames, params_dict,
+                covariance_fname, args.num_features, num_workers=args.num_workers,
+                in_process=IN_PROCESS, path_mode=PATH_MODE, batch_mode=BATCH_MODE,
+                cache=cache)
+        else:
+            selected_dict, runtimes_dict = ef.run_grid_search(
+                args.num_tasks, network_fname, tmp_weights_fnames, params_dict,
+                covariance_fname, args.num_features, num_workers=args.num_workers,
+                in_process=IN_PROCESS, path_mode=PATH_MODE, batch_mode=BATCH_MODE,
+                cache=cache)
+        sf_st_dict = selected_dict.get('sfan')      # single task
+        sf_np_dict = selected_dict.get('msfan_np')  # not using precision matrix
+        sf_dict = selected_dict.get('msfan')        # using precision matrix
+
+        # Store selections and runtimes on the subsamples
+        for algo, runtimes in runtimes_dict.iteritems():
+            if algo in algos_done:
+                continue
+            save_search_results(store, repeat_idx, fold_idx, algo,
+                                selected_dict[algo], runtimes)
+
+        # Delete the temporary files stored in tmp_weights_fnames
+        # (if the weights were not given in memory)
+        for tmp_weights_f_list in tmp_weights_fnames:
             for fname in tmp_weights_f_list:
-                os.remove(fname)
-        
-        # END for ss_idx in range(args.num_subsamples)
-        
+                if isinstance(fname, basestring):
+                    os.remove(fname)
+
         #-----------------------------------   
         # Get optimal parameter values for each algo.
         # ??? some lists are empty, is it normal ??? 
         logging.info( "======== Get opt params")
-        opt_params_st = ef.get_optimal_parameters_from_dict(sf_st_dict, args.num_features)
+        # (saved in file by a previous run for the algorithms done before)
+        if 'sfan' in algos_done:
+            opt_params_st = read_fold_parameters(resu_dir, args.simu_id, fold_idx, 'sfan')
+        else:
+            opt_params_st = ef.get_optimal_parameters_from_dict(sf_st_dict, args.num_features)
         print 'opt param st ', opt_params_st
-        opt_params_np = ef.get_optimal_parameters_from_dict(sf_np_dict, args.num_features)
+        if 'msfan_np' in algos_done:
+            opt_params_np = read_fold_parameters(resu_dir, args.simu_id, fold_idx, 'msfan_np')
+        else:
+            opt_params_np = ef.get_optimal_parameters_from_dict(sf_np_dict, args.num_features)
         print 'opt param np ', opt_params_np
-        opt_params = ef.get_optimal_parameters_from_dict(sf_dict, args.num_features)
+        if 'msfan' in algos_done:
+            opt_params = read_fold_parameters(resu_dir, args.simu_id, fold_idx, 'msfan')
+        else:
+            opt_params = ef.get_optimal_parameters_from_dict(sf_dict, args.num_features)
         print 'opt params ', opt_params
 
     else : 
@@ -637,99 +784,79 @@ def run_fold(   fold_idx,
         opt_params =    "-l 2.94e-03 -e 7.65e-03 -m 1.42e-02"
 
     # For each algorithm, save optimal parameters to file
-    # Single task
-    fname = '%s/%s.sfan.fold_%d.parameters' % (resu_dir, args.simu_id, fold_idx)
-    with open(fname, 'w') as f:
-        f.write(opt_params_st)
-    # Multitask (no precision)
-    fname = '%s/%s.msfan_np.fold_%d.parameters' % (resu_dir, args.simu_id, fold_idx)
-    with open(fname, 'w') as f:
-        f.write(opt_params_np)
-    # Multitask (precision)
-    fname = '%s/%s.msfan.fold_%d.parameters' % (resu_dir, args.simu_id, fold_idx)
-    with open(fname, 'w') as f:
-        f.write(opt_params)
+    opt_params_dict = {'sfan': opt_params_st,       # Single task
+                       'msfan_np': opt_params_np,   # Multitask (no precision)
+                       'msfan': opt_params}         # Multitask (precision)
+    for algo in ef.GRID_SEARCH_ALGOS:
+        if algo in algos_done:
+            continue
+        fname = '%s/%s.%s.fold_%d.parameters' % (resu_dir, args.simu_id, algo, fold_idx)
+        with open(fname, 'w') as f:
+            f.write(opt_params_dict[algo])
+        condition = '(repeat == %d) & (fold == %d) & (algo == "%s")' % (repeat_idx, fold_idx, algo)
+        store.remove('parameters', condition)
+        store.append('parameters', repeat=repeat_idx, fold=fold_idx, algo=algo,
+                     params=opt_params_dict[algo])
+        if manifest is not None:
+            manifest.mark_done(repeat_idx, fold_idx, algo, 'parameters')
     #------------------------------------------------------------------
 
 
     #------------------------------------------------------------------
     logging.info( "======== Features selection using all training set and opt param")
-    #------
-    # For each algorithm, run algorithms again to select features,
-    # (got a list of list : list of selected features for each task)
-    # using the whole training set (i.e. scores_fnames)
-    # and optimal parameters.
-    logging.info("          run st")
-    selected_st, timing_st, maxRSS_st = ef.run_sfan(args.num_tasks, network_fname,
-                               scores_fnames, opt_params_st)
-    logging.info("          run np")
-    selected_np, timing_np, maxRSS_np = ef.run_msfan_nocorr(args.num_tasks, network_fname,
-                                       scores_fnames, opt_params_np)
-    logging.info("          run msfan")
-    selected, timing,maxRSS = ef.run_msfan(args.num_tasks, network_fname,
-                                scores_fnames, covariance_fname,
-                                opt_params)
-
-    #------
-    # For each algorithm, save timing to file
-    # Single task 
-    with open(analysis_files['timing_st'], 'a') as f:
-        f.write("%s\n" % timing_st)
-    # Multitask (no precision)
-    with open(analysis_files['timing_msfan_np'], 'a') as f:
-        f.write("%s\n" % timing_np)
-    # Multitask (precision)
-    with open(analysis_files['timing_msfan'], 'a') as f:
-        f.write("%s\n" % timing)
-
-
-    #------
-    # For each algorithm, save maxRSS to file
-    # Single task 
-    with open(analysis_files['maxRSS_st'], 'a') as f:
-        f.write("%s\n" % maxRSS_st)
-    # Multitask (no precision)
-    with open(analysis_files['maxRSS_msfan_np'], 'a') as f:
-        f.write("%s\n" % maxRSS_np)
-    # Multitask (precision)
-    with open(analysis_files['maxRSS_msfan'], 'a') as f:
-        f.write("%s\n" % maxRSS)
-
-
-    #------
-    # For each algorithm, save selected features to file
-    # Single task
-    fname = '%s/%s.sfan.fold_%d.selected_features' % \
-            (resu_dir, args.simu_id, fold_idx)
-    
-    with open(fname, 'w') as f:
-        for selected_features_list in selected_st:
-            f.write("%s\n" % ' '.join(str(x) for x in selected_features_list))
-                                    # selected_features_list is a list of int 
-                                    # that have to be cast as string so we can join them
-    # Multitask (no precision)
-    fname = '%s/%s.msfan_np.fold_%d.selected_features' % \
-            (resu_dir, args.simu_id, fold_idx)
-    
-    with open(fname, 'w') as f:
-        for selected_features_list in selected_np:
-            f.write("%s\n" % ' '.join(str(x) for x in selected_features_list))
-    # Multitask (precision)
-    fname = '%s/%s.msfan.fold_%d.selected_features' % \
-            (resu_dir, args.simu_id, fold_idx)
-    
-    with open(fname, 'w') as f:
-        for selected_features_list in selected:
-            f.write("%s\n" % ' '.join(str(x) for x in selected_features_list))
-    
-    #------
-
-
+    for algo in ef.GRID_SEARCH_ALGOS:
+        if manifest is not None and \
+           manifest.is_done(repeat_idx, fold_idx, algo, 'selected_features'):
+            continue
+        #------
+        # Run the algorithm again to select features,
+        # (got a list of list : list of selected features for each task)
+        # using the whole training set (i.e. scores_fnames)
+        # and optimal parameters.
+        logging.info("          run %s" % algo)
+        if algo == 'sfan':
+            selected, records = ef.run_sfan(args.num_tasks, network_fname,
+                                             scores_fnames, opt_params_dict[algo])
+        elif algo == 'msfan_np':
+            selected, records = ef.run_msfan_nocorr(args.num_tasks, network_fname,
+                                                     scores_fnames, opt_params_dict[algo])
+        else:
+            selected, records = ef.run_msfan(args.num_tasks, network_fname,
+                                              scores_fnames, covariance_fname,
+                                              opt_params_dict[algo])
+
+        #------
+        # Save selected features to file
+        fname = '%s/%s.%s.fold_%d.selected_features' % \
+                (resu_dir, args.simu_id, algo, fold_idx)
+        with open(fname, 'w') as f:
+            for selected_features_list in selected:
+                f.write("%s\n" % ' '.join(str(x) for x in selected_features_list))
+                                        # selected_features_list is a list of int 
+                                        # that have to be cast as string so we can join them
+
+        #------
+        # Save selected features and records of the stages to the results store
+        # (subsample -1 = whole training set)
+        condition = '(repeat == %d) & (fold == %d) & (algo == "%s") & (subsample == -1)' % \
+                    (repeat_idx, fold_idx, algo)
+        store.remove('selections', condition)
+        store.remove('runtimes', condition)
+        store.append('selections', repeat=repeat_idx, fold=fold_idx, algo=algo,
+                     subsample=-1, params=opt_params_dict[algo],
+                     task=range(len(selected)),
+                     features=ef.pack_selections(selected, args.num_features))
+        store.append_runtimes(repeat_idx, fold_idx, algo,
+                              [(-1, opt_params_dict[algo], records)])
+
+        if manifest is not None:
+            manifest.mark_done(repeat_idx, fold_idx, algo, 'selected_features')
     #------------------------------------------------------------------
 
 
-def run_repeat(repeat_idx, args, analysis_files):
-    """ Run the repeat n° <repeat_idx>.
+def setup_repeat(repeat_idx, args, manifest=None):
+    """ Generate the data of the repeat n° <repeat_idx>, and compute its
+    cross-validation folds, subsamples and grids of hyperparameters.
 
     Parameters
     ----------
@@ -738,10 +865,18 @@ def run_repeat(repeat_idx, args, analysis_files):
     args : Namespace object
         Its attributes are arguments names 
         and contain arguments values (str or int according to code specifications).
-    analysis_files: dictionary
-        key : <measure>_<algo> 
-        value : filename
+    manifest : {Manifest, None}, optional
+        If given, and the repeat was already set up by a previous run,
+        its folds and hyperparameters are read from the files saved then
+        instead of being computed again (and the data is not generated again).
+        Otherwise, the repeat is marked as set up once its files are saved.
 
+    Returns
+    -------
+    repeat_data : dictionary
+        Everything needed to run the folds of the repeat (see run_repeat_fold):
+        directories, data filenames, cross-validation indices (key 'xp_indices')
+        and grids of hyperparameters.
     """
 
     logging.info ("=============== REPETITION : %d" %repeat_idx)
@@ -750,24 +885,8 @@ def run_repeat(repeat_idx, args, analysis_files):
     resu_dir = "%s/repeat_%d" % (args.resu_dir, repeat_idx)
     create_dir_if_not_exists(resu_dir)
 
-
-    #-------------------------------------------------------------------------
-    # Data generation : 
-    logging.info( "======== Data generation")
-    # Data generation : 
-
-    # Instantiate data generator
     data_dir = '%s/repeat_%d' % (args.data_dir, repeat_idx)
 
-    if DATA_GEN : 
-        data_gen = generate_data.SyntheticDataGenerator(args.num_tasks,
-                                                        args.num_features,
-                                                        args.num_samples,
-                                                        data_dir,
-                                                        args.simu_id)
-        # Generate modular data
-        data_gen.generate_modular()
-
     # Name of data files
     # "Hard-coded here", but maybe edit generate_modular
     # to return the names of these files
@@ -782,48 +901,154 @@ def run_repeat(repeat_idx, args, analysis_files):
     scores_fnames = ['%s/%s.scores_%d.txt' % \
                      (data_dir, args.simu_id, task_idx) \
                      for task_idx in range(args.num_tasks)]
-
-    
-    #-------------------------------------------------------------------------
-
-
-    #-------------------------------------------------------------------------
-    logging.info("======== Ef setup")
+    hyperparam_fname_np = '%s/%s.hyperparameters_np.txt' % (data_dir, args.simu_id)
+    hyperparam_fname = '%s/%s.hyperparameters.txt' % (data_dir, args.simu_id)
 
     # Instantiate evaluation framework
     evalf = ef.Framework(args.num_samples, args.num_folds,
                          args.num_subsamples)
 
-    # Compute cross-validation folds and subsample indices
-    evalf.compute_indices()
+    if manifest is not None and manifest.is_done(repeat_idx, None, None, 'setup'):
+        #-------------------------------------------------------------------------
+        logging.info("======== Reading data setup of a previous run")
+        evalf.load_indices(resu_dir, args.simu_id)
+        with open(hyperparam_fname_np, 'r') as hp_f:
+            lbd_eta_mu_values_np = [line.rstrip() for line in hp_f]
+        lbd_eta_values = [" ".join(plist.split()[:-2]) \
+                          for plist in lbd_eta_mu_values_np]
+        with open(hyperparam_fname, 'r') as hp_f:
+            lbd_eta_mu_values = [line.rstrip() for line in hp_f]
 
-    # Save cross-validation folds and subsample indices to file
-    evalf.save_indices(resu_dir, args.simu_id)
+    else:
+        #-------------------------------------------------------------------------
+        # Data generation : 
+        logging.info( "======== Data generation")
+
+        if DATA_GEN : 
+            # Instantiate data generator
+            data_gen = generate_data.SyntheticDataGenerator(args.num_tasks,
+                                                            args.num_features,
+                                                            args.num_samples,
+                                                            data_dir,
+                                                            args.simu_id)
+            # Generate modular data
+            data_gen.generate_modular()
+        #-------------------------------------------------------------------------
+
+
+        #-------------------------------------------------------------------------
+        logging.info("======== Ef setup")
+
+        # Compute cross-validation folds and subsample indices
+        evalf.compute_indices()
+
+        # Save cross-validation folds and subsample indices to file
+        evalf.save_indices(resu_dir, args.simu_id)
+
+
+        #-------------------------------------------------------------------------
+        # Looking for optimal parameters : 
+
+        logging.info ("======== Defining grid of hyperparameters")
+        lbd_eta_values, lbd_eta_mu_values_np, lbd_eta_mu_values  = determine_hyperparamaters(
+                                                                        args, 
+                                                                        genotype_fname, 
+                                                                        phenotype_fnames,
+                                                                        network_fname,
+                                                                        covariance_fname = covariance_fname, 
+                                                                        precision_fname = None
+                                                                        )
+
+        # and save them :
+        with open (hyperparam_fname_np, 'w') as hp_f : 
+            for combinaison in lbd_eta_mu_values_np : 
+                hp_f.write("%s\n" % combinaison)
+        with open (hyperparam_fname, 'w') as hp_f : 
+            for combinaison in lbd_eta_mu_values : 
+                hp_f.write("%s\n" % combinaison)
+
+        if manifest is not None:
+            manifest.mark_done(repeat_idx, None, None, 'setup')
+        #-----------------------------------
+
+    repeat_data = {'repeat_idx': repeat_idx, 'resu_dir': resu_dir, 'data_dir': data_dir,
+                   'genotype_fname': genotype_fname, 'network_fname': network_fname,
+                   'covariance_fname': covariance_fname, 'causal_fname': causal_fname,
+                   'phenotype_fnames': phenotype_fnames, 'scores_fnames': scores_fnames,
+                   'xp_indices': evalf.xp_indices,
+                   'lbd_eta_values': lbd_eta_values,
+                   'lbd_eta_mu_values_np': lbd_eta_mu_values_np,
+                   'lbd_eta_mu_values': lbd_eta_mu_values,
+                   'hyperparam_fname_np': hyperparam_fname_np,
+                   'hyperparam_fname': hyperparam_fname}
+    return repeat_data
+
+
+def run_repeat_fold(fold_idx, args, repeat_data, manifest=None):
+    """ Run the fold n° <fold_idx> of a repeat set up by setup_repeat.
 
+    Parameters
+    ----------
+    fold_idx : int
+        Index of the current fold.
+    args : Namespace object
+        Its attributes are arguments names 
+        and contain arguments values (str or int according to code specifications).
+    repeat_data : dictionary
+        As returned by setup_repeat.
+    manifest : {Manifest, None}, optional
+        If given, skip the units of work of the fold already done (see run_fold).
+    """
+    logging.info ("============= FOLD : %d"%fold_idx)
+    repeat_idx = repeat_data['repeat_idx']
+    indices = repeat_data['xp_indices'][fold_idx]
+    if manifest is not None and \
+       all(manifest.is_done(repeat_idx, fold_idx, algo, 'selected_features') \
+           for algo in ef.GRID_SEARCH_ALGOS):
+        logging.info("============= FOLD : %d already done" % fold_idx)
+        return
+    if manifest is not None and \
+       all(manifest.is_done(repeat_idx, fold_idx, algo, 'parameters') \
+           for algo in ef.GRID_SEARCH_ALGOS):
+        # No grid search to run
+        tmp_weights_fnames = []
+    elif IN_PROCESS:
+        # Keep the subsample node weights in memory
+        tmp_weights_fnames = get_subsample_weights(args, repeat_data['genotype_fname'],
+                                                   repeat_data['phenotype_fnames'],
+                                                   indices['ssIndices'], indices['trIndices'])
+    else:
+        tmp_weights_fnames = get_tmp_weights_fnames(args, repeat_data['genotype_fname'],
+                                                    repeat_data['phenotype_fnames'],
+                                                    indices['ssIndices'], indices['trIndices'])
+    run_fold(
+        fold_idx,
+        args, 
+        repeat_data['lbd_eta_values'], repeat_data['lbd_eta_mu_values_np'],
+        repeat_data['lbd_eta_mu_values'], 
+        indices, 
+        repeat_data['genotype_fname'], repeat_data['network_fname'], tmp_weights_fnames,
+        repeat_data['covariance_fname'], repeat_data['causal_fname'],
+        repeat_data['phenotype_fnames'], repeat_data['scores_fnames'],
+        repeat_data['resu_dir'], repeat_idx=repeat_idx, manifest=manifest)
+
+
+def run_repeat(repeat_idx, args, manifest=None):
+    """ Run the repeat n° <repeat_idx>.
 
-    #-------------------------------------------------------------------------
-    # Looking for optimal parameters : 
-
-    logging.info ("======== Defining grid of hyperparameters")
-    lbd_eta_values, lbd_eta_mu_values_np, lbd_eta_mu_values  = determine_hyperparamaters(
-                                                                    args, 
-                                                                    genotype_fname, 
-                                                                    phenotype_fnames,
-                                                                    network_fname,
-                                                                    covariance_fname = covariance_fname, 
-                                                                    precision_fname = None
-                                                                    )
-
-    # and save them :
-    hyperparam_fname_np = '%s/%s.hyperparameters_np.txt' % (data_dir, args.simu_id)
-    with open (hyperparam_fname_np, 'w') as hp_f : 
-        for combinaison in lbd_eta_mu_values_np : 
-            hp_f.write("%s\n" % combinaison)
-    hyperparam_fname = '%s/%s.hyperparameters.txt' % (data_dir, args.simu_id)
-    with open (hyperparam_fname, 'w') as hp_f : 
-        for combinaison in lbd_eta_mu_values : 
-            hp_f.write("%s\n" % combinaison)
-    #-----------------------------------
+    Parameters
+    ----------
+    repeat_idx : int 
+        Index of the current repeat. 
+    args : Namespace object
+        Its attributes are arguments names 
+        and contain arguments values (str or int according to code specifications).
+    manifest : {Manifest, None}, optional
+        If given, skip the units of work already done, and record those done
+        (only in SEQ_MODE).
+
+    """
+    repeat_data = setup_repeat(repeat_idx, args, manifest=manifest)
 
     #-----------------------------------
     # For each fold : 
@@ -833,42 +1058,125 @@ def run_repeat(repeat_idx, args, analysis_files):
     # use a ridge regression trained with selected features only to predict quantitativ phenotypes on test set <- quantify these perf
     if SEQ_MODE : 
         for fold_idx in xrange(args.num_folds):
-            logging.info ("============= FOLD : %d"%fold_idx)
-            tmp_weights_fnames = get_tmp_weights_fnames(args, genotype_fname, phenotype_fnames, evalf.xp_indices[fold_idx]['ssIndices'])
-            run_fold(
-                fold_idx,
-                args, 
-                lbd_eta_values, lbd_eta_mu_values_np, lbd_eta_mu_values, 
-                evalf.xp_indices[fold_idx], 
-                genotype_fname, network_fname ,tmp_weights_fnames,  covariance_fname , causal_fname, phenotype_fnames, scores_fnames,
-                resu_dir)
+            run_repeat_fold(fold_idx, args, repeat_data, manifest=manifest)
 
     else :
+        resu_dir = repeat_data['resu_dir']
+        hyperparam_fname_np = repeat_data['hyperparam_fname_np']
+        hyperparam_fname = repeat_data['hyperparam_fname']
         for fold_idx in xrange(args.num_folds):
-            tmp_weights_fnames = get_tmp_weights_fnames(args, genotype_fname, phenotype_fnames, evalf.xp_indices[fold_idx]['ssIndices'])
+            indices = repeat_data['xp_indices'][fold_idx]
+            tmp_weights_fnames = get_tmp_weights_fnames(args, repeat_data['genotype_fname'],
+                                                        repeat_data['phenotype_fnames'],
+                                                        indices['ssIndices'],
+                                                        indices['trIndices'])
             save_tmp_weights_fnames(resu_dir, args.simu_id, fold_idx, tmp_weights_fnames)
+        # Options of the folds (see synthetic_data_experiments__parallel-fold.py)
+        fold_options = "-j %d" % args.num_workers
+        if args.cache_dir:
+            fold_options += " --cache_dir %s" % args.cache_dir
+        if args.cache_size:
+            fold_options += " --cache_size %s" % args.cache_size
         if  TIME_EXP :
             cmd = "qsub -l hostname='compute-0-%d' -cwd -V -N snp%dr%df -t 1-%d -e %/dev/null -o /dev/null\
-                   qsub_run-fold.sh  %d %d %d %d %d %d %s %s %s %s %s %d" \
+                   qsub_run-fold.sh  %d %d %d %d %d %d %s %s %s %s %s %d %s" \
                    %( 
                       random.randint(15,24), #random node compute-0-N, with N :  15 <= N <= 24
                       args.num_features, repeat_idx, args.num_folds,
                       args.num_tasks, args.num_features, args.num_samples, args.num_repeats, args.num_folds, args.num_subsamples,
-                      args.data_dir, args.resu_dir, args.simu_id, hyperparam_fname_np, hyperparam_fname, repeat_idx)
+                      args.data_dir, args.resu_dir, args.simu_id, hyperparam_fname_np, hyperparam_fname, repeat_idx,
+                      fold_options)
 
         else : 
             cmd = "qsub -cwd -V -N snp%dr%df -t 1-%d -e /dev/null -o /dev/null\
-               qsub_run-fold.sh  %d %d %d %d %d %d %s %s %s %s %s %d" \
+               qsub_run-fold.sh  %d %d %d %d %d %d %s %s %s %s %s %d %s" \
                %( 
                   args.num_features, repeat_idx, args.num_folds,
                   args.num_tasks, args.num_features, args.num_samples, args.num_repeats, args.num_folds, args.num_subsamples,
-                  args.data_dir, args.resu_dir, args.simu_id, hyperparam_fname_np, hyperparam_fname, repeat_idx)
+                  args.data_dir, args.resu_dir, args.simu_id, hyperparam_fname_np, hyperparam_fname, repeat_idx,
+                  fold_options)
 
         print cmd
         p = subprocess.Popen(shlex.split(cmd))
 
     # run predictions -> in main
-    # print analysis_files -> in main
+
+
+def _run_local_job(job):
+    """ Run a job of run_local, in a worker process.
+
+    job is (description, function, arguments): errors are raised again
+    as RuntimeError, with the description and the traceback of the worker,
+    which would otherwise be lost.
+    """
+    description, func, func_args = job
+    try:
+        return func(*func_args)
+    except Exception:
+        raise RuntimeError("%s failed:\n%s" % (description, traceback.format_exc()))
+
+
+def _setup_repeat_job(repeat_idx, args, seed, manifest):
+    """ Seed the random number generator of the worker (which would otherwise
+    be the same in all workers), and set up a repeat (see setup_repeat). """
+    np.random.seed(seed)
+    return setup_repeat(repeat_idx, args, manifest=manifest)
+
+
+def run_local(args, num_jobs, manifest=None):
+    """ Run all repeats and folds on a pool of <num_jobs> processes of this machine,
+    instead of sequentially (SEQ_MODE) or as SGE job arrays.
+
+    The data of each repeat is generated and set up (see setup_repeat)
+    by one job, then each of its folds is run (see run_repeat_fold) by another job.
+    The first error raised by a job stops all the others, and is raised again.
+
+    Each repeat is seeded independently (with a seed drawn from the global NumPy
+    random state), so that its data and subsamples differ from those of a sequential
+    run (SEQ_MODE), but do not depend on the order in which jobs are scheduled.
+    The rows of the results store (see get_results_store) are appended
+    in the order in which folds end.
+
+    Parameters
+    ----------
+    args : Namespace object
+        Its attributes are arguments names 
+        and contain arguments values (str or int according to code specifications).
+    num_jobs : int
+        Maximum number of repeats / folds run at the same time.
+    manifest : {Manifest, None}, optional
+        If given, skip the units of work already done, and record those done.
+    """
+    if args.num_workers > 1:
+        # Pool workers cannot start pools of their own
+        logging.warning("Folds run in parallel: using 1 worker for each grid search " + \
+                        "instead of %d" % args.num_workers)
+        args = argparse.Namespace(**vars(args))
+        args.num_workers = 1
+    # One seed per repeat, so that repeats differ
+    seeds = np.random.randint(np.iinfo(np.int32).max, size=args.num_repeats)
+
+    pool = multiprocessing.Pool(num_jobs, maxtasksperchild=1)
+    try:
+        repeat_results = [pool.apply_async(_run_local_job, [(
+            "Set up of repeat %d" % repeat_idx, _setup_repeat_job,
+            (repeat_idx, args, seeds[repeat_idx], manifest))]) \
+                          for repeat_idx in xrange(args.num_repeats)]
+        # Queue the folds of each repeat as soon as it is set up
+        fold_results = []
+        for repeat_idx, repeat_result in enumerate(repeat_results):
+            repeat_data = repeat_result.get()
+            for fold_idx in xrange(args.num_folds):
+                fold_results.append(pool.apply_async(_run_local_job, [(
+                    "Fold %d of repeat %d" % (fold_idx, repeat_idx), run_repeat_fold,
+                    (fold_idx, args, repeat_data, manifest))]))
+        for fold_result in fold_results:
+            fold_result.get()
+        pool.close()
+    finally:
+        # Stop all jobs at the first error
+        pool.terminate()
+        pool.join()
 
 
 
@@ -895,6 +1203,18 @@ def main():
         Path of the directory in which to save the simulated data.
     args.simu_id: string
         Name of the simulation, to be used to name files within args.root_dir.
+    args.num_workers: int
+        Number of processes for the hyperparameters grid search.
+    args.num_jobs: int
+        Number of repeats / folds run at the same time (see run_local).
+    args.resume: boolean
+        If true, do not delete args.resu_dir, and only run the units of work
+        that are not recorded as done in <args.resu_dir>/<simu_id>.manifest
+        (see Manifest).
+    args.cache_dir: {dirname, None}
+        Path of the directory of the cache of solver results, kept across runs.
+    args.cache_size: {float, None}
+        Maximum size of the cache of solver results, in MB.
     args.verbose: boolean
         If true, turn on detailed information logging.
 
@@ -924,6 +1244,14 @@ def main():
                 Computed as Pearson correlation.
 
     2. Results
+    Under <args.resu_dir>:
+        <simu_id>.manifest
+            Units of work done (see Manifest), in SEQ_MODE.
+        <simu_id>.results.h5
+            Selections and runtimes on the subsamples and whole training sets,
+            optimal parameters, and evaluation measures (see handle-output.py),
+            for all repeats, folds and algorithms (see ef.ResultsStore).
+
     For each repeat, under <args.resu_dir>/repeat_<repeat_idx>:
 
         For each fold_idx:
@@ -974,8 +1302,9 @@ def main():
     # Create simulated data repository if it does not exist
     create_dir_if_not_exists(args.data_dir)
 
-    # (Delete and re)create results repository (if it exists)
-    if os.path.isdir(args.resu_dir): 
+    # (Delete and re)create results repository (if it exists),
+    # unless resuming a previous run
+    if os.path.isdir(args.resu_dir) and not args.resume: 
         logging.info("Deleting %s\n" % args.resu_dir)
         try:
             shutil.rmtree(args.resu_dir)
@@ -997,16 +1326,19 @@ def main():
 
 
 
-    #-------------------------------------------------------------------------
-    # Create analysis file names :
-    analysis_files = get_analysis_files_names(args.resu_dir, args.simu_id)
-    #-------------------------------------------------------------------------
-
-
+    # Record the units of work done, to be able to resume
+    manifest = None
+    if SEQ_MODE:
+        manifest = Manifest('%s/%s.manifest' % (args.resu_dir, args.simu_id))
+        if args.resume:
+            logging.info("Resuming: %d units of work already done\n" % len(manifest.done))
 
     #-------------------------------------------------------------------------
-    for repeat_idx in xrange(args.num_repeats):
-            run_repeat(repeat_idx, args, analysis_files)
+    if args.num_jobs > 1:
+        run_local(args, args.num_jobs, manifest=manifest)
+    else:
+        for repeat_idx in xrange(args.num_repeats):
+            run_repeat(repeat_idx, args, manifest=manifest)
 
 
     #-------------------------------------------------------------------------
@@ -31,6 +31,15 @@ if __name__ == "__main__":
     parser.add_argument("fold_idx", help="Index of the current fold",
                         type=int) # arg that differ with sde. 
 
+    parser.add_argument("-j", "--num_workers",
+                        help="Number of processes for the grid search (default: 1)",
+                        type=int, default=1)
+    parser.add_argument("--cache_dir",
+                        help="Directory of the cache of solver results, kept across runs " + \
+                        "(default: no cache)")
+    parser.add_argument("--cache_size",
+                        help="Maximum size of the cache of solver results, in MB " + \
+                        "(default: no limit)", type=float)
     parser.add_argument("-v", "--verbose", help="Turn on detailed info log",
                         action='store_true')
 
@@ -103,5 +112,5 @@ if __name__ == "__main__":
             lbd_eta_values, lbd_eta_mu_values_np, lbd_eta_mu_values,
             indices, 
             genotype_fname, network_fname , tmp_weights_fnames, precision_fname , causal_fname, phenotype_fnames, scores_fnames,
-            resu_dir)
+            resu_dir, args.repeat_idx)
     